@@ -0,0 +1,98 @@
+"""Benchmark sha1sum throughput over a synthetic cache of mappings and large FITS files.
+
+    python benchmarks/bench_checksum.py [--mappings 2000] [--large-files 4] [--large-mb 1024] [--workers 1 2 4 8]
+
+A temporary directory (or --dir) is populated with --mappings small .rmap files of
+2-20K and --large-files .fits files of --large-mb megabytes each;  use --large-mb 4096
+for multi-GB references.   Each configuration then hashes every file and reports
+aggregate MB per second:
+
+    read        the former serial loop allocating a new bytes object per block
+    serial      utils.checksum() reading into a reusable buffer,  one file at a time
+    threads N   utils.checksums() with a pool of N threads
+    processes N utils.checksums() with a pool of N processes
+
+Repeated runs read from the OS page cache unless the files exceed available memory,
+so the numbers primarily reflect hashing and Python overhead rather than disk speed.
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+
+from crds.core import config, utils
+
+# ============================================================================
+
+def read_checksum(pathname):
+    """The utils.checksum() used before reusable buffers."""
+    xsum = hashlib.sha1()
+    with open(pathname, "rb") as infile:
+        size = 0
+        insize = os.stat(pathname).st_size
+        while size < insize:
+            block = infile.read(config.CRDS_CHECKSUM_BLOCK_SIZE)
+            size += len(block)
+            xsum.update(block)
+    return xsum.hexdigest()
+
+def make_files(directory, n_mappings, n_large, large_mb):
+    """Populate `directory` with synthetic mappings and FITS files,  returning their paths."""
+    paths = []
+    for i in range(n_mappings):
+        path = os.path.join(directory, "bench_{:05d}.rmap".format(i))
+        with open(path, "wb") as handle:
+            handle.write(os.urandom(2048 + (i * 7919) % 18432))
+        paths.append(path)
+    chunk = os.urandom(2**20)
+    for i in range(n_large):
+        path = os.path.join(directory, "bench_{:03d}_ref.fits".format(i))
+        with open(path, "wb") as handle:
+            for _j in range(large_mb):
+                handle.write(chunk)
+        paths.append(path)
+    return paths
+
+def megabytes_per_second(checksums, paths, total_bytes):
+    """Return the rate at which `checksums` hashes `paths`."""
+    start = time.perf_counter()
+    checksums(paths)
+    return total_bytes / 2**20 / (time.perf_counter() - start)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mappings", type=int, default=2000)
+    parser.add_argument("--large-files", type=int, default=4)
+    parser.add_argument("--large-mb", type=int, default=1024, help="size of each large FITS file in MB")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--dir", help="directory for the synthetic files,  default is a temporary directory")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench_checksum_")
+    try:
+        paths = make_files(directory, args.mappings, args.large_files, args.large_mb)
+        total_bytes = sum(os.stat(path).st_size for path in paths)
+        print("{} files,  {:.1f} MB".format(len(paths), total_bytes / 2**20))
+        utils.checksums(paths, workers=1)   # warm the page cache
+
+        print("{:>14} {:>10}".format("mode", "MB/s"))
+        rate = megabytes_per_second(lambda paths: [read_checksum(path) for path in paths], paths, total_bytes)
+        print("{:>14} {:>10.1f}".format("read", rate))
+        rate = megabytes_per_second(lambda paths: utils.checksums(paths, workers=1), paths, total_bytes)
+        print("{:>14} {:>10.1f}".format("serial", rate))
+        for pool in ["threads", "processes"]:
+            for workers in args.workers:
+                if workers > 1:
+                    rate = megabytes_per_second(
+                        lambda paths: utils.checksums(paths, workers=workers, pool=pool), paths, total_bytes)
+                    print("{:>14} {:>10.1f}".format("{} {}".format(pool, workers), rate))
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
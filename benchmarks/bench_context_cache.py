@@ -0,0 +1,72 @@
+"""Benchmark loading a context from a whole-context pickle versus a compact context
+cache file (crds.core.context_cache).
+
+Run against a CRDS cache containing the mappings of CONTEXT:
+
+    python benchmarks/bench_context_cache.py hst_0001.pmap [--header dataset.fits] [--repeat 5]
+
+For each format this reports the file size,  the time to load the context,  and when
+--header is given,  the time to load the context and compute best references for the
+header,  which for the compact format only reads the records for the header's instrument.
+"""
+import os
+import sys
+import time
+import pickle
+import argparse
+import tempfile
+
+from crds.core import rmap, context_cache
+from crds import data_file
+
+# ============================================================================
+
+def best_time(func, repeat):
+    """Return the minimum elapsed seconds of `repeat` calls to `func`."""
+    times = []
+    for _i in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("context", help="name of .pmap to benchmark")
+    parser.add_argument("--header", help="dataset file to compute best references for after loading")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timing repetitions")
+    args = parser.parse_args(argv)
+
+    loaded = rmap.load_mapping(args.context)
+    loaded.force_load()
+    header = data_file.get_header(args.header) if args.header else None
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        pickle_path = os.path.join(tempdir, args.context + ".pkl")
+        with open(pickle_path, "wb") as handle:
+            handle.write(pickle.dumps(loaded))
+        cache_path = os.path.join(tempdir, args.context + ".ctx")
+        with open(cache_path, "wb") as handle:
+            handle.write(context_cache.dumps(loaded))
+
+        def load_pickle():
+            with open(pickle_path, "rb") as handle:
+                return pickle.loads(handle.read())
+
+        def load_compact():
+            context_cache.clear_open_caches()
+            return context_cache.load(cache_path, args.context)
+
+        print("{:<10} {:>12} {:>12} {:>14}".format("format", "bytes", "load (s)", "bestrefs (s)"))
+        for name, path, loader in [("pickle", pickle_path, load_pickle), ("compact", cache_path, load_compact)]:
+            load_time = best_time(loader, args.repeat)
+            if header is not None:
+                bestrefs_time = "{:14.4f}".format(
+                    best_time(lambda: loader().get_best_references(header), args.repeat))
+            else:
+                bestrefs_time = "{:>14}".format("-")
+            print("{:<10} {:>12} {:12.4f} {}".format(name, os.path.getsize(path), load_time, bestrefs_time))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
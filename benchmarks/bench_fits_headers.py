@@ -0,0 +1,103 @@
+"""Benchmark reading the headers of large multi-extension FITS files.
+
+    python benchmarks/bench_fits_headers.py [--files 20] [--extensions 6] [--image-mb 32] [--keys 12]
+
+A temporary directory (or --dir) is populated with --files FITS files each containing a
+primary header of several hundred cards and --extensions image extensions of --image-mb
+megabytes.   Every file's header is then read as:
+
+    astropy     FitsFile.get_raw_header() opening the file with astropy,  as before
+    scan        crds.io.fits.scan_fits_header() returning every card
+    needed      scan_fits_header() for --keys primary header keywords,  stopping early
+
+and the files per second reported.   Neither method reads the image data,  so this
+measures header parsing and the cost of walking past data units.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from astropy.io import fits as pyfits
+
+from crds.core import config
+from crds.io import fits
+
+# ============================================================================
+
+def make_files(directory, n_files, n_extensions, image_mb):
+    """Populate `directory` with synthetic multi-extension FITS files,  returning their paths."""
+    side = int((image_mb * 2**20 / 4) ** 0.5)
+    image = np.zeros((side, side), dtype="float32")
+    paths = []
+    for i in range(n_files):
+        primary = pyfits.PrimaryHDU()
+        primary.header["INSTRUME"] = "ACS"
+        primary.header["DETECTOR"] = "WFC"
+        for j in range(400):
+            primary.header["KEY{:05d}".format(j)] = ("value {}".format(j), "synthetic keyword")
+        for j in range(50):
+            primary.header["HISTORY"] = "synthetic history line {}".format(j)
+        hdus = [primary]
+        for j in range(n_extensions):
+            extension = pyfits.ImageHDU(image, name="SCI")
+            extension.header["EXPTIME"] = 1.5 * j
+            hdus.append(extension)
+        path = os.path.join(directory, "bench_{:03d}_raw.fits".format(i))
+        pyfits.HDUList(hdus).writeto(path, overwrite=True)
+        paths.append(path)
+    return paths
+
+def files_per_second(func, paths):
+    """Return the rate at which `func` reads the headers of `paths`."""
+    start = time.perf_counter()
+    for path in paths:
+        func(path)
+    return len(paths) / (time.perf_counter() - start)
+
+def astropy_header(path):
+    """Read the header of `path` with astropy only."""
+    old = config.FITS_FAST_HEADERS.set(False)
+    try:
+        return fits.FitsFile(path).get_raw_header((), checksum=False)
+    finally:
+        config.FITS_FAST_HEADERS.set(old)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--extensions", type=int, default=6)
+    parser.add_argument("--image-mb", type=int, default=32, help="size of each extension image in MB")
+    parser.add_argument("--keys", type=int, default=12, help="number of needed keywords")
+    parser.add_argument("--dir", help="directory of FITS files,  default is a temporary directory of synthetic files")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench_fits_headers_")
+    try:
+        if args.dir:
+            paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".fits"))
+        else:
+            paths = make_files(directory, args.files, args.extensions, args.image_mb)
+        total_mb = sum(os.stat(path).st_size for path in paths) / 2**20
+        print("{} files,  {:.1f} MB".format(len(paths), total_mb))
+
+        needed = ["INSTRUME", "DETECTOR"] + ["KEY{:05d}".format(j) for j in range(args.keys - 2)]
+        for path in paths:
+            if fits.scan_fits_header(path) != astropy_header(path):
+                print("scan differs from astropy for", repr(path))
+
+        print("{:>10} {:>10}".format("mode", "files/s"))
+        print("{:>10} {:>10.1f}".format("astropy", files_per_second(astropy_header, paths)))
+        print("{:>10} {:>10.1f}".format("scan", files_per_second(fits.scan_fits_header, paths)))
+        print("{:>10} {:>10.1f}".format(
+            "needed", files_per_second(lambda path: fits.scan_fits_header(path, needed), paths)))
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Benchmark differencing a long chain of CRDS contexts.
+
+    python benchmarks/bench_mapping_diff.py [--contexts 100] [--instruments 4] [--rmaps 12] [--cases 400] [--dates 6]
+
+A temporary mapping cache (or --dir) is populated with a synthetic HST context
+hierarchy of --instruments imaps each selecting --rmaps rmaps of --cases Match cases
+with --dates UseAfter dates each.   Each of --contexts successive pmaps then replaces one
+rmap with a version adding and replacing --changes references,  as operational
+deliveries do.   Every adjacent pair of pmaps is differenced with
+Mapping.difference(),  as crds.diff does,  reporting pairs per second:
+
+    full        CRDS_DIFF_CONTENT_HASHES=0,  loading and descending into every mapping
+    hashes      skipping unloaded identical selections and identical subtrees
+    repeat      hashes again,  with all mappings loaded and content hashes computed
+
+full and hashes start with empty mapping caches,  so they include loading the mappings
+differencing needs.
+
+The difference tuples of each mode are checked to be identical.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+from crds import hst
+from crds.core import config, rmap, utils
+
+# ============================================================================
+
+INSTRUMENTS = ["acs", "cos", "stis", "wfc3", "nicmos", "wfpc2"]
+
+def rmap_text(name, instrument, filekind, cases):
+    """Return the text of rmap `name` with Match `cases` { match_tuple : { date : reference } }."""
+    lines = ["header = {",
+             "    'classes' : ('Match', 'UseAfter'),",
+             "    'derived_from' : 'bench_mapping_diff',",
+             "    'filekind' : {!r},".format(filekind.upper()),
+             "    'instrument' : {!r},".format(instrument.upper()),
+             "    'mapping' : 'REFERENCE',",
+             "    'name' : {!r},".format(name),
+             "    'observatory' : 'HST',",
+             "    'parkey' : (('DETECTOR', 'CCDAMP', 'CCDGAIN'), ('DATE-OBS', 'TIME-OBS')),",
+             "    'sha1sum' : 'none',",
+             "}", "", "selector = Match({"]
+    for key in sorted(cases):
+        lines.append("    {!r} : UseAfter({{".format(key))
+        for date in sorted(cases[key]):
+            lines.append("        {!r} : {!r},".format(date, cases[key][date]))
+        lines.append("    }),")
+    lines.append("})")
+    return "\n".join(lines) + "\n"
+
+def parent_text(name, mapping, instrument, selections):
+    """Return the text of imap or pmap `name` with `selections` { key : mapping name }."""
+    lines = ["header = {",
+             "    'derived_from' : 'bench_mapping_diff',"]
+    if instrument:
+        lines.append("    'instrument' : {!r},".format(instrument.upper()))
+    lines += ["    'mapping' : {!r},".format(mapping),
+              "    'name' : {!r},".format(name),
+              "    'observatory' : 'HST',",
+              "    'parkey' : {!r},".format(("REFTYPE",) if instrument else ("INSTRUME",)),
+              "    'sha1sum' : 'none',",
+              "}", "", "selector = {"]
+    lines += ["    {!r} : {!r},".format(key, selections[key]) for key in sorted(selections)]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def write_mapping(directory, name, text):
+    """Write mapping `text` as `name` in `directory` with a correct sha1sum."""
+    mapping = rmap.Mapping.from_string(text, name, ignore_checksum=True)
+    mapping.write(os.path.join(directory, name))
+
+def make_chain(directory, args):
+    """Write a chain of --contexts pmaps into `directory` and return their names."""
+    rng = random.Random(1)
+    rmaps = {}     # (instrument, filekind) : [version, cases]
+    imaps = {}     # instrument : [version, { filekind : rmap name }]
+    for instrument in INSTRUMENTS[:args.instruments]:
+        imaps[instrument] = [0, {}]
+        for filekind in sorted(hst.TYPES.get_filekinds(instrument))[:args.rmaps]:
+            cases = {}
+            for i in range(args.cases):
+                key = ("DET{}".format(i % 7), "ABCD"[i % 4], float(i))
+                cases[key] = { "{}-01-01 00:00:00".format(1990 + j) : "{}_{}_{:04d}_{}.fits".format(
+                    instrument, filekind, i, j) for j in range(args.dates) }
+            rmaps[(instrument, filekind)] = [0, cases]
+            imaps[instrument][1][filekind] = "hst_{}_{}_0000.rmap".format(instrument, filekind)
+            write_mapping(directory, imaps[instrument][1][filekind],
+                          rmap_text(imaps[instrument][1][filekind], instrument, filekind, cases))
+        name = "hst_{}_0000.imap".format(instrument)
+        write_mapping(directory, name, parent_text(name, "INSTRUMENT", instrument, imaps[instrument][1]))
+    contexts = []
+    for serial in range(args.contexts):
+        if serial:
+            instrument, filekind = rng.choice(sorted(rmaps))
+            version, cases = rmaps[(instrument, filekind)]
+            version += 1
+            for _i in range(args.changes):
+                key = rng.choice(sorted(cases))
+                date = rng.choice(sorted(cases[key])) if rng.random() < 0.5 else "2030-{:02d}-01 00:00:00".format(version % 12 + 1)
+                cases[key][date] = "{}_{}_new_{:04d}.fits".format(instrument, filekind, version)
+            rmaps[(instrument, filekind)][0] = version
+            name = "hst_{}_{}_{:04d}.rmap".format(instrument, filekind, version)
+            write_mapping(directory, name, rmap_text(name, instrument, filekind, cases))
+            imaps[instrument][0] += 1
+            imaps[instrument][1][filekind] = name
+            name = "hst_{}_{:04d}.imap".format(instrument, imaps[instrument][0])
+            write_mapping(directory, name, parent_text(name, "INSTRUMENT", instrument, imaps[instrument][1]))
+        name = "hst_{:04d}.pmap".format(serial)
+        selections = { instrument.upper() : "hst_{}_{:04d}.imap".format(instrument, imaps[instrument][0])
+                       for instrument in imaps }
+        write_mapping(directory, name, parent_text(name, "PIPELINE", None, selections))
+        contexts.append(name)
+    return contexts
+
+def diff_chain(contexts):
+    """Return the difference tuples of each adjacent pair of `contexts`."""
+    return [rmap.get_cached_mapping(old).difference(new, include_header_diffs=True)
+            for (old, new) in zip(contexts[:-1], contexts[1:])]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--contexts", type=int, default=100)
+    parser.add_argument("--instruments", type=int, default=4)
+    parser.add_argument("--rmaps", type=int, default=12, help="rmaps per instrument")
+    parser.add_argument("--cases", type=int, default=400, help="Match cases per rmap")
+    parser.add_argument("--dates", type=int, default=6, help="UseAfter dates per Match case")
+    parser.add_argument("--changes", type=int, default=3, help="references added or replaced per delivery")
+    parser.add_argument("--dir", help="directory for the synthetic mappings,  default is a temporary directory")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench_mapping_diff_")
+    old_mappath = os.environ.get("CRDS_MAPPATH_SINGLE")
+    os.environ["CRDS_MAPPATH_SINGLE"] = directory
+    try:
+        contexts = make_chain(directory, args)
+        pairs = len(contexts) - 1
+        print("{} contexts,  {} rmaps of {} cases".format(
+            len(contexts), len([name for name in os.listdir(directory) if name.endswith(".rmap")]), args.cases))
+
+        print("{:>10} {:>10}".format("mode", "pairs/s"))
+        results = {}
+        for mode, hashes in [("full", False), ("hashes", True), ("repeat", True)]:
+            old = config.DIFF_CONTENT_HASHES.set(hashes)
+            if mode != "repeat":
+                utils.clear_function_caches()
+            try:
+                start = time.perf_counter()
+                results[mode] = diff_chain(contexts)
+                print("{:>10} {:>10.1f}".format(mode, pairs / (time.perf_counter() - start)))
+            finally:
+                config.DIFF_CONTENT_HASHES.set(old)
+        if not results["full"] == results["hashes"] == results["repeat"]:
+            print("difference tuples differ between modes")
+            return 1
+    finally:
+        if old_mappath is None:
+            os.environ.pop("CRDS_MAPPATH_SINGLE", None)
+        else:
+            os.environ["CRDS_MAPPATH_SINGLE"] = old_mappath
+        if not args.dir:
+            shutil.rmtree(directory)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
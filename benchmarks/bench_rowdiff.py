@@ -0,0 +1,93 @@
+"""Benchmark crds.rowdiff on large synthetic FITS tables.
+
+    python benchmarks/bench_rowdiff.py [--rows 1000,10000,100000,500000] [--changes 2.0] [--difflib-max-rows 20000]
+
+For each --rows count,  a temporary directory (or --dir) is populated with two FITS
+tables of that many rows,  the second deleting,  inserting,  and modifying --changes
+percent of the rows of the first.   The tables are differenced with RowDiff using each engine:
+
+    difflib     difflib.SequenceMatcher over table_to_string() rows,  as before
+    hash        HashSequenceMatcher joining hashed rows
+
+and the seconds taken reported.   difflib is skipped for tables larger than
+--difflib-max-rows since it is roughly quadratic.   When both engines run,  their
+printed reports are compared.
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+from astropy.io import fits as pyfits
+
+from crds import rowdiff
+
+# ============================================================================
+
+def make_tables(directory, rows, changes):
+    """Write FITS tables old.fits and new.fits of `rows` rows to `directory`,  returning their paths."""
+    rng = np.random.RandomState(rows)
+    data = np.zeros(rows, dtype=[("detector", "S8"), ("filter", "S8"), ("chip", "i2"),
+                                 ("date", "S19"), ("value", "f4"), ("error", "f8")])
+    data["detector"] = rng.choice([b"WFC", b"HRC", b"SBC", b"UVIS", b"IR"], rows)
+    data["filter"] = rng.choice([b"F435W", b"F606W", b"F814W", b"CLEAR"], rows)
+    data["chip"] = rng.randint(1, 5, rows)
+    data["date"] = [b"%04d-%02d-01T00:00:00" % (1990 + i // 12 % 40, i % 12 + 1) for i in range(rows)]
+    data["value"] = rng.uniform(-1e4, 1e4, rows)
+    data["error"] = rng.uniform(0, 1, rows)
+    new = data.copy()
+    shuffle = random.Random(rows)
+    changes = max(1, int(rows * changes / 100))
+    for _i in range(changes):
+        new[shuffle.randrange(len(new))]["value"] += 1.0
+    new = np.delete(new, [shuffle.randrange(len(new)) for _i in range(changes)])
+    for _i in range(changes):
+        at = shuffle.randrange(len(new))
+        new = np.insert(new, at, new[at])
+        new[at]["error"] = -1.0
+    paths = []
+    for name, table in [("old.fits", data), ("new.fits", new)]:
+        path = os.path.join(directory, name)
+        pyfits.HDUList([pyfits.PrimaryHDU(), pyfits.BinTableHDU(table)]).writeto(path, overwrite=True)
+        paths.append(path)
+    return paths
+
+def time_rowdiff(old, new, engine):
+    """Return (seconds, report) for differencing `old` and `new` with `engine`."""
+    start = time.perf_counter()
+    report = str(rowdiff.RowDiff(old, new, engine=engine))
+    return time.perf_counter() - start, report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000,500000", help="comma separated table sizes")
+    parser.add_argument("--changes", type=float, default=2.0, help="percent of rows deleted,  inserted,  and modified each")
+    parser.add_argument("--difflib-max-rows", type=int, default=20000, help="largest table differenced with difflib")
+    parser.add_argument("--dir", help="directory for the synthetic tables,  default is a temporary directory")
+    args = parser.parse_args(argv)
+
+    directory = args.dir or tempfile.mkdtemp(prefix="bench_rowdiff_")
+    status = 0
+    try:
+        print("{:>10} {:>12} {:>12} {:>10}".format("rows", "difflib s", "hash s", "reports"))
+        for rows in [int(count) for count in args.rows.split(",")]:
+            old, new = make_tables(directory, rows, args.changes)
+            hash_seconds, hash_report = time_rowdiff(old, new, "hash")
+            if rows <= args.difflib_max_rows:
+                difflib_seconds, difflib_report = time_rowdiff(old, new, "difflib")
+                same = "same" if difflib_report == hash_report else "differ"
+                difflib_seconds = "{:.2f}".format(difflib_seconds)
+            else:
+                difflib_seconds, same = "skipped", "-"
+            print("{:>10} {:>12} {:>12.2f} {:>10}".format(rows, difflib_seconds, hash_seconds, same))
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Benchmark JSON RPC calls per second against a local stand-in CRDS server.
+
+    python benchmarks/bench_rpc.py [--calls 200] [--latency-ms 0 5 20] [--handshake-ms 30] [--batch 20] [--ids 2000]
+
+Each call is get_dataset_ids(),  returning --ids dataset ids,  served by
+crds.tests.jsonrpc_server.LocalJsonRpcServer with --latency-ms added to every HTTP
+request and --handshake-ms to every new connection to emulate a remote HTTPS server.
+For each latency this reports calls per second for:
+
+    urlopen     a new urllib.request.urlopen() connection per call,  as before pooling
+    pooled      CheckingProxy over a reused keep-alive connection
+    gzip        pooled with CRDS_RPC_GZIP=1
+    batched     pooled with --batch calls per JSON-RPC 2.0 batch request
+"""
+import sys
+import json
+import time
+import argparse
+from urllib import request
+
+from crds.core import config
+from crds.client import proxy
+from crds.tests.jsonrpc_server import LocalJsonRpcServer
+
+# ============================================================================
+
+def urlopen_call(url, method, params):
+    """Issue one JSON RPC call the way CheckingProxy did before connection pooling."""
+    jsonrpc = json.dumps({"jsonrpc" : "1.0", "method" : method, "params" : params, "id" : proxy.message_id()})
+    channel = request.urlopen(url + method + "/", jsonrpc.encode("utf-8"))
+    return json.loads(channel.read().decode("utf-8"))["result"]
+
+def calls_per_second(func, calls):
+    """Return the rate at which `func` completes `calls` RPCs."""
+    start = time.perf_counter()
+    func()
+    return calls / (time.perf_counter() - start)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[0, 5, 20])
+    parser.add_argument("--handshake-ms", type=float, default=30, help="added delay per new connection")
+    parser.add_argument("--batch", type=int, default=20, help="calls per batch request")
+    parser.add_argument("--ids", type=int, default=2000, help="dataset ids returned per call")
+    args = parser.parse_args(argv)
+
+    ids = ["I{:07d}:I{:07d}".format(i, i) for i in range(args.ids)]
+    methods = { "get_dataset_ids" : lambda context, instrument, since: ids }
+    params = ("hst.pmap", "acs", None)
+
+    print("{:>10} {:>12} {:>12} {:>12} {:>12}".format("latency", "urlopen/s", "pooled/s", "gzip/s", "batched/s"))
+    for latency in args.latency_ms:
+        with LocalJsonRpcServer(methods, latency=latency / 1000.0, handshake=args.handshake_ms / 1000.0) as server:
+            S = proxy.CheckingProxy(server.url)
+
+            def unpooled():
+                for _i in range(args.calls):
+                    urlopen_call(server.url, "get_dataset_ids", params)
+
+            def pooled():
+                for _i in range(args.calls):
+                    S.get_dataset_ids(*params)
+
+            def batched():
+                for i in range(0, args.calls, args.batch):
+                    S._batch([("get_dataset_ids", params)] * min(args.batch, args.calls - i))
+
+            unpooled_rate = calls_per_second(unpooled, args.calls)
+            pooled_rate = calls_per_second(pooled, args.calls)
+            old_gzip = config.RPC_GZIP.set(True)
+            try:
+                gzip_rate = calls_per_second(pooled, args.calls)
+            finally:
+                config.RPC_GZIP.set(old_gzip)
+            batched_rate = calls_per_second(batched, args.calls)
+        print("{:>8.1f}ms {:>12.0f} {:>12.0f} {:>12.0f} {:>12.0f}".format(
+            latency, unpooled_rate, pooled_rate, gzip_rate, batched_rate))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
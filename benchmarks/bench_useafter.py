@@ -0,0 +1,95 @@
+"""Microbenchmark UseAfter lookups per second for deep UseAfter selectors.
+
+    python benchmarks/bench_useafter.py [--depths 10 100 1000 10000] [--lookups 20000]
+
+For each selector depth this reports lookups per second for:
+
+    slicing     the former recursive list slicing binary search,  dates reformatted every lookup
+    uncached    bisect over the precomputed search keys,  dates reformatted every lookup
+    cached      bisect over the precomputed search keys,  dates memoized by reformat_date()
+
+Lookup dates are drawn from a pool of distinct observation dates the size of --dates,
+since pipelines typically see many datasets from the same few exposures.
+"""
+import sys
+import time
+import random
+import argparse
+
+from crds.core import config, selectors, utils
+
+# ============================================================================
+
+def slicing_bsearch(date, selections):
+    """The recursive slicing binary search UseAfterSelector used before bisect."""
+    if len(selections) == 0:
+        raise selectors.UseAfterError("No selection <= " + repr(date))
+    elif len(selections) > 1:
+        left = selections[:len(selections)//2]
+        right = selections[len(selections)//2:]
+        if date >= right[0].key:
+            return slicing_bsearch(date, right)
+        else:
+            return slicing_bsearch(date, left)
+    elif date >= selections[0].key:
+        return selections[0]
+    else:
+        raise selectors.UseAfterError("No selection <= " + repr(date))
+
+def random_date(rng, first_year=1990, last_year=2030):
+    """Return a random date/time string in CRDS standard form."""
+    return "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(
+        rng.randint(first_year, last_year), rng.randint(1, 12), rng.randint(1, 28),
+        rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59))
+
+def make_selector(depth, rng):
+    """Return a UseAfterSelector with `depth` distinct dates."""
+    selections = {}
+    while len(selections) < depth:
+        selections[random_date(rng)] = "ref_{:06d}.fits".format(len(selections))
+    return selectors.UseAfterSelector(("DATE-OBS", "TIME-OBS"), selections)
+
+def lookups_per_second(lookup, headers):
+    """Return the rate at which `lookup` processes `headers`."""
+    start = time.perf_counter()
+    for header in headers:
+        lookup(header)
+    return len(headers) / (time.perf_counter() - start)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--dates", type=int, default=500, help="number of distinct lookup dates")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(42)
+    pool = []
+    for _i in range(args.dates):
+        date, time_ = random_date(rng, 2000, 2030).split()
+        pool.append({"DATE-OBS" : date.replace("-", "/"), "TIME-OBS" : time_})
+    headers = [rng.choice(pool) for _i in range(args.lookups)]
+
+    print("{:>8} {:>14} {:>14} {:>14}".format("depth", "slicing/s", "uncached/s", "cached/s"))
+    for depth in args.depths:
+        selector = make_selector(depth, rng)
+
+        def slicing(header):
+            date = selector._validate_header(header)
+            return slicing_bsearch(date, selector._selections)
+
+        def bisecting(header):
+            return selector.bsearch(selector._validate_header(header))
+
+        config.DATE_CACHE_SIZE.set(1)   # one entry,  effectively uncached
+        utils.clear_function_caches()
+        slicing_rate = lookups_per_second(slicing, headers)
+        uncached_rate = lookups_per_second(bisecting, headers)
+        config.DATE_CACHE_SIZE.set(10000)
+        utils.clear_function_caches()
+        cached_rate = lookups_per_second(bisecting, headers)
+        print("{:>8} {:>14.0f} {:>14.0f} {:>14.0f}".format(depth, slicing_rate, uncached_rate, cached_rate))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
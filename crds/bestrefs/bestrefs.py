@@ -7,12 +7,14 @@ For more details on the several modes of operations and command line parameters
 """
 import sys
 import os
-from collections import namedtuple, OrderedDict
+import multiprocessing
+from collections import namedtuple, OrderedDict, deque
 
 # ===================================================================
 
 import crds
 from crds.core import log, config, utils, timestamp, cmdline, heavy_client
+from crds.core.exceptions import picklable_exception
 from crds import diff, matches
 from . import table_effects, headers
 from crds.client import api
@@ -22,6 +24,9 @@ from crds.client import api
 MIN_DATE = "1900-01-01 00:00:00"
 MAX_DATE = "9999-01-01 23:59:59"
 
+# default per-rmap bestrefs memo size for multi-dataset runs,  see --lookup-cache-size
+LOOKUP_CACHE_SIZE = 10000
+
 # ===================================================================
 
 UpdateTuple = namedtuple("UpdateTuple", ["instrument", "filekind", "old_reference", "new_reference"])
@@ -307,11 +312,17 @@ than errors as the default.
         self.active_header = None   # new or old header last processed with bestrefs
         self.drop_ids = []
 
+        self.prefetched = {}   # --jobs worker lookup outcomes,  { dataset : [ (records, bestrefs, exc), ...] }
+        self.prefetched_headers = {}   # --jobs lookup parameters,  { dataset : [ (records, header, exc), ...] }
+
     def complex_init(self):
         """Complex init tasks run inside any --pdb environment,  also unfortunately --profile."""
 
         assert not (self.args.sync_references and self.readonly_cache), "Readonly cache,  cannot fetch references."
 
+        # before any rmap is loaded since each reads the size as its cache is created
+        self.init_lookup_cache()
+
         self.new_context, self.old_context = self.setup_contexts()
 
         # Support 0 to 1 mutually exclusive source modes and/or any number of pickles
@@ -371,6 +382,19 @@ than errors as the default.
         
         return True
 
+    def init_lookup_cache(self):
+        """Enable memoized rmap lookups unless only a single file is being processed
+        or --lookup-cache-size says otherwise.
+        """
+        if self.args.lookup_cache_size is not None:
+            cache_size = self.args.lookup_cache_size
+        elif self.args.files and len(self.args.files) == 1 and not self.args.load_pickles:
+            cache_size = 0
+        else:
+            cache_size = LOOKUP_CACHE_SIZE
+        log.verbose("Setting rmap lookup cache size to", cache_size)
+        config.LOOKUP_CACHE_SIZE.set(cache_size)
+
     def normalize_id(self, dataset):
         """Convert a given `dataset` ID to uppercase.  For the sake of simplicity convert
         simple IDs into unassociated exposure IDs in <exposure>:<exposure> form.  This is a
@@ -527,6 +551,13 @@ than errors as the default.
         self.add_argument("--eliminate-duplicate-cases", action="store_true",
                           help="Categorize unique bestrefs results as errors to determine representative test cases...  Replaces normal error counts with coverage counts and ids.")
 
+        self.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                          help="Compute best references using N worker processes.  Results and output match a serial run.")
+
+        self.add_argument("--lookup-cache-size", type=int, default=None,
+                          help="Number of results each rmap memoizes by parameter values.  Defaults to %d for multi-dataset runs,  0 disables." %
+                          LOOKUP_CACHE_SIZE)
+
         cmdline.UniqueErrorsMixin.add_args(self)
 
     def setup_contexts(self):
@@ -658,10 +689,13 @@ than errors as the default.
         """Compute bestrefs for datasets."""
         # Finish __init__() inside --pdb
         if self.complex_init():
-            for i, dataset in enumerate(self.new_headers):
-                if i != 0 and i % 1000 == 0:
-                    log.verbose(self.get_stat("datasets"), "sources processed", verbosity=5)
-                self.process(dataset)
+            if self.args.jobs > 1:
+                self.process_parallel()
+            else:
+                for i, dataset in enumerate(self.new_headers):
+                    if i != 0 and i % 1000 == 0:
+                        log.verbose(self.get_stat("datasets"), "sources processed", verbosity=5)
+                    self.process(dataset)
             self.post_processing()
         self.report_stats()
         if self.args.eliminate_duplicate_cases:
@@ -671,6 +705,134 @@ than errors as the default.
         log.standard_status()
         return log.errors()
 
+    def process_parallel(self):
+        """Process every source as main() does serially,  but with the bestrefs lookups
+        for each source computed in advance by --jobs worker processes.   Log output
+        from sources and workers is captured and replayed in serial order so that
+        output,  error counts,  updates,  and pickles are identical to a serial run.
+
+        Sources are read from the header generator as they are processed, and their
+        lookup parameters are fetched here and sent to the workers in chunks,  so
+        server header segments are dumped once.   Fetching runs ahead of processing
+        by no more than the generator retains in memory.
+        """
+        max_chunks = self.args.jobs * 4
+        lookahead = self.new_headers.retained_sources() or max_chunks * 50
+        chunk_size = max(1, min(50, lookahead // max_chunks))
+        window = deque()   # [ [dataset, records, fetched headers, outcomes or None], ... ] in source order
+        chunks = deque()   # [ (AsyncResult, [window entries, ...]), ... ] in submission order
+        chunk, fetching = [], set()
+        processed = 0
+
+        def submit():
+            if chunk:
+                work = [(entry[0], [header for (_records, header, exc) in entry[2] if exc is None])
+                        for entry in chunk]
+                chunks.append((pool.apply_async(_bestrefs_worker, (work,)), list(chunk)))
+                del chunk[:]
+
+        def collect():
+            result, entries = chunks.popleft()
+            for entry, outcomes in zip(entries, result.get()):
+                entry[3] = outcomes
+
+        def process_ready():
+            nonlocal processed
+            while window and window[0][3] is not None:
+                dataset, records, fetched, outcomes = window.popleft()
+                fetching.discard(dataset)
+                log.replay_records(records)
+                if processed != 0 and processed % 1000 == 0:
+                    log.verbose(self.get_stat("datasets"), "sources processed", verbosity=5)
+                processed += 1
+                self.prefetched_headers[dataset], self.prefetched[dataset] = fetched, outcomes
+                self.process(dataset)
+                self.prefetched_headers.pop(dataset, None)
+                self.prefetched.pop(dataset, None)
+
+        global _WORKER_SCRIPT
+        _WORKER_SCRIPT = self
+        try:
+            with multiprocessing.get_context("fork").Pool(
+                    self.args.jobs, initializer=_init_bestrefs_worker) as pool:
+                source_iter = iter(self.new_headers)
+                while True:
+                    records = []
+                    with log.capture_records(records):
+                        dataset = next(source_iter, None)
+                    if dataset is None:
+                        break
+                    entry = [dataset, records, [], []]
+                    # Repeated sources are looked up when processed since the first may update headers.
+                    if self.should_process(dataset) and dataset not in fetching:
+                        fetching.add(dataset)
+                        entry[2:] = [self.prefetch_headers(dataset), None]
+                        chunk.append(entry)
+                        if len(chunk) >= chunk_size:
+                            submit()
+                    window.append(entry)
+                    while len(window) > lookahead or len(chunks) > max_chunks:
+                        if not chunks:
+                            submit()
+                        collect()
+                        process_ready()
+                    process_ready()
+                submit()
+                while chunks:
+                    collect()
+                    process_ready()
+                log.replay_records(records)
+        finally:
+            _WORKER_SCRIPT = None
+
+    def should_process(self, dataset):
+        """Return False IFF process() will skip `dataset` due to --drop-ids or --only-ids."""
+        return dataset not in self.drop_ids and not (self.args.only_ids and dataset not in self.args.only_ids)
+
+    def prefetch_headers(self, dataset):
+        """Perform the get_lookup_parameters() calls _process() will make for `dataset`,
+        capturing their log output and any exception rather than issuing them.
+
+        Returns [ (log records, header or None, exception or None), ... ]
+        """
+        sources = [self.new_headers]
+        if self.compare_prior and self.args.old_context:
+            sources.append(self.old_headers)
+        fetched = []
+        for source in sources:
+            records = []
+            with log.capture_records(records):
+                try:
+                    fetched.append((records, source.get_lookup_parameters(dataset), None))
+                except Exception as exc:
+                    fetched.append((records, None, exc))
+                    break
+        return fetched
+
+    def prefetch_bestrefs(self, dataset, headers):
+        """Perform the get_bestrefs() lookups _process() will need for `dataset` given
+        its lookup parameters `headers` from prefetch_headers(),  capturing their log
+        output and any exception rather than issuing them.
+
+        Returns [ (log records, bestrefs or None, exception or None), ... ]
+        """
+        contexts = [self.new_context]
+        if self.compare_prior and self.args.old_context:
+            contexts.append(self.old_context)
+        outcomes = []
+        for context, header in zip(contexts, headers):
+            try:
+                instrument = utils.header_to_instrument(header)
+            except Exception:
+                break   # _process() repeats and reports this failure before any lookup
+            records = []
+            with log.capture_records(records):
+                try:
+                    outcomes.append((records, self.compute_bestrefs(instrument, dataset, context, header), None))
+                except Exception as exc:
+                    outcomes.append((records, None, picklable_exception(exc)))
+        return outcomes
+
     def process(self, dataset):
         """Process best references for `dataset`,  printing dataset output,  collecting stats, trapping exceptions."""
         with log.error_on_exception("Failed processing", repr(dataset)):
@@ -690,14 +852,14 @@ than errors as the default.
 
     def _process(self, dataset):
         """Core best references,  add to update tuples."""
-        self.active_header = new_header = self.new_headers.get_lookup_parameters(dataset)
+        self.active_header = new_header = self.get_lookup_parameters(self.new_headers, dataset)
         instrument = utils.header_to_instrument(new_header)
         self.warn_bad_context("New-context", self.new_context, instrument)
         new_bestrefs = self.get_bestrefs(instrument, dataset, self.new_context, new_header)
         if self.compare_prior:
             self.warn_bad_context("Old-context", self.old_context, instrument)
             if self.args.old_context:
-                self.active_header = old_header = self.old_headers.get_lookup_parameters(dataset)
+                self.active_header = old_header = self.get_lookup_parameters(self.old_headers, dataset)
                 old_bestrefs = self.get_bestrefs(instrument, dataset, self.old_context, old_header)
             else:
                 old_bestrefs = self.old_headers.get_old_bestrefs(dataset)
@@ -713,7 +875,31 @@ than errors as the default.
         if kill_list:
             self.kill_list[dataset] = kill_list
 
+    def get_lookup_parameters(self, source, dataset):
+        """Return the lookup parameters for `dataset` from header generator `source`,
+        replaying the lookup made in advance by process_parallel() if there is one.
+        """
+        if self.prefetched_headers.get(dataset):
+            records, header, exc = self.prefetched_headers[dataset].pop(0)
+            log.replay_records(records)
+            if exc is not None:
+                raise exc
+            return header
+        return source.get_lookup_parameters(dataset)
+
     def get_bestrefs(self, instrument, dataset, context, header):
+        """Return the bestrefs for `dataset` with respect to loaded mapping/context `ctx`,
+        replaying the outcome computed by a --jobs worker if there is one.
+        """
+        if self.prefetched.get(dataset):
+            records, bestrefs, exc = self.prefetched[dataset].pop(0)
+            log.replay_records(records)
+            if exc is not None:
+                raise exc
+            return bestrefs
+        return self.compute_bestrefs(instrument, dataset, context, header)
+
+    def compute_bestrefs(self, instrument, dataset, context, header):
         """Compute the bestrefs for `dataset` with respect to loaded mapping/context `ctx`."""
         with log.augment_exception("Failed determining reference types for", repr(dataset),
                                    "with respect to", (instrument, context, header)):
@@ -1030,6 +1216,25 @@ than errors as the default.
 
 # ============================================================================
 
+# BestrefsScript running process_parallel(),  inherited by forked worker processes.
+_WORKER_SCRIPT = None
+
+def _init_bestrefs_worker():
+    """Load the contexts used by _WORKER_SCRIPT once per worker process."""
+    script = _WORKER_SCRIPT
+    if script.args.remote_bestrefs:
+        return
+    for context in (script.new_context, script.old_context):
+        if context:
+            with log.verbose_warning_on_exception("Failed preloading context", repr(context)):
+                crds.get_pickled_mapping(context)   # reviewed
+
+def _bestrefs_worker(work):
+    """Return the prefetched lookup outcomes for each (dataset, headers) of `work`,  in order."""
+    return [ _WORKER_SCRIPT.prefetch_bestrefs(dataset, headers) for (dataset, headers) in work ]
+
+# ============================================================================
+
 def sreprlow(s):
     """Squash unicode and return the repr() of string `s` as lower case."""
     return repr(str(s)).lower()
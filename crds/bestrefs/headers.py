@@ -5,13 +5,16 @@ For more details on the several modes of operations and command line parameters
 
 % crds bestrefs --help
 """
+import os
 import json
 import gc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # ===================================================================
 
 import crds
-from crds.core import log, utils, heavy_client
+from crds.core import log, utils, heavy_client, config
 from crds.core.exceptions import CrdsError
 from crds import data_file, matches
 from crds.client import api
@@ -86,6 +89,12 @@ class HeaderGenerator:
         """Return the full header corresponding to `source`.   Source is a dataset id or filename."""
         return self.headers[source]
 
+    def retained_sources(self):
+        """Return the number of sources behind the last one fetched whose headers are
+        still held in memory,  or None if every header fetched is kept.
+        """
+        return None
+
     def get_lookup_parameters(self, source):
         """Return the parameters corresponding to `source` used to drive a best references lookup."""
         return add_instrument(self.header(source))
@@ -276,19 +285,27 @@ class InstrumentHeaderGenerator(HeaderGenerator):
             self.segment_size = server_info.max_headers_per_rpc
         except Exception:
             self.segment_size = 5000
+        self.max_segments = max(1, config.BESTREFS_HEADER_SEGMENTS.get())
+        self._segment_index = { source : i // self.segment_size for (i, source) in enumerate(self.sources) }
+        self._segments = OrderedDict()   # { segment number : [dataset ids, ...] }  oldest first
+        self._prefetcher = None          # background thread executor, one per process
+        self._prefetcher_pid = None
+        self._prefetches = {}            # { segment number : Future }
 
     def determine_source_ids(self):
         """Return the dataset ids for all instruments."""
         server = api.get_crds_server()
-        source_ids = []
-        for instrument in self.instruments:
-            since_date = self.datasets_since(instrument)
+        instruments_since = [(instrument, self.datasets_since(instrument)) for instrument in self.instruments]
+        for instrument, since_date in instruments_since:
             if since_date:
                 log.info("Dumping dataset parameters for", repr(instrument), "from CRDS server at", repr(server),
                          "since", repr(since_date))
             else:
                 log.info("Dumping dataset parameters for", repr(instrument), "from CRDS server at", repr(server))
-            instr_ids = api.get_dataset_ids(self.context, instrument, self.datasets_since(instrument))
+        ids_map = api.get_dataset_ids_map(self.context, instruments_since)
+        source_ids = []
+        for instrument, since_date in instruments_since:
+            instr_ids = ids_map[instrument]
             log.info("Downloaded ", len(instr_ids), "dataset ids for", repr(instrument), "since", repr(since_date))
             source_ids.extend(instr_ids)
         return sorted(source_ids)  # sort is needed to match generic __iter__() sort. assumes instruments don't shuffle
@@ -302,22 +319,66 @@ class InstrumentHeaderGenerator(HeaderGenerator):
         return self.headers[source]
 
     def fetch_source_segment(self, source):
-        """Return the segment of dataset ids which surrounds id `source`."""
+        """Load the segment of dataset headers which surrounds id `source` and start
+        fetching the following segment in the background.
+        """
         try:
-            index = self.sources.index(source) // self.segment_size
-        except ValueError as exc:
+            segment = self._segment_index[source]
+        except KeyError as exc:
             raise CrdsError("Unknown dataset id " + repr(source)) from exc
-        lower = index * self.segment_size
-        upper = (index + 1) * self.segment_size
-        segment_ids = self.sources[lower:upper]
+        if segment not in self._segments:
+            future = self._get_prefetches().pop(segment, None)
+            dumped_headers = future.result() if future is not None else self.dump_segment(segment)
+            self._retain_segment(segment, dumped_headers)
+        self._prefetch_segment(segment + 1)
+
+    def retained_sources(self):
+        """Return the number of sources behind the last one fetched whose headers are
+        still held in memory,  or None if every header fetched is kept.
+        """
+        if self.save_pickles:
+            return None
+        return max(1, self.segment_size * (self.max_segments - 1))
+
+    def dump_segment(self, segment):
+        """Return { dataset_id : header, ... } for the dataset ids in `segment` from the server."""
+        lower = segment * self.segment_size
+        segment_ids = self.sources[lower:lower + self.segment_size]
         log.verbose("Dumping", len(segment_ids), "datasets from indices", lower, "to",
                     lower + len(segment_ids), verbosity=20)
         dumped_headers = api.get_dataset_headers_by_id(self.context, segment_ids)
         log.verbose("Dumped", len(dumped_headers), "datasets", verbosity=20)
+        return dumped_headers
+
+    def _retain_segment(self, segment, dumped_headers):
+        """Add `dumped_headers` for `segment` to self.headers,  discarding the oldest segments
+        beyond self.max_segments unless all headers are being kept for --save-pickle.
+        """
+        self.headers.update(dumped_headers)
         if self.save_pickles:  # keep all headers,  causes memory problems with multiple instruments on ~8G ram.
-            self.headers.update(dumped_headers)
-        else:  # conserve memory by keeping only the last N headers
-            self.headers = dumped_headers
+            return
+        self._segments[segment] = list(dumped_headers)
+        while len(self._segments) > self.max_segments:  # conserve memory by keeping only the last N segments
+            _oldest, dataset_ids = self._segments.popitem(last=False)
+            for dataset_id in dataset_ids:
+                self.headers.pop(dataset_id, None)
+
+    def _prefetch_segment(self, segment):
+        """Start dumping `segment` in a background thread if it exists and isn't already loaded."""
+        prefetches = self._get_prefetches()
+        if (segment * self.segment_size < len(self.sources) and
+                segment not in self._segments and segment not in prefetches):
+            prefetches[segment] = self._prefetcher.submit(self.dump_segment, segment)
+
+    def _get_prefetches(self):
+        """Return the pending prefetches,  discarding any inherited by a forked process
+        since the threads computing them do not exist there.
+        """
+        if self._prefetcher_pid != os.getpid():
+            self._prefetcher = ThreadPoolExecutor(max_workers=1)
+            self._prefetcher_pid = os.getpid()
+            self._prefetches = {}
+        return self._prefetches
 
 
 class PickleHeaderGenerator(HeaderGenerator):
@@ -9,7 +9,7 @@ a dataset to be processed.
 
 If the rows are different,  then the dataset should be reprocessed.  
 """
-from crds.core import rmap, log
+from crds.core import rmap, log, utils
 from crds.io import tables
 from crds.client import api
 
@@ -165,6 +165,83 @@ def mode_select(table, constraints):
         if selected:
             yield row
 
+class ModeIndex:
+    """Index of the rows of a SimpleTable by the values of a set of mode fields so that
+    rows matching a dataset's mode can be found without scanning every row.   For each
+    field,  rows are grouped by their (str_to_number) value,  with rows cmp_equal() treats
+    as wildcards kept separately since they match any mode.
+    
+    >>> class Table:
+    ...     colnames = ("OPT_ELEM", "CENWAVE", "DATA")
+    ...     rows = (("G130M", 1300, 1), ("G130M", 1309, 2), ("ANY", 1300, 3), ("G160M", 1600, 4))
+    ...     nrows = len(rows)
+    ...     def column(self, name):
+    ...         return [row[self.colnames.index(name.upper())] for row in self.rows]
+    ...     def row(self, index):
+    ...         return self.rows[index]
+    >>> params = (cmp_equal, {'wildcards': ['ANY']})
+    >>> index = ModeIndex(Table(), {'opt_elem': params, 'cenwave': params})
+    >>> sorted(index.select({'opt_elem': ('G130M',) + params, 'cenwave': (1300,) + params}))
+    [0]
+    >>> list(index.select_rows({'opt_elem': ('G160M',) + params, 'cenwave': (1600,) + params}))
+    [('G160M', 1600, 4)]
+    """
+    def __init__(self, table, mode_fields):
+        self.table = table
+        self.wildcard_rows = {}   # { field : { row index, ... } }
+        self.value_rows = {}      # { field : { value : { row index, ... } } }
+        for field, (_cmpfn, args) in mode_fields.items():
+            wildcard_rows, value_rows = set(), {}
+            for i, value in enumerate(self._column_numbers(field)):
+                # mode_select() passes `args` positionally as cmp_equal()'s `wildcards`
+                if value in args:
+                    wildcard_rows.add(i)
+                else:
+                    value_rows.setdefault(value, set()).add(i)
+            self.wildcard_rows[field] = wildcard_rows
+            self.value_rows[field] = value_rows
+
+    def _column_numbers(self, field):
+        """Yield str_to_number() of each value in the table column for `field`,  converting
+        each distinct value only once.
+        """
+        numbers = {}
+        for raw in self.table.column(field):
+            try:
+                value = numbers[raw]
+            except KeyError:
+                value = numbers[raw] = str_to_number(raw)
+            except TypeError:   # unhashable,  e.g. array valued cells
+                value = str_to_number(raw)
+            yield value
+
+    def select(self, constraints):
+        """Return the set of row indices which satisfy `constraints` as defined for mode_select(),
+        evaluating each comparison function once per distinct table value rather than once per row.
+        """
+        selected = set(range(self.table.nrows))
+        for field in constraints:
+            (value, cmpfn, args) = constraints[field]
+            matching = set(self.wildcard_rows[field])
+            for table_value, rows in self.value_rows[field].items():
+                if cmpfn(table_value, value, args):
+                    matching |= rows
+            selected &= matching
+        return selected
+
+    def select_rows(self, constraints):
+        """Return the rows which satisfy `constraints` in table order,  like mode_select()."""
+        return (self.table.row(i) for i in sorted(self.select(constraints)))
+
+@utils.xcached(max_entries=100)
+def get_mode_index(reference, rule_class):
+    """Return the ModeIndex for the first table of `reference` over the mode fields of DeepLook `rule_class`.
+
+    Bounded like tables.tables() since each ModeIndex keeps its table alive.
+    """
+    table = tables.tables(reference)[0]   # XXXX currently limited to FITS extension 1
+    return ModeIndex(table, rule_class().mode_fields)
+
 def mode_equality(modes_a, modes_b):
     """Check if the modes are equal"""
     
@@ -321,44 +398,57 @@ class DeepLook:
             if key in self.metavalues:
                 if constraint_values[key] in self.metavalues[key]:
                     constraint_values[key] = self.metavalues[key][constraint_values[key]]
+            if isinstance(constraint_values[key], list):   # hashable for verdict caching
+                constraint_values[key] = tuple(constraint_values[key])
 
-        # Read the references
-        data_old = tables.tables(old_reference)[0]   # XXXX currently limited to FITS extension 1
-        data_new = tables.tables(new_reference)[0]
+        # Datasets with the same mode get the same answer for the same pair of references.
+        mode = tuple(sorted(constraint_values.items()))
+        self.is_different, self.message = mode_verdict(self.__class__, old_reference, new_reference, mode)
 
-        # Columns must be the same between tables.
-        if sorted(data_old.colnames) != sorted(data_new.colnames):
-            self.message = 'Columns are different between references.'
-            return
+@utils.xcached(max_entries=10000)
+def mode_verdict(rule_class, old_reference, new_reference, mode):
+    """Compare the rows of `old_reference` and `new_reference` selected by `mode`,
+    ((field, value), ...),  under DeepLook `rule_class` and return (is_different, message).
+    """
+    rule = rule_class()
 
-        # Now that values are in hand, produce the full constraint
-        # dictionary
-        constraints = {}
-        for field in self.mode_fields:
-            constraints[field] = (constraint_values[field],) + self.mode_fields[field]
+    # Read the references
+    data_old = tables.tables(old_reference)[0]   # XXXX currently limited to FITS extension 1
+    data_new = tables.tables(new_reference)[0]
 
-        log.verbose(self.preamble, 'Constraints are:\n', constraints, verbosity=75)
+    # Columns must be the same between tables.
+    if sorted(data_old.colnames) != sorted(data_new.colnames):
+        return True, 'Columns are different between references.'
 
-        # Reduce the tables to just those rows that match the mode
-        # specifications.
-        mode_rows_old = [repr(row) for row in mode_select(data_old, constraints)]
-        mode_rows_new = [repr(row) for row in mode_select(data_new, constraints)]
+    index_old = get_mode_index(old_reference, rule_class)
+    index_new = get_mode_index(new_reference, rule_class)
 
-        # Sort the rows
-        mode_rows_old.sort()
-        mode_rows_new.sort()
+    # Now that values are in hand, produce the full constraint
+    # dictionary
+    constraints = {}
+    for field, value in mode:
+        constraints[field] = (value,) + rule.mode_fields[field]
 
-        log.verbose(self.preamble, 'Old reference matching rows:\n', mode_rows_old, verbosity=75)
-        log.verbose(self.preamble, 'New reference matching rows:\n', mode_rows_new, verbosity=75)
+    log.verbose(rule.preamble, 'Constraints are:\n', constraints, verbosity=75)
 
-        # Check on equality.
-        # That's all folks.
-        self.is_different = not mode_equality(mode_rows_old, mode_rows_new)
+    # Reduce the tables to just those rows that match the mode
+    # specifications.
+    mode_rows_old = [repr(row) for row in index_old.select_rows(constraints)]
+    mode_rows_new = [repr(row) for row in index_new.select_rows(constraints)]
 
-        if self.is_different:
-            self.message = 'Selection rules have executed and the selected rows are different.'
-        else:
-            self.message = 'Selection rules have executed and the selected rows are the same.'
+    # Sort the rows
+    mode_rows_old.sort()
+    mode_rows_new.sort()
+
+    log.verbose(rule.preamble, 'Old reference matching rows:\n', mode_rows_old, verbosity=75)
+    log.verbose(rule.preamble, 'New reference matching rows:\n', mode_rows_new, verbosity=75)
+
+    # Check on equality.
+    # That's all folks.
+    if not mode_equality(mode_rows_old, mode_rows_new):
+        return True, 'Selection rules have executed and the selected rows are different.'
+    else:
+        return False, 'Selection rules have executed and the selected rows are the same.'
 
 
 ################################
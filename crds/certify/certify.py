@@ -8,6 +8,8 @@ import os
 from collections import defaultdict
 import gc
 import uuid
+import logging
+import multiprocessing
 
 import numpy as np
 
@@ -17,6 +19,7 @@ import crds
 
 from crds.core import pysh, log, config, utils, rmap, cmdline
 from crds.core.exceptions import InvalidFormatError, ValidationError, MissingKeywordError, MappingInsertionError
+from crds.core.exceptions import picklable_exception
 
 from crds import data_file, diff
 from crds.io import tables
@@ -494,23 +497,25 @@ def table_mode_dictionary(generic_name, tab, mode_keys):
     log.info("Mode columns defined by spec for", generic_name, basename, "are:", repr(mode_keys))
     log.info("All column names for this table", generic_name, basename, "are:", repr(all_cols))
     log.info("Checking for duplicate modes using intersection", sorted(list(set(mode_keys)&set(all_cols))))
+    # Table row keys can vary by extension.  Have CRDS support a simple model of using
+    # whichever mode_keys are present in a given table.   Mode values are computed from
+    # the mode columns alone;  entire rows are only materialized for reported modes.
+    mode_cols = [key for key in mode_keys if key in all_cols]
+    if tab.nrows and not mode_cols:
+        log.info("Empty actual mode in", generic_name, basename, "with candidate mode columns", mode_keys)
+        return {}, []
+    mode_values = [[handle_nan(v) for v in tab.column(key)] for key in mode_cols]
     modes = defaultdict(list)
-    for i, row in enumerate(tab.rows):
-        new_row = tuple(zip(all_cols, (handle_nan(v) for v in row)))
-        rowdict = dict(new_row)
-        # Table row keys can vary by extension.  Have CRDS support a simple model of using
-        # whichever mode_keys are present in a given row.
-        mode = tuple((key, rowdict[key]) for key in mode_keys if key in rowdict)
-        if not mode:
-            log.info("Empty actual mode in", generic_name, basename, "with candidate mode columns", mode_keys)
-            return {}, []
-        modes[mode].append((i, new_row))
+    for i, values in enumerate(zip(*mode_values)):
+        modes[tuple(zip(mode_cols, values))].append(i)
+    def mode_row(i):
+        return (i, tuple(zip(all_cols, (handle_nan(v) for v in tab.row(i)))))
     for mode in sorted(modes.keys()):
         if len(modes[mode]) > 1:
             log.warning("Duplicate definitions in", generic_name, basename, "for mode:", mode, ":\n", 
-                        "\n".join([repr(row) for row in modes[mode]]))
+                        "\n".join([repr(mode_row(i)) for i in modes[mode]]))
     # modes[mode][0] is first instance of multiply defined mode.
-    return { mode:modes[mode][0] for mode in modes }, all_cols
+    return { mode:mode_row(modes[mode][0]) for mode in modes }, all_cols
 
 def handle_nan(var):
     """Map nan values to 'nan' so that 'nan' == 'nan'."""
@@ -814,7 +819,7 @@ def get_certifier_class(original_name, filepath):
 def certify_files(files, context=None, dump_provenance=False, check_references=False, 
                   compare_old_reference=False, dont_parse=False, skip_banner=False, 
                   script=None, observatory=None, comparison_reference=None, 
-                  run_fitsverify=False, check_rmap=True):
+                  run_fitsverify=False, check_rmap=True, jobs=1):
     """Check the specified list of reference or mapping `files` paths.
     
     files:                  full paths of references or mappings to check
@@ -828,20 +833,33 @@ def certify_files(files, context=None, dump_provenance=False, check_references=F
     observatory:            e.g. 'jwst' or 'hst'
     comparison_reference:   filepath to use for table comparison rather than finding in `context`.
     check_rmap:             run trial rmap update to check for overlapping reference cases. 
+    jobs:                   number of worker processes certifying files concurrently,  output matches serial.
     """
     trap = log.error_on_exception if script is None else script.error_on_exception
-    for fnum, filename in enumerate(files):
-        
-        if not skip_banner:
-            banner()
-        
-        ith = ' (' + str(fnum+1) + '/' + str(len(files)) + ')'
-        
-        certify_file(
-            filename, context=context, dump_provenance=dump_provenance, check_references=check_references, 
-            compare_old_reference=compare_old_reference, dont_parse=dont_parse, script=script, observatory=observatory,
-            comparison_reference=comparison_reference, ith=ith, run_fitsverify=run_fitsverify)
-        
+    certify_keys = dict(context=context, dump_provenance=dump_provenance, check_references=check_references, 
+                        compare_old_reference=compare_old_reference, dont_parse=dont_parse, script=script,
+                        observatory=observatory, comparison_reference=comparison_reference, 
+                        run_fitsverify=run_fitsverify)
+    if jobs > 1 and len(files) > 1 and log.get_exception_trap() and (script is None or hasattr(script, "track_error")):
+        outcomes = _certify_parallel(files, jobs, certify_keys)
+    else:
+        outcomes = None
+    try:
+        for fnum, filename in enumerate(files):
+
+            if not skip_banner:
+                banner()
+
+            ith = ' (' + str(fnum+1) + '/' + str(len(files)) + ')'
+
+            if outcomes is None:
+                certify_file(filename, ith=ith, **certify_keys)
+            else:
+                _replay_certify_outcome(next(outcomes), script)
+    finally:
+        if outcomes is not None:
+            outcomes.close()
+
     if check_rmap: # Requires checking all files in parallel, hence not in certify_file()
         if not skip_banner:
             banner()
@@ -853,6 +871,64 @@ def certify_files(files, context=None, dump_provenance=False, check_references=F
 
 # ============================================================================
 
+# Certifying files with worker processes:  each worker certifies one file at a time,
+# capturing its log records and the errors it would have tracked with the script
+# rather than issuing them.   The parent replays each file's outcome in order,  so
+# output,  error counts,  and unique error tracking are identical to a serial run.
+
+_WORKER_CERTIFY_KEYS = None
+
+def _certify_parallel(files, jobs, certify_keys):
+    """Return an iterator of _certify_worker() outcomes for each of `files`,  in order,
+    computed by `jobs` worker processes.
+    """
+    global _WORKER_CERTIFY_KEYS
+    _WORKER_CERTIFY_KEYS = certify_keys
+    log.verbose("Certifying", len(files), "files using", jobs, "processes.")
+    pool = multiprocessing.get_context("fork").Pool(min(jobs, len(files)))
+    try:
+        work = [(filename, ' (' + str(fnum+1) + '/' + str(len(files)) + ')') for (fnum, filename) in enumerate(files)]
+        for outcome in pool.imap(_certify_worker, work):
+            yield outcome
+    finally:
+        pool.terminate()
+        pool.join()
+        _WORKER_CERTIFY_KEYS = None
+
+def _certify_worker(work):
+    """Certify one (filename, ith) in a worker process,  returning (items, exception or None)
+    where items are log records and ("tracked error", args, keys) tuples for script.track_error()
+    in the order issued.   Since certify_file() does memory_cleanup,  caches are cleared in the
+    worker after each file.
+    """
+    filename, ith = work
+    keys = dict(_WORKER_CERTIFY_KEYS)
+    items = []
+    def track_error(*args, **track_keys):
+        items.append(("tracked error", args, track_keys))
+    if keys["script"] is not None:
+        keys["script"].track_error = track_error
+    with log.capture_records(items):
+        try:
+            certify_file(filename, ith=ith, **keys)
+        except Exception as exc:
+            return items, picklable_exception(exc)
+    return items, None
+
+def _replay_certify_outcome(outcome, script):
+    """Issue the log messages and tracked errors of a _certify_worker() outcome."""
+    items, exc = outcome
+    for item in items:
+        if isinstance(item, logging.LogRecord):
+            log.replay_records([item])
+        else:
+            _kind, args, keys = item
+            script.track_error(*args, **keys)
+    if exc is not None:
+        raise exc
+
+# ============================================================================
+
 @memory_cleanup
 def check_rmap_updates(observatory, context, filepaths):
     """Do a test insertion of list of reference file paths `filepaths` into 
@@ -972,6 +1048,8 @@ For more information on the checks being performed,  use --verbose or --verbosit
                           help="Run fitsverify for additional external checks on FITS files. cfitsio library must be installed separately.")
         self.add_argument("-u", "--check-rmap-updates", action="store_true",
                           help="Do a dry-run of adding reference files to the appropriate rmaps to detect errors.")
+        self.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                          help="Certify files using N worker processes.  Output and error counts match a serial run.")
 
         
         cmdline.UniqueErrorsMixin.add_args(self)
@@ -1020,7 +1098,8 @@ For more information on the checks being performed,  use --verbose or --verbosit
                       dont_parse=self.args.dont_parse,
                       script=self, observatory=self.observatory,
                       run_fitsverify=self.args.run_fitsverify,
-                      check_rmap=self.args.check_rmap_updates)
+                      check_rmap=self.args.check_rmap_updates,
+                      jobs=self.args.jobs)
     
         self.dump_unique_errors()
         return log.errors()
@@ -1070,9 +1149,15 @@ For more information on the checks being performed,  use --verbose or --verbosit
             instrument, filekind = utils.get_file_properties(self.observatory, filename)
         except Exception:
             instrument = filekind = "unknown"
-        super(CertifyScript, self).log_and_track_error(filename, instrument, filekind, *args, **keys)
+        self.track_error(filename, instrument, filekind, *args, **keys)
         return None  # to suppress re-raise
 
+    def track_error(self, filename, instrument, filekind, *args, **keys):
+        """Issue and track an error for `filename`,  replaced in --jobs worker processes
+        by a recorder so the parent can track errors in serial order.
+        """
+        super(CertifyScript, self).log_and_track_error(filename, instrument, filekind, *args, **keys)
+
     def mapping_closure(self, files):
         """Traverse the mappings in `files` and return a list of all mappings referred to by 
         `files` as well as any references in `files`.
@@ -8,7 +8,9 @@ import base64
 import re
 import zlib
 import html
+import threading
 from urllib import request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # ==============================================================================
 
@@ -22,7 +24,7 @@ from crds.core.exceptions import ServiceError, CrdsLookupError
 from crds.core.exceptions import CrdsNetworkError, CrdsDownloadError
 from crds.core.exceptions import CrdsRemoteContextError
 
-from . import proxy
+from . import proxy, connections, rpc_cache
 from .proxy import CheckingProxy
 
 # ==============================================================================
@@ -58,6 +60,7 @@ __all__ = [
     "get_dataset_headers_by_id",
     "get_dataset_headers_by_instrument",
     "get_dataset_ids",
+    "get_dataset_ids_map",
     "get_best_references_by_ids",
     "get_aui_best_references",
     "get_best_references_by_header_map",
@@ -85,6 +88,18 @@ URL_SUFFIX = "/json/"
 
 S = None    # Proxy server
 
+def _cached_rpc(method, params, ttl):
+    """Call JSON RPC `method` with `params` through the CRDS_RPC_CACHE on-disk response cache,
+    caching the result for `ttl` seconds or forever if `ttl` is None.
+    """
+    return rpc_cache.call(URL, getattr(S, method), method, params, ttl)
+
+def _context_ttl(context):
+    """Return the RPC cache lifetime for results which depend only on `context`:  forever for
+    a literal mapping name,  otherwise the TTL for results which can change on the server.
+    """
+    return None if config.is_mapping(context) else rpc_cache.default_ttl()
+
 def set_crds_server(url):
     """Configure the CRDS JSON services server to `url`,  
     e.g. 'http://localhost:8000'
@@ -139,7 +154,7 @@ def get_mapping_names(pipeline_context):
     for the specified pipeline_context.   context can be an observatory, 
     pipeline, or instrument context.
     """
-    return [str(x) for x in S.get_mapping_names(pipeline_context)]
+    return [str(x) for x in _cached_rpc("get_mapping_names", (pipeline_context,), _context_ttl(pipeline_context))]
 
 def get_reference_url(pipeline_context, reference):
     """Returns a URL for the specified reference file.    DEPRECATED
@@ -182,7 +197,7 @@ def get_file_info_map(observatory, files=None, fields=None):
 @utils.cached
 def _get_file_info_map(observatory, files, fields):
     """Memory cached version of get_file_info_map() service."""
-    infos = S.get_file_info_map(observatory, files, fields)
+    infos = _cached_rpc("get_file_info_map", (observatory, files, fields), rpc_cache.default_ttl())
     return infos
 
 def get_total_bytes(info_map):
@@ -209,7 +224,7 @@ def get_reference_names(pipeline_context):
     """Get the complete set of reference file basenames required
     for the specified pipeline_context.
     """
-    return [str(x) for x in S.get_reference_names(pipeline_context)]
+    return [str(x) for x in _cached_rpc("get_reference_names", (pipeline_context,), _context_ttl(pipeline_context))]
 
 def get_best_references(pipeline_context, header, reftypes=None):
     """Get best references for dict-like `header` relative to 
@@ -291,7 +306,7 @@ def get_default_context(observatory=None):
 @utils.cached
 def get_context_by_date(date, observatory=None):
     """Return the name of the first operational context which precedes `date`."""
-    return str(S.get_context_by_date(date, observatory))
+    return str(_cached_rpc("get_context_by_date", (date, observatory), rpc_cache.default_ttl()))
 
 @utils.cached
 def get_server_info():
@@ -334,7 +349,24 @@ def get_dataset_headers_by_id(context, dataset_ids, datasets_since=None):
 def get_dataset_ids(context, instrument, datasets_since=None):
     """Return [ dataset_id, ...] for `instrument`."""
     context = os.path.basename(context)
-    return S.get_dataset_ids(context, instrument, datasets_since)
+    return _cached_rpc("get_dataset_ids", (context, instrument, datasets_since), rpc_cache.default_ttl())
+
+def get_dataset_ids_map(context, instruments_since):
+    """Return { instrument : [ dataset_id, ...] } for each (instrument, datasets_since) of
+    `instruments_since`,  fetched in a single batch request.
+    """
+    context = os.path.basename(context)
+    if config.RPC_CACHE:   # per-instrument calls can each be answered from the RPC cache
+        return { instrument : get_dataset_ids(context, instrument, since) for (instrument, since) in instruments_since }
+    instruments = [instrument for (instrument, _since) in instruments_since]
+    return dict(zip(instruments, call_batch([("get_dataset_ids", (context, instrument, since))
+                                             for (instrument, since) in instruments_since])))
+
+def call_batch(calls):
+    """Return [ result, ... ] for JSON RPC `calls`,  [ (method_name, args), ...],  issued as a
+    single JSON-RPC 2.0 batch request when the server supports it.
+    """
+    return S._batch(calls)
 
 @utils.cached
 def get_required_parkeys(context):
@@ -344,7 +376,7 @@ def get_required_parkeys(context):
     { instrument : [ matching_parkey_name, ... ], ... }
     """
     context = os.path.basename(context)
-    return S.get_required_parkeys(context)
+    return _cached_rpc("get_required_parkeys", (context,), _context_ttl(context))
 
 def get_dataset_headers_by_instrument(context, instrument, datasets_since=None):
     """return { dataset_id:header, ...} for every `dataset_id` for `instrument`."""
@@ -485,6 +517,28 @@ def file_progress(activity, name, path, bytes, bytes_so_far, total_bytes, nth_fi
 
 # ==============================================================================
 
+# keep-alive connections for file downloads,  one per thread per server
+_CONNECTIONS = connections.ConnectionPool()
+
+# { abspath : (sha1sum, size, mtime_ns) } for files downloaded by this process
+_DOWNLOAD_DIGESTS = {}
+
+def downloaded_sha1sum(path):
+    """Return the sha1sum computed while downloading the file at `path` during this
+    process,  or None if it wasn't downloaded or has changed since.
+    """
+    try:
+        sha1sum, size, mtime_ns = _DOWNLOAD_DIGESTS[os.path.abspath(path)]
+        stat = os.stat(path)
+    except (KeyError, OSError):
+        return None
+    return sha1sum if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns) else None
+
+def _record_download_digest(path, sha1sum):
+    """Remember `sha1sum` of the file just downloaded to `path`."""
+    stat = os.stat(path)
+    _DOWNLOAD_DIGESTS[os.path.abspath(path)] = (sha1sum, stat.st_size, stat.st_mtime_ns)
+
 class FileCacher:
     """FileCacher gets remote files with simple names into a local cache."""
     def __init__(self, pipeline_context, ignore_cache=False, raise_exceptions=True):
@@ -548,10 +602,13 @@ class FileCacher:
         return int(self.info_map[os.path.basename(name)]["size"])
 
     def download_files(self, downloads, localpaths):
-        """Serial file-by-file download."""
+        """Download `downloads` serially or,  with CRDS_DOWNLOAD_THREADS > 1,  concurrently."""
         self.info_map = get_file_info_map(
             self.observatory, downloads, ["size", "rejected", "blacklisted", "state", "sha1sum", "instrument"])
         if config.writable_cache_or_verbose("Readonly cache, skipping download of (first 5):", repr(downloads[:5]), verbosity=70):
+            threads = min(config.DOWNLOAD_THREADS.get(), len(downloads))
+            if threads > 1:
+                return self.download_files_concurrent(downloads, localpaths, threads)
             bytes_so_far = 0
             total_files = len(downloads)
             total_bytes = get_total_bytes(self.info_map)
@@ -570,6 +627,48 @@ class FileCacher:
                         log.error("Failure downloading file", repr(name), ":", str(exc))
             return bytes_so_far
         return 0
+
+    def download_files_concurrent(self, downloads, localpaths, threads):
+        """Download `downloads` using a pool of `threads` worker threads,  each reusing its own
+        connection to the server.   Progress is reported relative to all workers.
+        """
+        progress = dict(started=0, bytes_so_far=0)
+        lock = threading.Lock()
+        total_files = len(downloads)
+        total_bytes = get_total_bytes(self.info_map)
+        for name in downloads:   # create directories up front,  ensure_dir_exists() is not thread safe
+            utils.ensure_dir_exists(localpaths[name])
+
+        def fetch(name):
+            if "NOT FOUND" in self.info_map[name]:
+                raise CrdsDownloadError("file is not known to CRDS server.")
+            bytes, path = self.catalog_file_size(name), localpaths[name]
+            with lock:
+                log.info(file_progress("Fetching", name, path, bytes, progress["bytes_so_far"], total_bytes,
+                                       progress["started"], total_files))
+                progress["started"] += 1
+            self.download(name, path)
+            with lock:
+                progress["bytes_so_far"] += os.stat(path).st_size
+
+        executor = ThreadPoolExecutor(max_workers=threads)
+        futures = {}
+        try:
+            for name in downloads:
+                futures[executor.submit(fetch, name)] = name
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as exc:
+                    if self.raise_exceptions:
+                        raise
+                    else:
+                        log.error("Failure downloading file", repr(futures[future]), ":", str(exc))
+        finally:
+            for future in futures:   # shutdown(cancel_futures=True) requires Python 3.9
+                future.cancel()
+            executor.shutdown(wait=True)
+        return progress["bytes_so_far"]
     
     def download(self, name, localpath):
         """Download a single file."""
@@ -601,19 +700,37 @@ class FileCacher:
             log.verbose("Exception during file removal of", repr(localpath))
 
     def download_core(self, name, localpath):
-        """Download and verify file `name` under context `pipeline_context` to `localpath`."""
-        if config.get_download_plugin():
-            self.plugin_download(name, localpath)
-        else:
-            generator = self.get_data_http(name)
-            self.generator_download(generator, localpath)
-        self.verify_file(name, localpath)
+        """Download and verify file `name` under context `pipeline_context` to `localpath`.
+
+        The file is written to a temporary name in the same directory and only renamed to
+        `localpath` once verified,  so `localpath` never exists partially downloaded.
+        """
+        temppath = localpath + ".{}.{}.part".format(os.getpid(), threading.get_ident())
+        try:
+            if config.get_download_plugin():
+                self.plugin_download(name, temppath)
+                sha1sum = None
+            else:
+                generator = self.get_data_http(name)
+                max_size = self.catalog_file_size(name) if config.get_length_flag() else None
+                sha1sum = self.generator_download(generator, temppath, max_size)
+            self.verify_file(name, temppath, sha1sum)
+            os.replace(temppath, localpath)
+            if sha1sum is not None:
+                _record_download_digest(localpath, sha1sum)
+        finally:
+            if os.path.exists(temppath):
+                self.remove_file(temppath)
         
-    def generator_download(self, generator, localpath):
-        """Read all bytes from `generator` until file is downloaded to `localpath.`"""
-        with open(localpath, "wb+") as outfile:
-            for data in generator:
-                outfile.write(data)
+    def generator_download(self, generator, localpath, max_size=None):
+        """Read all bytes from `generator` until file is downloaded to `localpath`.
+        Return the sha1sum of the bytes written.   Fail as soon as more than `max_size`
+        bytes arrive if `max_size` is not None.
+        """
+        try:
+            return utils.write_and_checksum(generator, localpath, max_size)
+        finally:
+            generator.close()
                 
     def plugin_download(self, filename, localpath):
         """Run an external program defined by CRDS_DOWNLOAD_PLUGIN to download filename to localpath."""
@@ -635,7 +752,7 @@ class FileCacher:
         """Yield the data returned from `filename` of `pipeline_context` in manageable chunks."""
         url = self.get_url(filename)
         try:
-            infile = request.urlopen(url)
+            infile = _CONNECTIONS.urlopen(url)
             file_size = utils.human_format_number(self.catalog_file_size(filename)).strip()
             stats = utils.TimingStats()
             data = infile.read(config.CRDS_DATA_CHUNK_SIZE)
@@ -660,8 +777,10 @@ class FileCacher:
         """Return the URL used to fetch `filename` of `pipeline_context`."""
         return get_root_url(filename, self.observatory) + filename
 
-    def verify_file(self, filename, localpath):
-        """Check that the size and checksum of downloaded `filename` match the server."""
+    def verify_file(self, filename, localpath, sha1sum=None):
+        """Check that the size and checksum of downloaded `filename` match the server.
+        `sha1sum` is the checksum of `localpath` if already computed during the download.
+        """
         remote_info = self.info_map[filename]
         local_length = os.stat(localpath).st_size
         original_length = int(remote_info["size"])
@@ -673,7 +792,7 @@ class FileCacher:
             log.verbose("Skipping sha1sum with CRDS_DOWNLOAD_CHECKSUMS=False")
         elif remote_info["sha1sum"] not in ["", "none"]:
             original_sha1sum = remote_info["sha1sum"]
-            local_sha1sum = utils.checksum(localpath)
+            local_sha1sum = sha1sum if sha1sum is not None else utils.checksum(localpath)
             if original_sha1sum != local_sha1sum:
                 raise CrdsDownloadError(
                     "downloaded file", srepr(filename),
@@ -0,0 +1,140 @@
+"""This module supports re-using HTTP(S) connections across CRDS client requests.
+
+urllib.request.urlopen() makes a new TCP connection,  and for HTTPS a new TLS session,
+for every request.   When syncing thousands of files from the same server that setup
+can cost as much as the transfers themselves.   ConnectionPool keeps one keep-alive
+connection per thread per (scheme, host, port) and reuses it for subsequent requests.
+Connections inherited by a forked process are dropped rather than shared with the parent.
+
+Redirects and proxies fall back to urllib.request.urlopen() so that they behave exactly
+as they would without the pool.   Other error statuses raise urllib.error.HTTPError as
+urllib.request.urlopen() would,  without sending the request a second time:
+
+    >> pool = ConnectionPool()
+    >> response = pool.urlopen("https://hst-crds.stsci.edu/unchecked_get/mappings/hst/hst.pmap")
+    >> data = response.read()
+    >> response.close()
+"""
+import io
+import os
+import ssl
+import threading
+import http.client
+from urllib import request, parse, error
+
+from crds.core import log
+
+# ==============================================================================
+
+class ConnectionPool:
+    """Per-thread keep-alive HTTP(S) connections keyed by (scheme, host, port)."""
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def urlopen(self, url, data=None, headers=None):
+        """Return a file-like response for `url` as urllib.request.urlopen() would,  reusing
+        this thread's connection to the same host when possible.   If `data` is not None
+        the request is a POST.
+        """
+        parsed = parse.urlsplit(url)
+        if parsed.scheme not in ["http", "https"] or request.getproxies() and \
+                not request.proxy_bypass(parsed.hostname or ""):
+            return self._fallback(url, data, headers)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = parse.urlunsplit(("", "", parsed.path or "/", parsed.query, ""))
+        headers = dict(headers or {})
+        for attempt in range(2):
+            connection, reused = self._get_connection(key)
+            try:
+                connection.request("POST" if data is not None else "GET", path, body=data, headers=headers)
+                response = connection.getresponse()
+            except (http.client.HTTPException, ConnectionError) as exc:
+                self.discard(key)
+                if reused and attempt == 0:   # server closed the idle connection,  try a fresh one
+                    log.verbose("Reconnecting to", repr(parsed.hostname), "after", repr(exc), verbosity=70)
+                    continue
+                raise
+            except Exception:
+                self.discard(key)
+                raise
+            if 200 <= response.status < 300:
+                return PooledResponse(self, key, response)
+            body = response.read()
+            if response.will_close or 300 <= response.status < 400:
+                self.discard(key)
+            if 300 <= response.status < 400:   # let urllib follow the redirect
+                return self._fallback(url, data, headers)
+            raise error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+
+    def _fallback(self, url, data, headers):
+        """Open `url` with urllib.request.urlopen(),  outside the pool."""
+        req = request.Request(url, data=data, headers=headers or {})
+        if self.timeout is None:
+            return request.urlopen(req)
+        return request.urlopen(req, timeout=self.timeout)
+
+    def _get_connection(self, key):
+        """Return (connection, reused) for this thread's connection to `key`."""
+        connections = self._connections()
+        if key in connections:
+            return connections[key], True
+        scheme, host, port = key
+        keys = {} if self.timeout is None else dict(timeout=self.timeout)
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(host, port, context=ssl.create_default_context(), **keys)
+        else:
+            connection = http.client.HTTPConnection(host, port, **keys)
+        connections[key] = connection
+        return connection, False
+
+    def _connections(self):
+        """Return this thread's { key : connection } dict,  discarding connections inherited
+        from the parent of a forked process since their sockets are shared with it.
+        """
+        if getattr(self._local, "pid", None) != os.getpid():
+            self._local.connections = {}
+            self._local.pid = os.getpid()
+        return self._local.connections
+
+    def discard(self, key):
+        """Close and forget this thread's connection to `key`."""
+        connection = self._connections().pop(key, None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        """Close all of this thread's connections."""
+        for key in list(self._connections()):
+            self.discard(key)
+
+# ==============================================================================
+
+class PooledResponse:
+    """File-like wrapper for an http.client response which returns its connection to the
+    pool once the response has been read completely,  or discards the connection if the
+    response is closed early.
+    """
+    def __init__(self, pool, key, response):
+        self._pool = pool
+        self._key = key
+        self._response = response
+        self.status = response.status
+        self.headers = response.headers
+
+    def read(self, size=-1):
+        """Read up to `size` bytes,  or the rest of the response if `size` is negative."""
+        return self._response.read() if size is None or size < 0 else self._response.read(size)
+
+    def close(self):
+        """Finish with the response."""
+        if not self._response.isclosed():
+            self._pool.discard(self._key)
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -7,6 +7,8 @@ import uuid
 import json
 import time
 import os
+import gzip
+import random
 
 from urllib import request
 import html
@@ -14,6 +16,8 @@ import html
 # import crds
 from crds.core import exceptions, log, config
 
+from . import connections
+
 # ============================================================================
 
 def init_urlopen():
@@ -36,17 +40,29 @@ init_urlopen()
 def apply_with_retries(func, *pars, **keys):
     """Apply function func() as f(*pargs, **keys) and return the result. Retry on any exception as defined in config.py"""
     retries = config.get_client_retry_count()
-    delay = config.get_client_retry_delay_seconds()
     for retry in range(retries):
         try:
             return func(*pars, **keys)
         except Exception as exc:
             log.verbose_warning("FAILED: Attempt", str(retry+1), "of", retries, "with:", str(exc))
-            log.verbose_warning("FAILED: Waiting for", delay, "seconds before retrying")  # waits after total fail...
-            time.sleep(delay)
             exc2 = exc
+            if retry < retries - 1:
+                delay = retry_delay_seconds(retry)
+                log.verbose_warning("FAILED: Waiting for", "%.1f" % delay, "seconds before retrying")
+                time.sleep(delay)
     raise exc2
 
+def retry_delay_seconds(retry):
+    """Return the seconds to wait after failed attempt number `retry` (0-based).   With
+    CRDS_CLIENT_RETRY_BACKOFF the delay doubles each attempt up to a limit and is randomly
+    jittered into the upper half of that range so that many clients don't retry in lockstep.
+    """
+    delay = config.get_client_retry_delay_seconds()
+    if not delay or not config.CLIENT_RETRY_BACKOFF:
+        return delay
+    limit = min(delay * 2**retry, config.CLIENT_RETRY_MAX_DELAY_SECONDS.get())
+    return random.uniform(limit / 2, limit)
+
 def message_id():
     """Return a nominal identifier for this program."""
     import crds
@@ -80,6 +96,7 @@ class CheckingProxy:
     def __init__(self, service_url, version='1.0'):
         self.__version = str(version)
         self.__service_url = service_url
+        self.__batches = True    # cleared once the server rejects a batch
 
     def __getattr__(self, name):
         """Return a callable corresponding to JSONRPC method `name`."""
@@ -88,7 +105,47 @@ class CheckingProxy:
     def __repr__(self):
         return self.__class__.__name__ + "(url='%s', version='%s')" % \
             (self.__service_url, self.__version)
-        
+
+    def _batch(self, calls):
+        """Issue the method calls of `calls`,  [(method_name, args), ...],  as a single JSON-RPC 2.0
+        batch request and return [result, ...] in the same order,  raising the exception of the
+        first failed call.   If the server doesn't support batches,  call the methods one at a time.
+        """
+        calls = [(name, tuple(args)) for (name, args) in calls]
+        if len(calls) <= 1 or not self.__batches:
+            return [getattr(self, name)(*args) for (name, args) in calls]
+        bindings = [ServiceCallBinding(self.__service_url, name, "2.0") for (name, _args) in calls]
+        requests = [binding._request(*args) for (binding, (_name, args)) in zip(bindings, calls)]
+        url = self.__service_url + "batch/" + requests[0]["id"] + "/"
+        if "serverless" in url or "server-less" in url:
+            raise exceptions.ServiceError("Configured for server-less mode.  Skipping JSON RPC batch.")
+        log.verbose("CRDS JSON RPC batch", [name for (name, _args) in calls], "-->")
+        # Not retried:  servers without batch support reject the URL,  and the individual
+        # calls of the fallback retry on their own.
+        try:
+            response = _post_jsonrpc(json.dumps(requests), url, "batch")
+        except exceptions.ServiceError as exc:
+            log.verbose("CRDS JSON RPC batch failed:", str(exc))
+            replies = None
+        else:
+            try:
+                replies = json.loads(response)
+            except Exception:
+                log.warning("Invalid CRDS jsonrpc response:\n", response)
+                raise
+        if not isinstance(replies, list):
+            log.verbose("CRDS server does not support JSON RPC batches,  calling methods individually.")
+            self.__batches = False
+            return [getattr(self, name)(*args) for (name, args) in calls]
+        replies = { reply.get("id") : reply for reply in replies if isinstance(reply, dict) }
+        results = []
+        for binding, request_ in zip(bindings, requests):
+            if request_["id"] not in replies:
+                raise exceptions.ServiceError("CRDS jsonrpc failure " + repr(request_["method"]) +
+                                              " missing from batch response.")
+            results.append(binding._result(replies[request_["id"]]))
+        return results
+
 class ServiceCallBinding:
     """When called,  ServiceCallBinding issues a JSONRPC call to the associated
     service URL.
@@ -102,18 +159,23 @@ class ServiceCallBinding:
         return self.__class__.__name__ + "(url='%s', method='%s')" % \
             (self.__service_url, self.__service_name)
         
-    def _call(self, *args, **kwargs):
-        """Core of RPC dispatch without error interpretation, logging, or return value decoding."""
+    def _request(self, *args, **kwargs):
+        """Return the JSONRPC request dictionary for calling this method with `args` or `kwargs`."""
         params = kwargs if len(kwargs) else args
         # if Any.kind(params) == Object and self.__version != '2.0':
         #   raise Exception('Unsupport arg type for JSON-RPC 1.0 '
         #                  '(the default version for this client, '
         #                  'pass version="2.0" to use keyword arguments)')
-        jsonrpc_params = {"jsonrpc": self.__version,
-                          "method": self.__service_name,
-                          'params': params,
-                          'id': message_id()
-                         }
+        return {"jsonrpc": self.__version,
+                "method": self.__service_name,
+                'params': params,
+                'id': message_id()
+               }
+
+    def _call(self, *args, **kwargs):
+        """Core of RPC dispatch without error interpretation, logging, or return value decoding."""
+        jsonrpc_params = self._request(*args, **kwargs)
+        params = jsonrpc_params["params"]
         
         parameters = json.dumps(jsonrpc_params)
         
@@ -146,19 +208,14 @@ class ServiceCallBinding:
 
     def _call_service(self, parameters, url):
         """Call the JSONRPC defined by `parameters` and raise a ServiceError on any exception."""
-        if not isinstance(parameters, bytes):
-            parameters = parameters.encode("utf-8")
-        try:
-            channel = request.urlopen(url, parameters)
-            return channel.read().decode("utf-8")
-        except Exception as exc:
-            raise exceptions.ServiceError("CRDS jsonrpc failure " + repr(self.__service_name) + " " + str(exc)) from exc
-
- 
+        return _post_jsonrpc(parameters, url, self.__service_name)
 
     def __call__(self, *args, **kwargs):
-        jsonrpc = self._call(*args, **kwargs)
-        if jsonrpc["error"]:
+        return self._result(self._call(*args, **kwargs))
+
+    def _result(self, jsonrpc):
+        """Return the decoded result of JSONRPC response dict `jsonrpc`,  or raise its error."""
+        if jsonrpc.get("error"):
             decoded = str(html.unescape(jsonrpc["error"]["message"]))
             raise self.classify_exception(decoded)
         else:
@@ -180,6 +237,32 @@ class ServiceCallBinding:
             msg = "CRDS jsonrpc failure " + repr(self.__service_name) + " " + str(decoded)
             return exceptions.ServiceError(msg)
 
+# keep-alive connections for JSON RPC calls,  one per thread per server
+_CONNECTIONS = connections.ConnectionPool()
+
+def _post_jsonrpc(parameters, url, service_name):
+    """POST JSONRPC request string `parameters` to `url` over a pooled keep-alive connection
+    and return the response string,  raising a ServiceError on any exception.   With
+    CRDS_RPC_GZIP the request is gzipped and a gzipped response is accepted.
+    """
+    if not isinstance(parameters, bytes):
+        parameters = parameters.encode("utf-8")
+    headers = { "Content-Type" : "application/x-www-form-urlencoded" }
+    if config.RPC_GZIP:
+        parameters = gzip.compress(parameters)
+        headers.update({ "Content-Encoding" : "gzip", "Accept-Encoding" : "gzip" })
+    try:
+        channel = _CONNECTIONS.urlopen(url, parameters, headers)
+        try:
+            response = channel.read()
+        finally:
+            channel.close()
+        if channel.headers.get("Content-Encoding", "") == "gzip":
+            response = gzip.decompress(response)
+        return response.decode("utf-8")
+    except Exception as exc:
+        raise exceptions.ServiceError("CRDS jsonrpc failure " + repr(service_name) + " " + str(exc)) from exc
+
 def fix_strings(rval):
     """Convert unicode to strings."""
     if isinstance(rval, str):
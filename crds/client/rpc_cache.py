@@ -0,0 +1,147 @@
+"""This module implements an on-disk cache of CRDS JSON RPC results,  enabled by setting
+CRDS_RPC_CACHE=1,  so that repeated pipeline and crds.bestrefs runs don't re-fetch the
+same metadata from the server.
+
+The cache is a sqlite3 database in the root CRDS config area.   Each result is stored
+under the sha1sum of its (server URL, method, parameters) so identical calls made by
+different programs share entries:
+
+    calls      key, method, expires, accessed, size, result
+
+Results which cannot change for a given set of parameters,  e.g. the mapping names of a
+literal .pmap,  are stored with ttl=None and never expire.   Results which can change,
+e.g. file states or dataset ids,  are stored with a ttl of CRDS_RPC_CACHE_TTL_SECONDS.
+When the cached results exceed CRDS_RPC_CACHE_MAX_MB the least recently used are evicted.
+
+    >> call(api.URL, api.S.get_mapping_names, "get_mapping_names", ("hst_0001.pmap",), ttl=None)
+    ['hst_0001.pmap', 'hst_acs_0001.imap', ...]
+"""
+import os
+import json
+import time
+import sqlite3
+
+from crds.core import config, log, utils
+
+# ============================================================================
+
+FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calls (key TEXT PRIMARY KEY, method TEXT, expires REAL, accessed REAL,
+                                  size INTEGER, result TEXT);
+CREATE INDEX IF NOT EXISTS calls_by_accessed ON calls (accessed);
+"""
+
+# ============================================================================
+
+def connect():
+    """Return a sqlite3 connection to the RPC cache,  creating it if needed.   A cache with
+    an unsupported format version is discarded.
+    """
+    path = config.locate_rpc_cache()
+    utils.ensure_dir_exists(path)
+    connection = sqlite3.connect(path, timeout=30)
+    version, = connection.execute("PRAGMA user_version").fetchone()
+    if version != FORMAT_VERSION:
+        connection.executescript("DROP TABLE IF EXISTS calls;")
+        connection.executescript(_SCHEMA)
+        connection.execute("PRAGMA user_version = {}".format(FORMAT_VERSION))
+        connection.commit()
+    return connection
+
+def call_key(url, method, params):
+    """Return the content address of calling JSON RPC `method` with `params` at `url`."""
+    return utils.str_checksum(json.dumps([url, method, params], sort_keys=True))
+
+def default_ttl():
+    """Return the lifetime in seconds of results which can change on the server."""
+    return config.RPC_CACHE_TTL_SECONDS.get()
+
+# ============================================================================
+
+def call(url, binding, method, params, ttl):
+    """Return the result of calling JSON RPC `method` of proxy `binding` with `params`,
+    reusing a result cached for the same `url`,  method,  and parameters if one exists.
+    Cache new results for `ttl` seconds,  or forever if `ttl` is None.   When the RPC cache
+    is disabled or `ttl` is 0,  just call the method.
+    """
+    if not config.RPC_CACHE or ttl == 0:
+        return binding(*params)
+    key = call_key(url, method, list(params))
+    result = _lookup(key)
+    if result is not None:
+        log.verbose("RPC cache hit for", repr(method), verbosity=65)
+        return json.loads(result)
+    value = binding(*params)
+    _store(key, method, value, ttl)
+    return value
+
+def _lookup(key):
+    """Return the unexpired JSON result text cached under `key`,  or None."""
+    if config.get_cache_readonly() and not os.path.exists(config.locate_rpc_cache()):
+        return None
+    with log.verbose_warning_on_exception("Failed reading RPC cache"):
+        connection = connect()
+        try:
+            row = connection.execute("SELECT expires, result FROM calls WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            expires, result = row
+            now = time.time()
+            if expires is not None and expires <= now:
+                if not config.get_cache_readonly():
+                    connection.execute("DELETE FROM calls WHERE key = ?", (key,))
+                    connection.commit()
+                return None
+            if not config.get_cache_readonly():
+                connection.execute("UPDATE calls SET accessed = ? WHERE key = ?", (now, key))
+                connection.commit()
+            return result
+        finally:
+            connection.close()
+    return None
+
+def _store(key, method, value, ttl):
+    """Cache JSON encodable `value` under `key` for `ttl` seconds,  evicting the least
+    recently used results if the cache grows beyond CRDS_RPC_CACHE_MAX_MB.
+    """
+    if config.get_cache_readonly():
+        return
+    with log.verbose_warning_on_exception("Failed writing RPC cache"):
+        result = json.dumps(value)
+        now = time.time()
+        connection = connect()
+        try:
+            connection.execute("INSERT OR REPLACE INTO calls VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, method, None if ttl is None else now + ttl, now, len(result), result))
+            _evict(connection, config.RPC_CACHE_MAX_MB.get() * 2**20)
+            connection.commit()
+        finally:
+            connection.close()
+
+def _evict(connection, max_bytes):
+    """Delete expired results,  then least recently used results until the total size of
+    cached results is under `max_bytes`.
+    """
+    connection.execute("DELETE FROM calls WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+    total, = connection.execute("SELECT COALESCE(SUM(size), 0) FROM calls").fetchone()
+    if total <= max_bytes:
+        return
+    evicted = []
+    for key, size in connection.execute("SELECT key, size FROM calls ORDER BY accessed").fetchall():
+        if total <= max_bytes:
+            break
+        evicted.append((key,))
+        total -= size
+    connection.executemany("DELETE FROM calls WHERE key = ?", evicted)
+    log.verbose("Evicted", len(evicted), "results from RPC cache.", verbosity=55)
+
+def clear():
+    """Remove all cached RPC results."""
+    connection = connect()
+    try:
+        connection.execute("DELETE FROM calls")
+        connection.commit()
+    finally:
+        connection.close()
@@ -122,6 +122,7 @@ class Script:
     def __init__(self, argv=None, parser_pars=None, reset_log=True, print_status=False):
         self.stats = utils.TimingStats()
         self._already_reported_stats = False
+        self._already_reported_cache_stats = False
         if isinstance(argv, str):
             argv = argv.split()
         elif argv is None:
@@ -291,6 +292,8 @@ class Script:
             help="Force observatory to HST for determining header conventions.""")
         self.add_argument("--stats", action="store_true",
             help="Track and print timing statistics.")
+        self.add_argument("--cache-stats", action="store_true",
+            help="Print hit, miss, eviction, and size statistics of CRDS function caches on exit.")
         self.add_argument("--profile", 
             help="Output profile stats to the specified file.", type=str, default="")
         self.add_argument("--log-time", action="store_true",
@@ -439,6 +442,9 @@ class Script:
         if self.args.stats and not self._already_reported_stats:
             self.stats.report()
             self._already_reported_stats = True
+        if self.args.cache_stats and not self._already_reported_cache_stats:
+            utils.report_function_cache_stats()
+            self._already_reported_cache_stats = True
     
     def increment_stat(self, name, amount=1):
         """Add `amount` to the statistics counter for `name`."""
@@ -332,6 +332,32 @@ FITS_IGNORE_MISSING_END = BooleanConfigItem("CRDS_FITS_IGNORE_MISSING_END", Fals
 FITS_VERIFY_CHECKSUM = BooleanConfigItem("CRDS_FITS_VERIFY_CHECKSUM", True,
     "When True, verify that FITS header CHECKSUM and DATASUM values are correct.  Otherwise fail.")
 
+FITS_FAST_HEADERS = BooleanConfigItem("CRDS_FITS_FAST_HEADERS", True,
+    "When True, read FITS headers by scanning header blocks directly, using astropy only for unusual files.")
+
+DIFF_CONTENT_HASHES = BooleanConfigItem("CRDS_DIFF_CONTENT_HASHES", True,
+    "When True, skip differencing mapping and selector subtrees whose content hashes are identical.")
+
+DIFF_CACHE = BooleanConfigItem("CRDS_DIFF_CACHE", False,
+    "When True, save mapping differences on disk keyed by the content hashes of the two mapping "
+    "hierarchies and reuse them.")
+
+DIFF_CACHE_MAX_FILES = IntConfigItem("CRDS_DIFF_CACHE_MAX_FILES", 1000,
+    "Limits the number of saved CRDS_DIFF_CACHE differences,  removing the least recently used.")
+
+ROWDIFF_ENGINE = StrConfigItem("CRDS_ROWDIFF_ENGINE", "auto",
+    "Selects how crds.rowdiff matches table rows: 'hash' joins rows on their hashed values, "
+    "'difflib' uses difflib.SequenceMatcher,  'auto' uses difflib unless a table has more than "
+    "CRDS_ROWDIFF_HASH_ROWS rows.",
+    valid_values=["auto", "hash", "difflib"], lower=True)
+
+ROWDIFF_HASH_ROWS = IntConfigItem("CRDS_ROWDIFF_HASH_ROWS", 10000,
+    "With CRDS_ROWDIFF_ENGINE=auto,  tables or mode lists longer than this are matched by hash join "
+    "since difflib's roughly quadratic matching stalls on them.")
+
+TABLE_MEMMAP = BooleanConfigItem("CRDS_TABLE_MEMMAP", False,
+    "When True, open FITS tables memory mapped for certify and bestrefs table row access.")
+
 ADD_LOG_MSG_COUNTER = BooleanConfigItem(
     "CRDS_ADD_LOG_MSG_COUNTER", False, "When True, add a running counter.")
 log.set_add_log_msg_count(ADD_LOG_MSG_COUNTER)
@@ -373,6 +399,16 @@ CRDS_CHECKSUM_BLOCK_SIZE = 2**23
 # IntConfigItem("CRDS_CHECKSUM_BLOCK_SIZE", 2**23,
 #    "Size of data read into memory at once for utils.checksum.")
 
+CHECKSUM_WORKERS = IntConfigItem("CRDS_CHECKSUM_WORKERS", 4,
+    "Number of files utils.checksums() hashes concurrently.  1 computes sha1sums one file at a time.")
+
+CHECKSUM_POOL = StrConfigItem("CRDS_CHECKSUM_POOL", "threads",
+    "Kind of worker pool utils.checksums() uses,  threads or processes.",
+    valid_values=["threads", "processes"], lower=True)
+
+VERIFICATION_LEDGER = BooleanConfigItem("CRDS_VERIFICATION_LEDGER", True,
+    "When True, crds.sync records verified sha1sums and skips rehashing files whose size, mtime, and inode are unchanged.")
+
 # ===========================================================================
 
 # To support testing, the default cache is configurable.  Ordinarily
@@ -553,11 +589,73 @@ USE_PICKLED_CONTEXTS = BooleanConfigItem("CRDS_USE_PICKLED_CONTEXTS", False,
 AUTO_PICKLE_CONTEXTS = BooleanConfigItem("CRDS_AUTO_PICKLE_CONTEXTS", False,
     "When True, CRDS contexts should be automatically pickled and cached after loading.")
 
+PICKLE_FORMAT = StrConfigItem("CRDS_PICKLE_FORMAT", "pickle",
+    "Selects the format of cached loaded contexts: 'pickle' pickles the whole context, "
+    "'compact' uses crds.core.context_cache files which load each mapping on demand.",
+    valid_values=["pickle", "compact"], lower=True)
+
+def locate_context_cache(mapping, observatory=None):
+    """Return the absolute path where the compact context cache for `mapping` should be located."""
+    if os.path.dirname(mapping):
+        return mapping
+    if observatory is None:
+        observatory = mapping_to_observatory(mapping)
+    return os.path.join(get_crds_picklepath(observatory), mapping + ".ctx")
+
+def locate_context_manifest(mapping, observatory=None):
+    """Return the absolute path where the demand-load manifest for `mapping` should be located."""
+    if observatory is None:
+        observatory = mapping_to_observatory(mapping)
+    return os.path.join(get_crds_picklepath(observatory), os.path.basename(mapping) + ".manifest.json")
+
+def locate_reverse_index(observatory):
+    """Return the absolute path of the reverse index database for `observatory`."""
+    return os.path.join(get_crds_cfgpath(observatory), "reverse_index.db")
+
+def locate_rpc_cache():
+    """Return the absolute path of the JSON RPC response cache database."""
+    return os.path.join(get_crds_root_cfgpath(), "rpc_cache.db")
+
+def locate_diff_cache(key):
+    """Return the absolute path of the cached mapping differences stored under `key`."""
+    return os.path.join(get_crds_root_cfgpath(), "diffs", key + ".pkl")
+
+def locate_verification_ledger(observatory):
+    """Return the absolute path of the crds.sync verification ledger for `observatory`."""
+    return os.path.join(get_crds_cfgpath(observatory), "verification_ledger.db")
+
 # -------------------------------------------------------------------------------------
 
 FORCE_COMPLETE_LOAD = BooleanConfigItem("CRDS_FORCE_COMPLETE_LOAD", False,
     "When True, force CRDS contexts to load in their entirety rather than based on what is actually used.")
 
+DEMAND_LOAD = BooleanConfigItem("CRDS_DEMAND_LOAD", False,
+    "When True, take the required parkeys of contexts from precomputed manifests so rmaps load only when selected.")
+
+REVERSE_INDEX = BooleanConfigItem("CRDS_REVERSE_INDEX", False,
+    "When True, answer crds.uses and crds.matches queries from a persistent index of cached mappings.")
+
+BESTREFS_HEADER_SEGMENTS = IntConfigItem("CRDS_BESTREFS_HEADER_SEGMENTS", 2,
+    "Number of server segments of dataset headers crds.bestrefs keeps in memory when not saving pickles.")
+
+LOOKUP_CACHE_SIZE = IntConfigItem("CRDS_LOOKUP_CACHE_SIZE", 0,
+    "Maximum number of best reference results each rmap memoizes by conditioned parameter values,  0 disables.")
+
+DATE_CACHE_SIZE = IntConfigItem("CRDS_DATE_CACHE_SIZE", 10000,
+    "Maximum number of date/time strings timestamp.reformat_date() memoizes,  0 defers to "
+    "CRDS_FUNCTION_CACHE_MAX_ENTRIES.")
+
+FUNCTION_CACHE_MAX_ENTRIES = IntConfigItem("CRDS_FUNCTION_CACHE_MAX_ENTRIES", 0,
+    "Maximum results each @utils.cached function without its own limit keeps,  least recently used evicted first,  0 is unbounded.")
+
+FUNCTION_CACHE_LIMITS = StrConfigItem("CRDS_FUNCTION_CACHE_LIMITS", "",
+    "Comma separated per function cache limits of entries or megabytes,  e.g. 'get_free_header=500,_load_mapping=256MB'.")
+
+MATCH_INDEX_MODE = StrConfigItem("CRDS_MATCH_INDEX_MODE", "index",
+    "Selects how Match selectors find candidates: 'index' uses the compiled per-parameter index, "
+    "'winnow' scans every match tuple, 'parity' does both and fails if they disagree.",
+    valid_values=["index", "winnow", "parity"], lower=True)
+
 EXPLICIT_GARBAGE_COLLECTION = BooleanConfigItem("CRDS_EXPLICIT_GARBAGE_COLLECTION", True,
     "When False, the @gc_collected function decorator skips garbage collection.")
 # -------------------------------------------------------------------------------------
@@ -732,6 +830,9 @@ def get_length_flag():
     """
     return DOWNLOAD_LENGTHS.get()
 
+DOWNLOAD_THREADS = IntConfigItem(
+    "CRDS_DOWNLOAD_THREADS", 1, "Number of files CRDS downloads concurrently.  1 downloads files one at a time.")
+
 CLIENT_RETRY_COUNT = IntConfigItem(
     "CRDS_CLIENT_RETRY_COUNT", 1, "Integer number of times CRDS should retry download errors.  No retries == 1.")
 
@@ -746,6 +847,24 @@ def get_client_retry_delay_seconds():
     """Return the integer number of seconds CRDS should wait between retrying failed network transactions."""
     return CLIENT_RETRY_DELAY_SECONDS.get()
 
+CLIENT_RETRY_BACKOFF = BooleanConfigItem("CRDS_CLIENT_RETRY_BACKOFF", True,
+    "When True, double the retry delay after each failed attempt, with random jitter, up to CRDS_CLIENT_RETRY_MAX_DELAY_SECONDS.")
+
+CLIENT_RETRY_MAX_DELAY_SECONDS = IntConfigItem("CRDS_CLIENT_RETRY_MAX_DELAY_SECONDS", 120,
+    "Maximum seconds CRDS waits between retries when CRDS_CLIENT_RETRY_BACKOFF is enabled.")
+
+RPC_GZIP = BooleanConfigItem("CRDS_RPC_GZIP", False,
+    "When True, gzip JSON RPC requests to the CRDS server and accept gzipped responses.")
+
+RPC_CACHE = BooleanConfigItem("CRDS_RPC_CACHE", False,
+    "When True, cache the results of idempotent JSON RPC calls to the CRDS server on disk.")
+
+RPC_CACHE_TTL_SECONDS = IntConfigItem("CRDS_RPC_CACHE_TTL_SECONDS", 3600,
+    "Seconds cached results of JSON RPC calls which can change on the server remain valid.  0 disables caching them.")
+
+RPC_CACHE_MAX_MB = IntConfigItem("CRDS_RPC_CACHE_MAX_MB", 256,
+    "Megabytes of JSON RPC results cached before the least recently used are evicted.")
+
 def enable_retries(retry_count=20, delay_seconds=10):
     """Set reasonable defaults for CRDS retries"""
     CLIENT_RETRY_COUNT.set(retry_count)
@@ -0,0 +1,216 @@
+"""This module defines a compact cache format for loaded CRDS contexts,  an alternative
+to pickling an entire PipelineContext as done by heavy_client.save_pickled_mapping().
+
+Context pickles must be read and unpickled in full,  and ReferenceMapping.__setstate__()
+recompiles the rmap header expressions of every rmap in the context on load.   A context
+cache file instead stores one record per mapping in the context closure,  each with its
+nested selections left unloaded,  behind an index of record offsets.   The file is memory
+mapped and a record is only unpickled when the mapping it describes is actually selected,
+so a pipeline which computes bestrefs for one instrument only touches that instrument's
+.imap and .rmaps.   Rmap records carry their compiled header expressions as marshaled code
+and selectors carry their prebuilt match indexes,  so no recompilation occurs on load.
+
+File layout:
+
+    MAGIC                   8 bytes
+    header size             8 bytes,  little endian
+    header                  JSON:  { "version" : FORMAT_VERSION,
+                                     "python" : <hex importlib.util.MAGIC_NUMBER>,
+                                     "context" : <.pmap name>,
+                                     "sha1sum" : <sha1 of .pmap file>,
+                                     "records" : { <mapping name> : [offset, size], ... } }
+    records                 pickled mapping records,  offsets relative to the end of the header
+
+A cache file is rejected when its magic or version differ from this module's,  when it was
+written by a Python with a different bytecode magic number since marshaled code is not
+portable between Python versions,  or when its sha1sum does not match the .pmap file in
+the CRDS cache.   Records which fail to load later,  when a nested mapping is selected,  are
+loaded from the mapping files instead.
+"""
+import os
+import json
+import mmap
+import struct
+import pickle
+import marshal
+import importlib.util
+
+from . import rmap, log, context_manifest
+from .exceptions import CrdsError
+
+# ============================================================================
+
+MAGIC = b"CRDSCTX\n"
+
+FORMAT_VERSION = 1
+
+PYTHON_MAGIC = importlib.util.MAGIC_NUMBER.hex()   # marshal format of compiled rmap expressions
+
+_SIZE = struct.Struct("<Q")
+
+# ============================================================================
+
+class ContextCacheError(CrdsError):
+    """The context cache file is missing, stale,  or not in a supported format."""
+
+# ============================================================================
+
+def dumps(loaded):
+    """Return the bytes of a context cache file for fully loaded PipelineContext `loaded`."""
+    loaded.force_load()
+    records, offsets, offset = [], {}, 0
+    for mapping in _closure(loaded):
+        record = _dump_record(mapping)
+        offsets[mapping.basename] = [offset, len(record)]
+        records.append(record)
+        offset += len(record)
+    header = json.dumps(dict(
+        version = FORMAT_VERSION,
+        python = PYTHON_MAGIC,
+        context = loaded.basename,
+        sha1sum = context_manifest.mapping_sha1sum(loaded.basename),
+        records = offsets,
+        )).encode("utf-8")
+    return b"".join([MAGIC, _SIZE.pack(len(header)), header] + records)
+
+def load(path, mapping):
+    """Return the PipelineContext `mapping` from the context cache file at `path`,  loading only
+    the top level mapping now and nested mappings as they are selected.
+    """
+    return open_cache(path, mapping).load_record(mapping)
+
+def open_cache(path, mapping):
+    """Return the ContextCacheFile at `path`,  reusing one already opened by this process
+    as long as it still describes `mapping`.
+    """
+    cache = _OPEN_CACHES.get(path)
+    if cache is None or cache.context != mapping or not cache.is_current():
+        cache = _OPEN_CACHES[path] = ContextCacheFile(path, mapping)
+    return cache
+
+def clear_open_caches():
+    """Forget the context cache files opened by this process."""
+    _OPEN_CACHES.clear()
+
+_OPEN_CACHES = {}   # { path : ContextCacheFile }
+
+def load_record(mapping, **keys):
+    """Loader for the selections of mappings loaded from a context cache:  load nested
+    `mapping` from the cache file named by keys["context_cache"],  or from the mapping
+    file if that fails.
+    """
+    path = keys["context_cache"]
+    try:
+        cache = _OPEN_CACHES.get(path)
+        if cache is None:
+            cache = _OPEN_CACHES[path] = ContextCacheFile(path)
+        return cache.load_record(mapping)
+    except Exception as exc:
+        log.verbose_warning("Failed loading", repr(mapping), "from context cache", repr(path),
+                            ":", str(exc), ":  loading mapping file instead.")
+        keys = dict(keys, loader=rmap.get_cached_mapping)
+        del keys["context_cache"]
+        return rmap.get_cached_mapping(mapping, **keys)
+
+# ============================================================================
+
+class ContextCacheFile:
+    """Read-only, memory mapped view of a context cache file.
+
+    >> cache = ContextCacheFile("/crds/cache/pickles/hst/hst_0001.pmap.ctx", "hst_0001.pmap")
+    >> cache.load_record("hst_0001.pmap")
+    PipelineContext('hst_0001.pmap')
+    """
+    def __init__(self, path, context=None):
+        self.path = path
+        with open(path, "rb") as handle:
+            self._stat = os.fstat(handle.fileno())
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ContextCacheError("File", repr(path), "is not a CRDS context cache.")
+        start = len(MAGIC) + _SIZE.size
+        header_size, = _SIZE.unpack(self._mmap[len(MAGIC):start])
+        header = json.loads(self._mmap[start:start+header_size].decode("utf-8"))
+        if header["version"] != FORMAT_VERSION:
+            raise ContextCacheError("Context cache", repr(path), "has format version", header["version"],
+                                    "but version", FORMAT_VERSION, "is required.")
+        if header.get("python") != PYTHON_MAGIC:
+            raise ContextCacheError("Context cache", repr(path), "is stale,  written by a different Python version.")
+        self.context = header["context"]
+        if context is not None and context != self.context:
+            raise ContextCacheError("Context cache", repr(path), "contains", repr(self.context),
+                                    "not", repr(context))
+        if header["sha1sum"] != context_manifest.mapping_sha1sum(self.context):
+            raise ContextCacheError("Context cache", repr(path), "is stale with respect to", repr(self.context))
+        self._records = header["records"]
+        self._base = start + header_size
+
+    def is_current(self):
+        """Return True IFF the file at self.path is still the one mapped by this object."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_ino, stat.st_mtime, stat.st_size) == (
+            self._stat.st_ino, self._stat.st_mtime, self._stat.st_size)
+
+    def __contains__(self, mapping):
+        return mapping in self._records
+
+    def load_record(self, mapping):
+        """Unpickle and return the Mapping named `mapping`.   Nested selections are loaded
+        from this file on demand.
+        """
+        mapping = os.path.basename(mapping)
+        if mapping not in self._records:
+            raise ContextCacheError("Context cache", repr(self.path), "has no record for", repr(mapping))
+        offset, size = self._records[mapping]
+        start = self._base + offset
+        loaded = _load_record(self._mmap[start:start+size])
+        if isinstance(loaded, rmap.ContextMapping):
+            loaded.selections._xx_load_keys["loader"] = load_record
+            loaded.selections._xx_load_keys["context_cache"] = self.path
+        log.verbose("Loaded", repr(mapping), "from context cache", repr(self.path), verbosity=60)
+        return loaded
+
+# ============================================================================
+
+def _closure(loaded):
+    """Yield each distinct Mapping in the closure of `loaded`,  parents first."""
+    seen = set()
+    pending = [loaded]
+    while pending:
+        mapping = pending.pop(0)
+        if mapping.basename in seen:
+            continue
+        seen.add(mapping.basename)
+        yield mapping
+        if isinstance(mapping, rmap.ContextMapping):
+            pending.extend(mapping.selections.normal_values())
+
+def _dump_record(mapping):
+    """Return the pickled record for `mapping`."""
+    state = dict(mapping.__dict__)
+    if isinstance(mapping, rmap.ContextMapping):
+        load_keys = dict(mapping.selections._xx_load_keys)
+        if load_keys.pop("context_cache", None) is not None:
+            load_keys["loader"] = rmap.get_cached_mapping
+        state["keys"] = load_keys
+        state["selections"] = rmap.MappingSelectionsDict(mapping.selections._xx_selector, load_keys)
+        compiled = None
+    elif isinstance(mapping, rmap.ReferenceMapping):
+        state = mapping.__getstate__()
+        compiled = marshal.dumps(mapping.get_compiled_exprs())
+    else:
+        compiled = None
+    return pickle.dumps((mapping.__class__, state, compiled), pickle.HIGHEST_PROTOCOL)
+
+def _load_record(record):
+    """Return the Mapping restored from pickled `record`."""
+    cls, state, compiled = pickle.loads(record)
+    mapping = cls.__new__(cls)
+    mapping.__dict__ = state
+    if compiled is not None:
+        mapping._init_compiled(marshal.loads(compiled))
+        mapping._init_lookup_cache()
+    return mapping
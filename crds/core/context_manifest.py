@@ -0,0 +1,94 @@
+"""This module supports "demand-load" operation of CRDS contexts,  enabled by setting
+CRDS_DEMAND_LOAD=1.
+
+Loading a context is already lazy with respect to the .imaps and .rmaps it selects,
+but computing the required parkeys of a context,  as done for every bestrefs header by
+Mapping.minimize_header(),  loads and parses every .rmap of the instrument.   A pipeline
+step which needs one reference type then pays to parse dozens of rmaps it never uses.
+
+A demand-load manifest is a small JSON file saved in the CRDS cache next to context
+pickles which records the required parkeys of a .pmap and each of its .imaps:
+
+    { "version" : FORMAT_VERSION,
+      "context" : <.pmap name>,
+      "sha1sum" : <sha1 of .pmap file>,
+      "parkeys" : { <.pmap name> : { <instrument> : [ parkey, ...], ... },
+                    <.imap name> : [ parkey, ... ], ... } }
+
+In demand-load mode a PipelineContext loads its manifest when it is constructed and
+get_required_parkeys() answers from it,  so .rmaps are parsed only when a filekind is
+actually selected.   Mapping names are never reused for different contents,  so manifest
+entries apply to their mappings no matter which context selects them.   A manifest whose
+version or .pmap checksum does not match is ignored.
+
+Manifests are written by heavy_client.save_pickled_mapping(),  e.g. by crds sync --save-pickles,
+or directly using save_manifest().
+"""
+import os
+import json
+
+from . import log, utils, config
+
+# ============================================================================
+
+FORMAT_VERSION = 1
+
+# { mapping : required_parkeys } from every manifest loaded by this process.   Entries are
+# kept when function caches are cleared since mapping names are never reused.
+_PARKEYS = {}
+
+# ============================================================================
+
+def save_manifest(loaded):
+    """Compute the manifest for loaded context `loaded` and write it to the CRDS cache."""
+    from .heavy_client import cache_atomic_write
+    path = config.locate_context_manifest(loaded.basename)
+    loaded.force_load()
+    contexts = [loaded] + [mapping for mapping in loaded.selections.normal_values() if hasattr(mapping, "selections")]
+    contents = json.dumps(dict(
+        version = FORMAT_VERSION,
+        context = loaded.basename,
+        sha1sum = mapping_sha1sum(loaded.basename),
+        parkeys = { mapping.basename : mapping.get_required_parkeys() for mapping in contexts },
+        ), indent=1, sort_keys=True)
+    cache_atomic_write(path, contents, "DEMAND-LOAD MANIFEST")
+    log.verbose("Saved demand-load manifest", repr(path))
+
+@utils.cached
+def load_manifest(context):
+    """Return { mapping : required_parkeys, ... } from the manifest of `context` in the CRDS cache,
+    or {} if there is no current manifest for `context`.   The parkeys are also recorded for
+    get_required_parkeys().
+    """
+    path = config.locate_context_manifest(context)
+    if not os.path.exists(path):
+        log.verbose("No demand-load manifest for", repr(context), "at", repr(path))
+        return {}
+    with log.verbose_warning_on_exception("Failed loading demand-load manifest", repr(path)):
+        with open(path) as handle:
+            manifest = json.load(handle)
+        if manifest["version"] != FORMAT_VERSION or manifest["context"] != os.path.basename(context):
+            log.verbose_warning("Ignoring demand-load manifest", repr(path), "with unsupported version or context.")
+        elif manifest["sha1sum"] != mapping_sha1sum(context):
+            log.verbose_warning("Ignoring stale demand-load manifest", repr(path))
+        else:
+            log.verbose("Loaded demand-load manifest", repr(path))
+            _PARKEYS.update(manifest["parkeys"])
+            return manifest["parkeys"]
+    return {}
+
+def get_required_parkeys(mapping):
+    """Return the required parkeys of context `mapping` recorded in any manifest loaded so far,
+    or None if no loaded manifest describes `mapping`.
+    """
+    value = _PARKEYS.get(mapping)
+    if value is None:
+        return None
+    return { key : list(val) for (key, val) in value.items() } if isinstance(value, dict) else list(value)
+
+def mapping_sha1sum(mapping):
+    """Return the sha1sum of `mapping` in the CRDS cache,  or None if it's not there."""
+    path = config.locate_mapping(mapping)
+    if not os.path.exists(path):
+        return None
+    return utils.checksum(path)
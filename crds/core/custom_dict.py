@@ -130,6 +130,17 @@ class LazyFileDict(TransformedDict):
         else:
             raise KeyError(name)
 
+    def unloaded_value(self, name):
+        """Return (file name or special value, load path) for `name` if it has not been
+        loaded yet,  otherwise None.   Equal unloaded values load as equal files.
+
+        NOTE:  does not require load
+        """
+        name = self.transform_key(name)
+        if name in self._contents:
+            return None
+        return self._xx_selector[name], self._xx_load_keys.get("path")
+
     def __setitem__(self, name, value):
         name = self.transform_key(name)
         self._xx_selector[name] = value.filename
@@ -143,6 +154,10 @@ class LazyFileDict(TransformedDict):
     def __iter__(self):
         return iter(self.keys())
 
+    def __contains__(self, name):
+        """NOTE:  does not require load"""
+        return self.transform_key(name) in self._xx_selector
+
     def __len__(self):
         return len(self._xx_selector)
 
@@ -1,4 +1,5 @@
 """This module defines CRDS specific exceptions."""
+import pickle
 
 class CrdsError(Exception):
     """Baseclass for all client exceptions."""
@@ -136,6 +137,11 @@ class OverlappingMatchError(ModificationError):
 class MatchingError(CrdsLookupError):
     """Represents a MatchSelector lookup which failed."""
 
+class MatchIndexParityError(CrdsError):
+    """The compiled MatchSelector index and the original winnowing lookup
+    disagreed about the candidates for a header.   Not a lookup failure.
+    """
+
 class UseAfterError(CrdsLookupError):
     """None of the dates in the selector precedes the processing date."""
 
@@ -246,6 +252,18 @@ class CrdsPipelineTypeDeterminationError(CrdsError):
 
 # -------------------------------------------------------------------------------------------
 
+def picklable_exception(exc):
+    """Return `exc` if it can be returned from a worker process,  otherwise an
+    equivalent CrdsError.
+    """
+    try:
+        pickle.loads(pickle.dumps(exc))
+    except Exception:
+        return CrdsError(str(exc))
+    return exc
+
+# -------------------------------------------------------------------------------------------
+
 _exception_names = [ name for name in dir() if name.endswith("Error") ]
 
 __all__ = _exception_names
@@ -55,10 +55,12 @@ import uuid
 import fnmatch 
 import pickle
 
+import numpy as np
+
 # ============================================================================
 
-from . import rmap, log, utils, config
-from .constants import ALL_OBSERVATORIES
+from . import rmap, log, utils, config, context_cache, context_manifest
+from .constants import ALL_OBSERVATORIES, INSTRUMENT_KEYWORDS
 from .log import srepr
 from .exceptions import CrdsError, CrdsBadRulesError, CrdsBadReferenceError, CrdsConfigError, CrdsDownloadError
 from crds.client import api
@@ -72,6 +74,7 @@ __all__ = [
     "get_processing_mode", "get_context_name",
     "version_info",
     "get_bad_mappings_in_context", "list_mappings",
+    "get_best_references_batch",
 ]
 
 # ============================================================================
@@ -374,6 +377,131 @@ def hv_best_references(context_file, header, include=None, condition=True):
     log.verbose("Bestrefs header:\n", log.PP(minheader))
     return ctx.get_best_references(minheader, include=include)
 
+def get_best_references_batch(context, headers, reftypes=None, condition=True):
+    """Compute best references for every row of the columnar dataset table
+    `headers` relative to `context`.   This is a local computation equivalent
+    to calling hv_best_references() once per row.
+
+    `headers` is either a numpy structured array with one field per header
+    keyword or a dict mapping each keyword onto an equal length column.
+
+    Each column is conditioned once per distinct value rather than once per
+    row,  and rows whose minimized parameter tuples are identical are only
+    evaluated once,  so large tables of similar datasets cost roughly one
+    lookup per distinct parameter set.
+
+    If `reftypes` is None,  the types for each distinct parameter set are
+    determined from the first row which has it,  as hv_best_references() would.
+
+    Return { reftype : numpy object array of per-row best references }.  Rows
+    for which a type is not defined (omitted) are None.
+    """
+    ctx = get_symbolic_mapping(context, cached=True)
+    columns = _batch_columns(headers)
+    nrows = len(next(iter(columns.values()))) if columns else 0
+    coded = {}
+    for name, values in columns.items():
+        key = name.upper() if condition else name
+        coded[key] = _batch_code_column(values, condition)
+    parkey_names = ctx.locate.fits_to_parkeys({ name : name for name in coded })  # parkey --> column
+    keyed = { parkey : coded[name] for (parkey, name) in parkey_names.items() }
+    results = { reftype : np.full(nrows, None, dtype=object) for reftype in (reftypes or []) }
+    if nrows == 0:
+        return results
+    if isinstance(ctx, rmap.PipelineContext):
+        instruments = _batch_instruments(ctx, keyed, nrows)
+        for instrument in sorted(set(instruments)):
+            rows = np.flatnonzero(instruments == instrument)
+            keys = ctx.get_imap(instrument).get_required_parkeys() + [ctx.instrument_key]
+            _batch_evaluate(ctx, context, coded, keyed, keys, rows, nrows, reftypes, results)
+    else:
+        rows = np.arange(nrows)
+        _batch_evaluate(ctx, context, coded, keyed, ctx.get_required_parkeys(), rows, nrows, reftypes, results)
+    return results
+
+def _batch_columns(headers):
+    """Return the dict of equal length numpy columns defined by `headers`,  either
+    a numpy structured array or a dict of sequences.
+    """
+    if isinstance(headers, np.ndarray) and headers.dtype.names:
+        columns = { name : headers[name] for name in headers.dtype.names }
+    else:
+        columns = { name : np.asarray(values) for (name, values) in dict(headers).items() }
+    lengths = set(len(values) for values in columns.values())
+    if len(lengths) > 1:
+        raise CrdsError("Batch bestrefs header columns have unequal lengths " + srepr(sorted(lengths)))
+    return columns
+
+def _batch_code_column(values, condition):
+    """Factor `values` into a list of distinct (conditioned) values and an
+    integer array of per-row indices into it.   Conditioning is applied to the
+    distinct values only.
+    """
+    try:
+        uniques, codes = np.unique(values, return_inverse=True)
+        uniques = uniques.tolist()
+    except TypeError:  # unorderable mixed types
+        index = {}
+        codes = np.array([index.setdefault(value, len(index)) for value in values.tolist()], dtype=int)
+        uniques = list(index)
+    uniques = [value.decode("utf-8") if isinstance(value, bytes) else value for value in uniques]
+    if condition:
+        uniques = [utils.condition_value(value) for value in uniques]
+    index = {}   # distinct raw values can condition to the same value,  e.g. ANY and *
+    remap = np.array([index.setdefault(value, len(index)) for value in uniques], dtype=int)
+    return list(index), remap[codes.ravel()]
+
+def _batch_lookup(keyed, key):
+    """Return the coded column for `key` using the same fallbacks as
+    Mapping.minimize_header(),  or None if it is not defined.
+    """
+    return keyed.get(key.lower(), keyed.get(key.upper()))
+
+def _batch_instruments(ctx, keyed, nrows):
+    """Return a numpy object array of the instrument for each row,  determined
+    as PipelineContext.get_instrument() would.
+    """
+    instruments = np.full(nrows, None, dtype=object)
+    for key in [ctx.instrument_key.upper(), ctx.instrument_key.lower()] + INSTRUMENT_KEYWORDS:
+        if key not in keyed:
+            continue
+        values, codes = keyed[key]
+        column = np.array([str(value).upper() for value in values], dtype=object)[codes]
+        unset = np.equal(instruments, None) & (column != "UNDEFINED")
+        instruments[unset] = column[unset]
+    if np.equal(instruments, None).any():
+        raise CrdsError("Missing '%s' keyword in header for determining instrument." % ctx.instrument_key)
+    return instruments
+
+def _batch_evaluate(ctx, context, coded, keyed, keys, rows, nrows, reftypes, results):
+    """Compute bestrefs once for each distinct tuple of `keys` values among
+    `rows`,  scattering the answers for each reftype into `results`.
+    """
+    lookups = [_batch_lookup(keyed, key) for key in keys]
+    matrix = np.stack([np.zeros(len(rows), dtype=int)] +
+                      [lookup[1][rows] for lookup in lookups if lookup is not None], axis=1)
+    _uniques, firsts, inverse = np.unique(matrix, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(np.bincount(inverse))])
+    for group, first in enumerate(firsts):
+        row = rows[first]
+        minheader = {}
+        for key, lookup in zip(keys, lookups):
+            minheader[key] = lookup[0][lookup[1][row]] if lookup is not None else "UNDEFINED"
+        include = reftypes
+        if include is None:
+            header = { name : values[codes[row]] for (name, (values, codes)) in coded.items() }
+            include = set(ctx.locate.header_to_reftypes(header, context))
+            include = list(set(ctx.get_filekinds(header)) & include)
+        log.verbose("Bestrefs header:\n", log.PP(minheader))
+        bestrefs = ctx.get_best_references(minheader, include=include)
+        members = rows[order[bounds[group]:bounds[group+1]]]
+        for reftype, bestref in bestrefs.items():
+            if reftype not in results:
+                results[reftype] = np.full(nrows, None, dtype=object)
+            results[reftype][members] = bestref
+
 # ============================================================================
 
 # !!!!! interface to jwst.stpipe.crds_client
@@ -696,6 +824,15 @@ def get_pickled_mapping(mapping, cached=True, use_pickles=None, save_pickles=Non
         loaded = rmap.asmapping(mapping, cached=cached, **keys)
     return loaded
 
+def locate_pickled_mapping(mapping):
+    """Return the path of the pickle for `mapping` in the format selected by CRDS_PICKLE_FORMAT,
+    either a whole context pickle or a crds.core.context_cache file.
+    """
+    if config.PICKLE_FORMAT == "compact":
+        return config.locate_context_cache(mapping)
+    else:
+        return config.locate_pickle(mapping)
+
 def load_pickled_mapping(mapping):
     """Load the pickle for `mapping` where `mapping` is canonically named and
     located in the CRDS cache.
@@ -704,7 +841,11 @@ def load_pickled_mapping(mapping):
     in the hierarchy is read.  In general pickles for sub-mappings should not
     exist because of storage waste.
     """
-    pickle_file = config.locate_pickle(mapping)
+    pickle_file = locate_pickled_mapping(mapping)
+    if config.PICKLE_FORMAT == "compact":
+        loaded = context_cache.load(pickle_file, mapping)
+        log.info("Loaded context cache", repr(mapping))
+        return loaded
     pickled = open(pickle_file, "rb").read()
     loaded = pickle.loads(pickled)
     log.info("Loaded pickled context", repr(mapping))
@@ -712,19 +853,24 @@ def load_pickled_mapping(mapping):
 
 def save_pickled_mapping(mapping, loaded):
     """Save live mapping `loaded` as a pickle under named based on `mapping` name."""
-    pickle_file = config.locate_pickle(mapping)
+    pickle_file = locate_pickled_mapping(mapping)
     if not utils.is_writable(pickle_file):  # Don't even bother pickling
         log.verbose("Pickle file", repr(pickle_file), "is not writable,  skipping pickle save.")
         return
     with log.verbose_warning_on_exception("Failed saving pickle for", repr(mapping), "to", repr(pickle_file)):
         loaded.force_load()
-        pickled = pickle.dumps(loaded)
+        if config.PICKLE_FORMAT == "compact":
+            pickled = context_cache.dumps(loaded)
+        else:
+            pickled = pickle.dumps(loaded)
         cache_atomic_write(pickle_file, pickled, "CONTEXT PICKLE")
         log.info("Saved pickled context", repr(pickle_file))
+        if isinstance(loaded, rmap.PipelineContext):
+            context_manifest.save_manifest(loaded)
 
 def remove_pickled_mapping(mapping):
     """Delete the pickle for `mapping` from the CRDS cache."""
-    pickle_file = config.locate_pickle(mapping)
+    pickle_file = locate_pickled_mapping(mapping)
     if not utils.is_writable(pickle_file):  # Don't even bother pickling
         log.verbose("Pickle file", repr(pickle_file), "is not writable,  skipping pickle remove.")
         return
@@ -309,6 +309,55 @@ def infos():
     """Return the global count of infos."""
     return THE_LOGGER.infos
 
+class _RecordCollector(logging.Handler):
+    """Logging handler which saves records in a list instead of emitting them."""
+    def __init__(self, records):
+        super(_RecordCollector, self).__init__()
+        self.records = records
+
+    def emit(self, record):
+        self.records.append(record)
+
+@contextlib.contextmanager
+def capture_records(records):
+    """Divert CRDS log records issued within the with-block into list `records`
+    rather than the configured handlers,  e.g. so a worker process can return
+    them for replay_records() by its parent.   Captured records are not counted
+    until they are replayed.
+    """
+    counts = (THE_LOGGER.errors, THE_LOGGER.warnings, THE_LOGGER.infos, THE_LOGGER.debugs)
+    logger = THE_LOGGER.logger
+    saved = list(logger.handlers)
+    propagate = logger.propagate
+    for handler in saved:
+        logger.removeHandler(handler)
+    collector = _RecordCollector(records)
+    logger.addHandler(collector)
+    logger.propagate = False
+    try:
+        yield records
+    finally:
+        logger.removeHandler(collector)
+        for handler in saved:
+            logger.addHandler(handler)
+        logger.propagate = propagate
+        THE_LOGGER.errors, THE_LOGGER.warnings, THE_LOGGER.infos, THE_LOGGER.debugs = counts
+
+def replay_records(records):
+    """Emit log `records` saved by capture_records() through the configured handlers,
+    counting them as if they had been issued in this process.
+    """
+    for record in records:
+        if record.levelno >= logging.ERROR:
+            THE_LOGGER.errors += 1
+        elif record.levelno >= logging.WARNING:
+            THE_LOGGER.warnings += 1
+        elif record.levelno >= logging.INFO:
+            THE_LOGGER.infos += 1
+        else:
+            THE_LOGGER.debugs += 1
+        THE_LOGGER.logger.handle(record)
+
 def set_test_mode():
     """Route log messages to standard output for testing with doctest."""
     remove_console_handler()
@@ -0,0 +1,203 @@
+"""This module maintains a persistent reverse index of the mappings in the CRDS cache,
+enabled by setting CRDS_REVERSE_INDEX=1,  which answers crds.uses and crds.matches
+queries without loading every mapping in the cache.
+
+The index is a sqlite3 database in the CRDS cache config area which records for each
+cached mapping:
+
+    mappings      name, sha1sum, and file mtime and size of each indexed mapping
+    contents      (mapping, name) for each mapping or reference named directly by a mapping
+    matches       (rmap, reference, paths) with the JSON encoded file_matches() paths
+                  of each reference of an rmap
+
+Mapping names are never reused for different contents,  so the index is updated
+incrementally:   update_index() parses only mappings which are new to the index or whose
+sha1sum no longer matches the one indexed,  and drops mappings no longer in the cache.
+Since only direct contents are recorded,  indexing a .pmap or .imap never loads the
+mappings nested under it.
+
+In a readonly cache the index is never created or updated.   usable() is False unless an
+index of the current format already exists there,  and callers then fall back to loading
+the cached mappings.
+
+    >> update_index("hst")
+    >> uses(["v2e20129l_flat.fits"], "hst")
+    ['hst.pmap', ..., 'hst_cos_flatfile.rmap', 'hst_cos_flatfile_0002.rmap']
+    >> file_matches("hst_0001.pmap", "q9e1206kj_bia.fits")
+    [((('observatory', 'hst'), ('instrument', 'acs'), ('filekind', 'biasfile')), ...), ...]
+"""
+import os
+import json
+import sqlite3
+from urllib.parse import quote
+
+from . import config, log, rmap, utils
+
+# ============================================================================
+
+FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mappings (name TEXT PRIMARY KEY, sha1sum TEXT, mtime REAL, size INTEGER);
+CREATE TABLE IF NOT EXISTS contents (mapping TEXT, name TEXT);
+CREATE INDEX IF NOT EXISTS contents_by_mapping ON contents (mapping);
+CREATE INDEX IF NOT EXISTS contents_by_name ON contents (name);
+CREATE TABLE IF NOT EXISTS matches (rmap TEXT, reference TEXT, paths TEXT, PRIMARY KEY (rmap, reference));
+"""
+
+# ============================================================================
+
+def connect(observatory):
+    """Return a sqlite3 connection to the reverse index for `observatory`,  creating it
+    if needed.   An index with an unsupported format version is discarded.   In a readonly
+    cache the existing index is opened readonly.
+    """
+    path = config.locate_reverse_index(observatory)
+    if config.get_cache_readonly():
+        return sqlite3.connect("file:" + quote(path) + "?mode=ro", uri=True)
+    utils.ensure_dir_exists(path)
+    connection = sqlite3.connect(path)
+    version, = connection.execute("PRAGMA user_version").fetchone()
+    if version != FORMAT_VERSION:
+        if version:
+            log.verbose_warning("Rebuilding reverse index", repr(path), "with unsupported version", version)
+        connection.executescript("DROP TABLE IF EXISTS mappings; DROP TABLE IF EXISTS contents; "
+                                 "DROP TABLE IF EXISTS matches;")
+        connection.executescript(_SCHEMA)
+        connection.execute("PRAGMA user_version = {}".format(FORMAT_VERSION))
+        connection.commit()
+    return connection
+
+def update_index(observatory):
+    """Bring the reverse index for `observatory` up to date with the mappings in the CRDS
+    cache.   Return the number of mappings (re)indexed.
+    """
+    connection = connect(observatory)
+    try:
+        indexed = { name : (sha1sum, mtime, size) for (name, sha1sum, mtime, size)
+                    in connection.execute("SELECT name, sha1sum, mtime, size FROM mappings") }
+        updated = 0
+        for path in rmap.list_mappings("*.[pir]map", observatory, full_path=True):
+            name = os.path.basename(path)
+            stat = os.stat(path)
+            previous = indexed.pop(name, None)
+            if previous is not None and previous[1:] == (stat.st_mtime, stat.st_size):
+                continue
+            sha1sum = utils.checksum(path)
+            if previous is not None and previous[0] == sha1sum:
+                connection.execute("UPDATE mappings SET mtime = ?, size = ? WHERE name = ?",
+                                   (stat.st_mtime, stat.st_size, name))
+                continue
+            with log.error_on_exception("Failed indexing", repr(name)):
+                loaded = rmap.fetch_mapping(path)
+                _remove_mapping(connection, name)
+                _add_mapping(connection, loaded, sha1sum, stat)
+                updated += 1
+        for name in indexed:
+            log.verbose("Removing", repr(name), "from reverse index.")
+            _remove_mapping(connection, name)
+        connection.commit()
+    finally:
+        connection.close()
+    if updated:
+        log.verbose("Reverse index for", repr(observatory), "updated", updated, "mappings.")
+    _CURRENT.add(observatory)
+    return updated
+
+def usable(observatory):
+    """Return True IFF the reverse index for `observatory` can answer queries:  the cache
+    is writable,  or a readonly cache already contains an index of the current format.
+    """
+    if not config.get_cache_readonly():
+        return True
+    path = config.locate_reverse_index(observatory)
+    if os.path.exists(path):
+        connection = connect(observatory)
+        try:
+            version, = connection.execute("PRAGMA user_version").fetchone()
+        finally:
+            connection.close()
+        if version == FORMAT_VERSION:
+            return True
+    log.verbose("No usable reverse index for", repr(observatory), "in readonly cache,  loading mappings.")
+    return False
+
+def _ensure_current(observatory):
+    """Update the reverse index for `observatory` the first time this process queries it,
+    unless the cache is readonly.
+    """
+    if observatory not in _CURRENT and not config.get_cache_readonly():
+        update_index(observatory)
+
+_CURRENT = set()   # observatories whose index has been updated by this process
+
+def _add_mapping(connection, loaded, sha1sum, stat):
+    """Record the direct contents and match paths of Mapping `loaded`."""
+    connection.execute("INSERT INTO mappings VALUES (?, ?, ?, ?)",
+                       (loaded.basename, sha1sum, stat.st_mtime, stat.st_size))
+    if isinstance(loaded, rmap.ReferenceMapping):
+        names = loaded.reference_names()
+        connection.executemany("INSERT INTO matches VALUES (?, ?, ?)",
+                               [(loaded.basename, reference, json.dumps(paths))
+                                for (reference, paths) in loaded.file_matches_map().items()])
+    else:
+        names = sorted({ os.path.basename(name) for name in loaded.selector.values()
+                         if not rmap.is_special_value(name) })
+    connection.executemany("INSERT INTO contents VALUES (?, ?)", [(loaded.basename, name) for name in names])
+
+def _remove_mapping(connection, name):
+    """Drop everything recorded for mapping `name`."""
+    connection.execute("DELETE FROM mappings WHERE name = ?", (name,))
+    connection.execute("DELETE FROM contents WHERE mapping = ?", (name,))
+    connection.execute("DELETE FROM matches WHERE rmap = ?", (name,))
+
+# ============================================================================
+
+def uses(files, observatory):
+    """Return the sorted basenames of all cached mappings which refer to any of `files`,
+    directly or through nested mappings.
+    """
+    _ensure_current(observatory)
+    connection = connect(observatory)
+    try:
+        using = set()
+        pending = { os.path.basename(name) for name in files }
+        while pending:
+            found = set()
+            for name in pending:
+                found |= { row[0] for row in connection.execute(
+                    "SELECT mapping FROM contents WHERE name = ?", (name,)) }
+            pending = found - using
+            using |= found
+    finally:
+        connection.close()
+    return sorted(using)
+
+def file_matches(context, reffile):
+    """Return the same match paths as rmap.get_cached_mapping(`context`).file_matches(`reffile`)
+    from the reverse index.
+    """
+    observatory = config.mapping_to_observatory(context)
+    _ensure_current(observatory)
+    connection = connect(observatory)
+    try:
+        rmaps, pending = [], [os.path.basename(context)]
+        while pending:
+            mapping = pending.pop()
+            if mapping.endswith(".rmap"):
+                rmaps.append(mapping)
+            else:
+                pending.extend(row[0] for row in connection.execute(
+                    "SELECT name FROM contents WHERE mapping = ?", (mapping,)))
+        matches = []
+        for mapping in rmaps:
+            for row in connection.execute("SELECT paths FROM matches WHERE rmap = ? AND reference = ?",
+                                          (mapping, os.path.basename(reffile))):
+                matches.extend(_tuplify(path) for path in json.loads(row[0]))
+    finally:
+        connection.close()
+    return sorted(matches)
+
+def _tuplify(value):
+    """Recursively convert the lists of JSON decoded `value` back into tuples."""
+    return tuple(_tuplify(item) for item in value) if isinstance(value, list) else value
@@ -54,12 +54,14 @@ True
 import os.path
 import glob
 import json
+import hashlib
+import contextlib
 
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
 
 # ===================================================================
 
-from . import log, utils, config, selectors, substitutions
+from . import log, utils, config, selectors, substitutions, context_manifest
 
 # XXX For backward compatability until refactored away.
 from .config import locate_file, locate_mapping, locate_reference
@@ -386,6 +388,10 @@ class Mapping:
     @utils.cached
     def get_required_parkeys(self):
         """Determine the set of parkeys required for this mapping and all the mappings selected by it."""
+        if hasattr(self, "selections") and config.DEMAND_LOAD:
+            parkeys = context_manifest.get_required_parkeys(self.basename)
+            if parkeys is not None:
+                return parkeys
         parkeys = set(self.parkey)
         if hasattr(self, "selections"):
             for selection in self.selections.normal_values():
@@ -438,7 +444,8 @@ class Mapping:
                         path = path + ((self.filename,),), pars = pars + (self.diff_name,),)
                 else: # either no recursion or key is special and cannot be recursed.
                     nested_diffs = []
-            elif self._value_name(key) != new_mapping._value_name(key):
+            elif not self._same_unloaded_value(key, new_mapping) and \
+                    self._value_name(key) != new_mapping._value_name(key):
                 # replacements in self
                 # different basenames identify context-to-context updates
                 # different filenames identify cache-to-cache differences
@@ -454,10 +461,15 @@ class Mapping:
                     # higher levels file identical, nested cache-to-cache files may differ
                     diff = None
                 if self._is_normal_value(key) and new_mapping._is_normal_value(key):   # mapping replacements
-                    # recursion needed if both selections are mappings.
-                    nested_diffs = self.selections[key].difference( new_mapping.selections[key],  
-                        path = path + ((self.filename, new_mapping.filename,), ), pars = pars + (self.diff_name,), 
-                        include_header_diffs=include_header_diffs, recurse_added_deleted=recurse_added_deleted)
+                    if diff is None and config.DIFF_CONTENT_HASHES and \
+                            self.selections[key].content_hash() == new_mapping.selections[key].content_hash():
+                        # same sha1sum and identical loaded contents,  nothing nested can differ
+                        nested_diffs = []
+                    else:
+                        # recursion needed if both selections are mappings.
+                        nested_diffs = self.selections[key].difference( new_mapping.selections[key],  
+                            path = path + ((self.filename, new_mapping.filename,), ), pars = pars + (self.diff_name,), 
+                            include_header_diffs=include_header_diffs, recurse_added_deleted=recurse_added_deleted)
                 elif recurse_added_deleted:  # include added/deleted cases from normal mapping replacing special, vice versa
                     if self._is_normal_value(key):  # new_mapping is special
                         nested_diffs = self.selections[key].diff_files("deleted", 
@@ -521,6 +533,15 @@ class Mapping:
         value = self.selections[key]
         return value if MappingSelectionsDict.is_special_value(value) else value.filename
     
+    def _same_unloaded_value(self, key, new_mapping):
+        """Return True IFF selection `key` of both `self` and `new_mapping` names the same
+        file and neither has been loaded,  so their _value_name()'s are equal without loading.
+        """
+        if not config.DIFF_CONTENT_HASHES:
+            return False
+        unloaded = self.selections.unloaded_value(key)
+        return unloaded is not None and unloaded == new_mapping.selections.unloaded_value(key)
+
     def _value_xsum(self, key):
         """Return selections[key] if it is a special value, otherwise assume it is a mapping
         and return the sha1sum header field.
@@ -528,6 +549,18 @@ class Mapping:
         value = self.selections[key]
         return value if MappingSelectionsDict.is_special_value(value) else value.sha1sum
 
+    def content_hash(self):
+        """Return a sha1 hex digest of this mapping's header and selections,  where nested
+        mappings contribute their own content_hash().   Unlike the sha1sum header field,  it
+        reflects the mapping as loaded and modified.   Mappings with equal hashes have no
+        difference().
+        """
+        xsum = hashlib.sha1(repr(sorted(self.header.items())).encode("utf-8"))
+        for key in sorted(self.selections):
+            value = self._value_name(key) if not self._is_normal_value(key) else ("Mapping", self.selections[key].content_hash())
+            xsum.update(repr((key, value)).encode("utf-8"))
+        return xsum.hexdigest()
+
     def difference_header(self, other, path=(), pars=()):
         """Compare `self` with `other` and return a list of difference
         tuples,  prefixing each tuple with context `path`.
@@ -739,6 +772,8 @@ class PipelineContext(ContextMapping):
                 "wfii" : "wfpc2",
             }
         instrument = instrument_hacks.get(instrument.lower(), instrument.lower())
+        if config.DEMAND_LOAD:   # make this context's manifest available to its imaps
+            context_manifest.load_manifest(self.basename)
         try:
             return self.selections[instrument]
         except (crexc.IrrelevantReferenceTypeError, crexc.OmitReferenceTypeError):
@@ -801,6 +836,11 @@ class PipelineContext(ContextMapping):
         
             { instrument : [ matching_parkey_name, ... ], }
         """
+        if config.DEMAND_LOAD:
+            context_manifest.load_manifest(self.basename)
+            parkeys = context_manifest.get_required_parkeys(self.basename)
+            if parkeys is not None:
+                return parkeys
         return { instrument : list(self.parkey) + self.selections[instrument].get_required_parkeys() 
                  for instrument in self.selections.normal_keys() }
         
@@ -1036,6 +1076,9 @@ class ReferenceMapping(Mapping):
         # Actually compile lambdas for the hooks above.
         self._init_compiled()
 
+        # bounded LRU of get_best_ref() results keyed by conditioned required parkey values
+        self._init_lookup_cache()
+
     def __getstate__(self):
         """Return rmap pickling state,  minus lambdas and anything else that doesn't pickle."""
         state = dict(self.__dict__)
@@ -1045,35 +1088,57 @@ class ReferenceMapping(Mapping):
         del state["_precondition_header"]
         del state["_fallback_header"]
         del state["_rmap_update_headers"]
+        state.pop("_lookup_cache", None)
+        state.pop("_lookup_cache_size", None)
         return state
 
     def __setstate__(self, state):
         """Recreate rmap object from `state`,  recompiling missing __getstate__ objects on the fly."""
         self.__dict__ = dict(state)
         self._init_compiled()
+        self._init_lookup_cache()
 
     def force_load(self):
         """Nothing below ReferenceMapping is loaded."""
         pass
 
-    def _init_compiled(self):
-        """Initialize object fields which contain compiled code objects, special handling for pickling."""        
+    def _init_compiled(self, compiled_exprs=None):
+        """Initialize object fields which contain compiled code objects, special handling for pickling.
+
+        `compiled_exprs` is an optional dict of already compiled expressions as returned by
+        get_compiled_exprs(),  used in place of recompiling the rmap header expressions.
+        """        
         self._comment_parkeys = tuple(name.lower() for name in self.header.get("comment_parkeys", ()))
-        self._rmap_relevance_expr = self.get_expr(self.header.get("rmap_relevance", "always").replace("always", "True"))
-        self._rmap_omit_expr = self.get_expr(self.header.get("rmap_omit", "False"))
-        
-        relevant  = dict(self.header.get("parkey_relevance", {}))
-        relevant.update({
-            name : "False" for name in self._comment_parkeys
-        })
-        self._parkey_relevance_exprs = { 
-            name.lower() : self.get_expr(expr) for (name, expr) in relevant.items()
-            }
+        if compiled_exprs is None:
+            self._rmap_relevance_expr = self.get_expr(
+                self.header.get("rmap_relevance", "always").replace("always", "True"))
+            self._rmap_omit_expr = self.get_expr(self.header.get("rmap_omit", "False"))
+            relevant  = dict(self.header.get("parkey_relevance", {}))
+            relevant.update({
+                name : "False" for name in self._comment_parkeys
+            })
+            self._parkey_relevance_exprs = { 
+                name.lower() : self.get_expr(expr) for (name, expr) in relevant.items()
+                }
+        else:
+            self._rmap_relevance_expr = compiled_exprs["rmap_relevance"]
+            self._rmap_omit_expr = compiled_exprs["rmap_omit"]
+            self._parkey_relevance_exprs = dict(compiled_exprs["parkey_relevance"])
         
         self._precondition_header = self.get_hook("precondition_header", (lambda self, header: header))
         self._fallback_header = self.get_hook("fallback_header", (lambda self, header: None))
         self._rmap_update_headers = self.get_hook("rmap_update_headers", None)
                 
+    def get_compiled_exprs(self):
+        """Return the dict of (expr, code) pairs for this rmap's header expressions which can
+        be passed to _init_compiled() to restore them without recompiling.
+        """
+        return dict(
+            rmap_relevance = self._rmap_relevance_expr,
+            rmap_omit = self._rmap_omit_expr,
+            parkey_relevance = self._parkey_relevance_exprs,
+            )
+
     def validate(self):
         """Validate the contents of this rmap against the TPN for this
         filekind / reftype.   Each field of each Match tuple must have a value
@@ -1146,22 +1211,84 @@ class ReferenceMapping(Mapping):
         else:
             return {}
 
+    def _init_lookup_cache(self):
+        """Create an empty get_best_ref() results cache sized by config.LOOKUP_CACHE_SIZE
+        and zero its hit and miss counters.
+        """
+        self._lookup_cache = OrderedDict()
+        self._lookup_cache_size = config.LOOKUP_CACHE_SIZE.get()
+        self._lookup_hits = 0
+        self._lookup_misses = 0
+
+    def clear_lookup_cache(self):
+        """Discard any memoized get_best_ref() results and re-read config.LOOKUP_CACHE_SIZE.
+        Counters are retained.
+        """
+        self._lookup_cache.clear()
+        self._lookup_cache_size = config.LOOKUP_CACHE_SIZE.get()
+
+    def get_lookup_cache_stats(self):
+        """Return { "hits" : int, "misses" : int, "size" : int } for the get_best_ref() results cache."""
+        return dict(hits=self._lookup_hits, misses=self._lookup_misses, size=len(self._lookup_cache))
+
+    def _lookup_cache_key(self, header):
+        """Return the tuple of conditioned required parkey values from `header` which
+        determines the result of get_best_ref().
+        """
+        return tuple(utils.condition_value(header.get(key, header.get(key.lower(), "UNDEFINED")))
+                     for key in self._required_parkeys)
+
     def get_best_ref(self, header):
         """Return a single best reference value associated with this .rmap and `header`.  Map exceptions
         from nested methods onto simple "NOT FOUND..." strings which are exempted from reference downloads.
+
+        When config.LOOKUP_CACHE_SIZE is non-zero,  results are memoized in a
+        bounded LRU keyed by the conditioned values of the required parkeys.   The size
+        is read when the cache is created or cleared,  not on every lookup.   Failed lookups
+        are not cached,  they depend on the exception trap in effect at the time.
         """
         try:
-            return self._get_best_ref(header)
-        except crexc.IrrelevantReferenceTypeError:
-            return "NOT FOUND n/a"
-        except crexc.OmitReferenceTypeError:
-            return None
+            return self._get_best_ref_cached(header)
+        except crexc.MatchIndexParityError:
+            raise    # never report an index defect as a lookup failure
         except Exception as exc:
             if log.get_exception_trap():
                 return "NOT FOUND " + str(exc)
             else:
                 raise
 
+    def _get_best_ref_cached(self, header):
+        """Return the best reference,  "NOT FOUND n/a",  or None for `header` from the results
+        cache or _get_best_ref_outcome(),  raising lookup failures.
+        """
+        cache_size = self._lookup_cache_size
+        if cache_size <= 0:
+            return self._get_best_ref_outcome(header)
+        key = self._lookup_cache_key(header)
+        try:
+            bestref = self._lookup_cache[key]
+        except KeyError:
+            self._lookup_misses += 1
+            bestref = self._get_best_ref_outcome(header)
+            self._lookup_cache[key] = bestref
+            while len(self._lookup_cache) > cache_size:
+                self._lookup_cache.popitem(last=False)
+        else:
+            self._lookup_hits += 1
+            self._lookup_cache.move_to_end(key)
+        return bestref
+
+    def _get_best_ref_outcome(self, header):
+        """Compute get_best_ref() for `header` without consulting the results cache,  mapping
+        N/A and omitted types onto their results and raising any other failure.
+        """
+        try:
+            return self._get_best_ref(header)
+        except crexc.IrrelevantReferenceTypeError:
+            return "NOT FOUND n/a"
+        except crexc.OmitReferenceTypeError:
+            return None
+
     def _get_best_ref(self, header_in):
         """Return the single reference file basename appropriate for
         `header_in` selected by this ReferenceMapping.
@@ -1176,6 +1303,8 @@ class ReferenceMapping(Mapping):
         header = self.map_irrelevant_parkeys_to_na(header)  # Execute rmap parkey_relevance conditions
         try:
             bestref = self.selector.choose(header)
+        except crexc.MatchIndexParityError:
+            raise
         except Exception as exc:
             log.verbose("First selection failed:", str(exc), verbosity=55)
             header = self._fallback_header(self, header_in) # Execute type-specific plugin if applicable
@@ -1187,6 +1316,8 @@ class ReferenceMapping(Mapping):
                     bestref = self.selector.choose(header)
                 else:
                     raise
+            except crexc.MatchIndexParityError:
+                raise
             except Exception as exc:
                 log.verbose("Fallback selection failed:", str(exc), verbosity=55)
                 if self._reffile_required in ["YES", "NONE"]:
@@ -1294,6 +1425,13 @@ class ReferenceMapping(Mapping):
                   ("filekind", self.filekind),),)
         return sorted(self.selector.file_matches(filename, sofar))
 
+    def file_matches_map(self):
+        """Return { filename : file_matches(filename) } for every file this rmap selects."""
+        sofar = ((("observatory", self.observatory),
+                  ("instrument",self.instrument),
+                  ("filekind", self.filekind),),)
+        return self.selector.file_matches_map(sofar)
+
     def difference(self, other, path=(), pars=(), include_header_diffs=False, recurse_added_deleted=False):
         """Return the list of difference tuples between `self` and `other`, prefixing each tuple with context `path`.
         Elements of `path` are named by correspnding elements of `pars`.
@@ -1309,6 +1447,12 @@ class ReferenceMapping(Mapping):
             diff.filekind = self.filekind
         return diffs
 
+    def content_hash(self):
+        """Return a sha1 hex digest of this rmap's header and selector content_hash()."""
+        xsum = hashlib.sha1(repr(sorted(self.header.items())).encode("utf-8"))
+        xsum.update(self.selector.content_hash().encode("utf-8"))
+        return xsum.hexdigest()
+
     def diff_files(self, added_deleted, path=(), pars=()):
         """Return the list of diff tuples for all nested changed files in a higher level addition
         or deletion.   added_deleted should be "added" or "deleted"
@@ -1382,6 +1526,17 @@ class ReferenceMapping(Mapping):
         header = self.get_refactor_header(reffile)
         return self.insert_header_reference(header, os.path.basename(reffile))
 
+    def insert_references(self, reffiles):
+        """Returns new ReferenceMapping made from `self` inserting each file of `reffiles` in order.
+        The result is the same as calling insert_reference() on each file in turn,  but the
+        rmap is copied and its selectors re-initialized only once.
+        """
+        with self.insertions() as (new, insert):
+            for reffile in reffiles:
+                with log.augment_exception("In reference", repr(os.path.basename(reffile))):
+                    insert(self.get_refactor_header(reffile), os.path.basename(reffile))
+        return new
+
     def get_refactor_header(self, reffile, extra_keys=()):
         """Give reference path `reffile` return the header which should be used to insert
         the file into this rmap based on the reffile contents.
@@ -1454,6 +1609,34 @@ class ReferenceMapping(Mapping):
             new = self.insert(header, reffile)
         return new
 
+    def insert_header_references(self, headers_references):
+        """Returns new ReferenceMapping made from `self` inserting each (header, reffile) pair
+        of `headers_references` in order,  as for insert_header_reference().
+        """
+        with self.insertions() as (new, insert):
+            for header, reffile in headers_references:
+                insert(header, reffile)
+        return new
+
+    @contextlib.contextmanager
+    def insertions(self):
+        """Yield (new, insert) where `new` is one copy of this rmap and insert(header, reffile)
+        inserts `reffile` into `new` as insert_header_reference() does.   The selectors of `new`
+        are re-initialized once when the block exits rather than after every insertion.
+        """
+        new = self.copy()
+        with new.selector.insertions(self.tpn_valid_values if not config.ALLOW_BAD_PARKEY_VALUES else {}) \
+                as insert_item:
+            def insert(header, reffile):
+                if self._rmap_update_headers:
+                    # Generate variations on header as needed to emulate header "pre-conditioning" and fall back scenarios.
+                    for hdr in self._rmap_update_headers(self, header):
+                        insert_item(hdr, reffile)
+                else:
+                    insert_item(header, reffile)
+            yield new, insert
+        new.clear_lookup_cache()
+
     def get_reference_parkeys(self):
         """Return parkey names from the reference file perspective,  this can be a superset
         of the obvious parkey count due to redundant keyword expressions resulting from 
@@ -1473,6 +1656,17 @@ class ReferenceMapping(Mapping):
         new = self.copy()
         new.selector.insert(header, value, 
             self.tpn_valid_values if not config.ALLOW_BAD_PARKEY_VALUES else {})
+        new.clear_lookup_cache()
+        return new
+
+    def insert_many(self, items):
+        """Given a sequence of (header, value) `items`,  insert each value into one copy of
+        this rmap in order and return it.
+        """
+        new = self.copy()
+        new.selector.insert_many(items,
+            self.tpn_valid_values if not config.ALLOW_BAD_PARKEY_VALUES else {})
+        new.clear_lookup_cache()
         return new
     
     def delete(self, terminal):
@@ -1482,6 +1676,7 @@ class ReferenceMapping(Mapping):
         deleted_count = new.selector.delete(terminal)
         if deleted_count == 0:
             raise crexc.CrdsError("Terminal '%s' could not be found and deleted." % terminal)
+        new.clear_lookup_cache()
         return new
 
     def todict(self, recursive=10):
@@ -1677,9 +1872,12 @@ def list_mappings(glob_pattern, observatory, full_path=False):
     return sorted(set(mappings))
 
 def list_pickles(glob_pattern, observatory, full_path=False):
-    """Return the list of cached mappings for `observatory` which match `glob_pattern`."""
-    pattern = config.locate_pickle(glob_pattern, observatory)
-    pickles = _glob_list(pattern, full_path)
+    """Return the list of cached context pickles,  context cache files,  and demand-load manifests
+    for `observatory` which match `glob_pattern`.
+    """
+    pickles = _glob_list(config.locate_pickle(glob_pattern, observatory), full_path)
+    pickles += _glob_list(config.locate_context_cache(glob_pattern, observatory), full_path)
+    pickles += _glob_list(config.locate_context_manifest(glob_pattern, observatory), full_path)
     if full_path:
         pickles = [pkl for pkl in pickles if not os.path.isdir(pkl)]
     return sorted(set(pickles))
@@ -88,10 +88,13 @@ with ClosestTime utilizing "time" and SelectVersion utilizing "sw_version".
 import re
 import fnmatch
 import sys
+import contextlib
 import numbers
 from collections import namedtuple
 import ast
 import copy
+import bisect
+import hashlib
 from pprint import pprint as pp
 
 # import numpy as np
@@ -102,7 +105,7 @@ from . import log, utils, timestamp, config
 
 from .exceptions import (ValidationError, CrdsLookupError,
                          AmbiguousMatchError, 
-                         MatchingError, UseAfterError,
+                         MatchingError, MatchIndexParityError, UseAfterError,
                          InvalidDatetimeError,
                          VersionAfterError,
                          MappingInsertionError)
@@ -237,6 +240,16 @@ DEFAULT_SUBSTITUTIONS = {
 
 # ==============================================================================
 
+# Replaced whenever any Selector is modified,  invalidating every cached content_hash().
+_MUTATION_STAMP = object()
+
+def _note_mutation():
+    """Invalidate the content hashes of all Selectors after one is modified."""
+    global _MUTATION_STAMP
+    _MUTATION_STAMP = object()
+
+# ==============================================================================
+
 class Selector:
     """Baseclass for CRDS file selectors defining the basic protocol
     of a Selector:
@@ -483,6 +496,7 @@ class Selector:
         """Delete the value of `parameter` name in every match case,  recursively
         if `parameter is not in self._parameters.
         """
+        _note_mutation()
         for i, (old_key, choice) in enumerate(self._raw_selections):
             try:
                 ix = self._parameters.index(parameter)
@@ -803,6 +817,20 @@ class Selector:
                 if filename == value:
                     matches.append(here)
         return sorted(matches)
+
+    def file_matches_map(self, sofar=()):
+        """Return { filename : file_matches(filename, sofar) } for every filename in this
+        Selector tree,  computed in one traversal.
+        """
+        matches = {}
+        for key, value in self._raw_selections:
+            here = tuple(sofar + (self.match_item(key),))
+            if isinstance(value, Selector):
+                for filename, paths in value.file_matches_map(here).items():
+                    matches.setdefault(filename, []).extend(paths)
+            elif isinstance(value, str):
+                matches.setdefault(value, []).append(here)
+        return { filename : sorted(paths) for (filename, paths) in matches.items() }
     
     def match_item(self, key):
         """Return ((parkey, key_field), ...) for match key `key`.   Fix string `key`s to unary tuples."""
@@ -824,6 +852,7 @@ class Selector:
     
     def _delete(self, selections, terminal):
         """Remove all instances of `terminal` from `selections`.   Directly mutates selections."""
+        _note_mutation()
         deleted = 0
         for i in range(len(selections)-1,-1,-1):
             selection = selections[i]
@@ -858,6 +887,63 @@ class Selector:
             "\nvalid_values:\n", log.PP(valid_values_map), "\n", exception_class=MappingInsertionError):
             self._insert(header, value, self.parkey, self.class_list, valid_values_map)
 
+    def insert_many(self, items, valid_values_map):
+        """Insert each (header, value) pair of `items` in order,  with the same result as
+        calling insert() on each pair in turn.
+
+        Rather than re-initializing every modified Selector after each insertion,  only raw
+        selections are updated and each modified Selector is re-initialized once,  deepest
+        first,  after the last insertion.
+        """
+        with self.insertions(valid_values_map) as insert:
+            for header, value in items:
+                insert(header, value)
+
+    @contextlib.contextmanager
+    def insertions(self, valid_values_map):
+        """Yield a function insert(header, value) which inserts like insert() but defers
+        re-initializing modified Selectors until the block exits,  as for insert_many().
+        """
+        pending = {}
+        def insert(header, value):
+            with log.augment_exception(
+                "Failed inserting", log.srepr(value), "into rmap:", log.srepr(self.name),
+                "with header:\n", log.PP(header),
+                "\n\nparkey:", log.srepr(self.parkey), "\nclasses:", self.class_list,
+                "\nvalid_values:\n", log.PP(valid_values_map), "\n", exception_class=MappingInsertionError):
+                self._insert(header, value, self.parkey, self.class_list, valid_values_map, pending)
+        try:
+            yield insert
+        finally:
+            self._reinit_pending(pending)
+
+    def _reinit_pending(self, pending):
+        """Re-initialize the Selectors of this tree which are in `pending`,  children first."""
+        if id(self) in pending:   # drop selections removed by _remove_item()
+            self._raw_selections = [selection for selection in self._raw_selections if selection is not None]
+        for choice in self.raw_choices():
+            if isinstance(choice, Selector):
+                choice._reinit_pending(pending)
+        if id(self) in pending:
+            self._reinit()
+
+    def _pending_keys(self, pending):
+        """Return { conditioned key : index } of this Selector's raw selections for insert_many(),
+        recording the Selector in `pending` for re-initialization.   Removed selections are set
+        to None rather than deleted so the indices stay valid until _reinit_pending().
+        """
+        if id(self) not in pending:
+            keys = {}
+            for i, (key, _value) in enumerate(self._raw_selections):
+                keys.setdefault(self.condition_key(key), i)
+            pending[id(self)] = (self, keys)   # holding self keeps id(self) unique
+        return pending[id(self)][1]
+
+    def _reinit(self):
+        """Rebuild this Selector's conditioned selections and indexes from its raw selections."""
+        _note_mutation()
+        self.__init__(self._parameters, dict_wo_dups(self._raw_selections), rmap_header=self._rmap_header)
+
     @property
     def name(self):
         return self._rmap_header.get("name", "UNDEFINED")
@@ -871,34 +957,40 @@ class Selector:
         """Return the pattern of selector nesting for this rmap."""
         return tuple(self._rmap_header.get("classes", ("Match", "UseAfter")))
         
-    def _insert(self, header, value, parkey, classes, valid_values_map):
-        """Execute the insertion,  popping off parkeys and classes on the way down."""
+    def _insert(self, header, value, parkey, classes, valid_values_map, pending=None):
+        """Execute the insertion,  popping off parkeys and classes on the way down.
+
+        If `pending` is not None,  it is a dict of Selectors modified by insert_many() which
+        are re-initialized after the last insertion rather than by each one.
+        """
         key = self._make_key(header, parkey[0])
         log.verbose("Validating key", repr(key))
         self._validate_raw_key(key, valid_values_map)
-        i = self._find_key(key)
+        i = self._find_key(key, pending)
         if len(classes) > 1:   # add or insert nested selector
             if i is None:
                 log.verbose("Modify couldn't find", repr(key), "adding new selector.")
                 new_value = self._create_path(header, value, parkey[1:], classes[1:])
-                self._add_item(key, new_value)
+                self._add_item(key, new_value, pending)
             else:
                 old_key, old_value = self._raw_selections[i]
                 if isinstance(old_value, Selector):
                     log.verbose("Modify found", repr(old_key), "augmenting", repr(old_value), "with", repr(value))
-                    old_value._insert(header, value, parkey[1:], classes[1:], valid_values_map)
+                    old_value._insert(header, value, parkey[1:], classes[1:], valid_values_map, pending)
+                    if pending is not None:   # nested value maps change
+                        self._pending_keys(pending)
                 else:
                     log.verbose("Selector replaces terminal at", repr(key), "adding new selector.")
                     new_value = self._create_path(header, value, parkey[1:], classes[1:])
-                    self._replace_item(old_key, new_value)
+                    self._replace_item(old_key, new_value, pending)
         else:  # add or replace primitive result
             if i is None:
                 log.verbose("Modify couldn't find", repr(key), "adding new value", repr(value))
-                self._add_item(key, value)
+                self._add_item(key, value, pending)
             else:
                 old_key, old_value = self._raw_selections[i]
                 log.verbose("Modify found", repr(key), "as primitive", repr(old_value), "replacing with", repr(value))
-                self._replace_item(key, value)
+                self._replace_item(key, value, pending)
         
     def _create_path(self, header, value, parkey, classes):
         """Create the Selector tree corresponding to `header` and `value` based on the
@@ -914,27 +1006,38 @@ class Selector:
         else:   # end of the line,  just return the primitive value.
             return value
     
-    def _add_item(self, key, value):
+    def _add_item(self, key, value, pending=None):
         """Add a new `value` to selections at `key`.  Flat:  this selector only."""
-        i = self._find_key(key)
+        i = self._find_key(key, pending)
         assert i is None, self.__class__.__name__ + " already contains " + repr(key)
-        self._raw_selections.append((key, value))
-        self.__init__(self._parameters, dict_wo_dups(self._raw_selections), rmap_header=self._rmap_header)
+        _note_mutation()
+        self._raw_selections.append(Selection((key, value)))
+        if pending is None:
+            self._reinit()
+        else:
+            self._pending_keys(pending)[self.condition_key(key)] = len(self._raw_selections) - 1
 
-    def _remove_item(self, key):
+    def _remove_item(self, key, pending=None):
         """Remove the selection at `key`.   Flat:  this selector only."""
-        i = self._find_key(key)
+        i = self._find_key(key, pending)
         assert i is not None, self.__class__.__name__ + " doesn't contain " + repr(key)
-        del self._raw_selections[i]
-        self.__init__(self._parameters, dict_wo_dups(self._raw_selections), rmap_header=self._rmap_header)
+        _note_mutation()
+        if pending is None:
+            del self._raw_selections[i]
+            self._reinit()
+        else:
+            self._raw_selections[i] = None
+            del self._pending_keys(pending)[self.condition_key(key)]
 
-    def _replace_item(self, key, value):
+    def _replace_item(self, key, value, pending=None):
         """Replace the selection at `key` with `value`.   Flat:  this selector only."""
-        self._remove_item(key)
-        self._add_item(key, value)
+        self._remove_item(key, pending)
+        self._add_item(key, value, pending)
         
-    def _find_key(self, key):
+    def _find_key(self, key, pending=None):
         """Return the index of `key` in selections."""
+        if pending is not None:
+            return self._pending_keys(pending).get(self.condition_key(key))
         for i, (old_key, _old_value) in enumerate(self._raw_selections):
             if self._equal_keys(key, old_key):
                 return i
@@ -1001,6 +1104,8 @@ class Selector:
         if self._parameters != new_selector._parameters:
             return [msg(None, "different parameter lists ", 
                     repr(self._parameters), ":", repr(new_selector._parameters))]
+        if config.DIFF_CONTENT_HASHES and self.content_hash() == new_selector.content_hash():
+            return []   # identical subtrees,  nothing below can differ
 
         differences = []
         new_selector_keys = new_selector.raw_keys()
@@ -1040,6 +1145,22 @@ class Selector:
                     differences.append(msg(key, "added terminal", repr(new_selector_choice)))
         return differences
     
+    def content_hash(self):
+        """Return a sha1 hex digest of this Selector's class,  parameters,  and raw selections,
+        where nested Selectors contribute their own content_hash().   Selectors with equal
+        hashes have no difference().   The hash is computed once and reused until some
+        Selector is modified.
+        """
+        cached = self.__dict__.get("_content_hash")
+        if cached is not None and cached[0] is _MUTATION_STAMP:
+            return cached[1]
+        xsum = hashlib.sha1(repr((self.__class__.__name__, self._parameters)).encode("utf-8"))
+        for key, choice in self._raw_selections:
+            value = ("Selector", choice.content_hash()) if isinstance(choice, Selector) else choice
+            xsum.update(repr((key, value)).encode("utf-8"))
+        self._content_hash = (_MUTATION_STAMP, xsum.hexdigest())
+        return self._content_hash[1]
+
     def flat_diff(self, change, path, pars):
         """Return `change` messages relative to `path` for all of `self`s selections
         as a simple flat list of one change tuple per nested choice.
@@ -1090,6 +1211,10 @@ class DiffTuple(tuple):
         self.instrument = keys.pop("instrument", None)
         self.filekind = keys.pop("filekind", None)
 
+    def __getnewargs__(self):
+        """Support pickling,  restoring parameter_names et al from __dict__."""
+        return tuple(self)
+
     @property
     def flat(self):
         """Removes the Selector nesting structure and return an equivalent tuple."""
@@ -1635,6 +1760,120 @@ def matcher(key):
     else:
         return Matcher(key)
 
+class MatchIndex:
+    """Compiled candidate index for the Matcher tuples of a MatchSelector.
+
+    For each parameter,  literal (simple equality) matchers are hashed into
+    buckets by value,  N/A matchers are kept in a "don't care" list,  and all
+    other matchers (globs, regexes, inequalities, NOT, ...) are kept in a
+    fallback list evaluated with Matcher.match() as usual.   A lookup
+    intersects the surviving candidates parameter by parameter,  only
+    evaluating fallback matchers for selections which are still viable.
+
+    winnow() returns the same (weights, remaining) pair as the original
+    MatchSelector._winnow() scan,  with `remaining` in selection order,  so the
+    results can be ranked by MatchSelector._rank_candidates() unchanged.
+
+    >>> m = MatchSelector(("foo","bar"), {
+    ...    ('1.0', 'N/A') : "100",
+    ...    ('1.0', '2.0') : "200",
+    ...    ('4.0', '*') : "300",
+    ...    ('1.0|4.0', '3.0') : "400",
+    ... })
+    >>> index = MatchIndex(m._parameters, m._match_selections)
+    >>> weights, remaining = index.winnow(dict(foo='1.0', bar='2.0'))
+    >>> sorted(weights.items())
+    [(('1.0', '2.0'), -2), (('1.0', 'N/A'), -1)]
+    >>> list(remaining.keys())
+    [('1.0', '2.0'), ('1.0', 'N/A')]
+    >>> index.winnow(dict(foo='4.0', bar='3.0'))[0]
+    {('1.0|4.0', '3.0'): -2, ('4.0', '*'): -2}
+    >>> index.winnow(dict(foo='5.0', bar='3.0'))
+    ({}, {})
+    """
+    def __init__(self, parameters, match_selections):
+        self._parameters = tuple(parameters)
+        self._selections = match_selections
+        self._match_tuples = list(match_selections.keys())
+        self._literals = []     # per parameter:  { literal_value : [ordinal, ...] }
+        self._all_literals = []   # per parameter:  [ordinal, ...] for every literal matcher
+        self._dont_care = []    # per parameter:  [ordinal, ...] for N/A matchers
+        self._fallback = []     # per parameter:  [(ordinal, matcher), ...]
+        for i in range(len(self._parameters)):
+            literals, all_literals, dont_care, fallback = {}, [], [], []
+            for ordinal, match_tuple in enumerate(self._match_tuples):
+                key_matcher = match_selections[match_tuple].key[i]
+                if type(key_matcher) is Matcher:
+                    literals.setdefault(key_matcher._key, []).append(ordinal)
+                    all_literals.append(ordinal)
+                elif type(key_matcher) is NaMatcher:
+                    dont_care.append(ordinal)
+                else:
+                    fallback.append((ordinal, key_matcher))
+            self._literals.append(literals)
+            self._all_literals.append(all_literals)
+            self._dont_care.append(dont_care)
+            self._fallback.append(fallback)
+
+    def __repr__(self):
+        return self.__class__.__name__ + "(" + repr(self._parameters) + \
+            ", nselections=" + str(len(self._match_tuples)) + ")"
+
+    def _column_status(self, i, value, candidates):
+        """Return { ordinal : match_status } for the selections which are not
+        eliminated by binding parameter `i` to `value`.   match_status is 1
+        (match) or 0 (don't care) as for Matcher.match().  Fallback matchers
+        are only evaluated for ordinals in `candidates`,  or all if None.
+        """
+        status = {}
+        if value == "*":
+            for ordinal in self._all_literals[i]:
+                status[ordinal] = 1
+        elif value == "N/A":
+            for ordinal in self._all_literals[i]:
+                status[ordinal] = 0
+            for ordinal in self._literals[i].get("N/A", ()):
+                status[ordinal] = 1
+        else:
+            for ordinal in self._literals[i].get(value, ()):
+                status[ordinal] = 1
+        for ordinal in self._dont_care[i]:
+            status[ordinal] = 0
+        for ordinal, key_matcher in self._fallback[i]:
+            if candidates is None or ordinal in candidates:
+                match_status = key_matcher.match(value)
+                if match_status != -1:
+                    status[ordinal] = match_status
+        return status
+
+    def winnow(self, header):
+        """Based on the parkey values in `header`,  return the selections which
+        can possibly match and their weights,  exact matches counting -1 and
+        "don't care" matches 0.
+
+        returns   ( {match_tuple:weight ...},   remaining_selections )
+        """
+        weights = None   # { ordinal : weight }
+        for i, parkey in enumerate(self._parameters):
+            status = self._column_status(i, header.get(parkey, "UNDEFINED"), weights)
+            if weights is None:
+                weights = { ordinal : -match_status for (ordinal, match_status) in status.items() }
+            elif len(status) < len(weights):
+                weights = { ordinal : weights[ordinal] - match_status
+                            for (ordinal, match_status) in status.items() if ordinal in weights }
+            else:
+                weights = { ordinal : weight - status[ordinal]
+                            for (ordinal, weight) in weights.items() if ordinal in status }
+            if not weights:
+                break
+        if weights is None:   # no parameters,  everything matches
+            weights = { ordinal : 0 for ordinal in range(len(self._match_tuples)) }
+        ordinals = sorted(weights)
+        remaining = { self._match_tuples[ordinal] : self._selections[self._match_tuples[ordinal]]
+                      for ordinal in ordinals }
+        weights = { self._match_tuples[ordinal] : weights[ordinal] for ordinal in ordinals }
+        return weights, remaining
+
 class MatchSelection(Selection):
     """
     MatchSelection's are an atypical Selection consisting of multiple keys
@@ -1823,7 +2062,14 @@ Restore original debug behavior:
     def __init__(self, parameters, selections, rmap_header={}):
         super(MatchSelector, self).__init__(parameters, selections, rmap_header)
         self._match_selections = self.get_matcher_selections(dict_wo_dups(self._selections))
+        self._match_index = MatchIndex(self._parameters, self._match_selections)
+        self._match_index_mode = config.MATCH_INDEX_MODE.get()
         self._value_map = self.get_value_map()
+
+    def __setstate__(self, state):
+        """Restore pickled `state`,  resolving config.MATCH_INDEX_MODE for this process."""
+        self.__dict__.update(state)
+        self._match_index_mode = config.MATCH_INDEX_MODE.get()
      
     def _equal_keys(self, key1, key2):
         """Return True IFF `key1` is equivalent to `key2` for rmap modification.  Ignore comment pars."""
@@ -1898,7 +2144,7 @@ Restore original debug behavior:
         Successively yield any survivors,  in the order of most specific
         matching value (fewest *'s) to least specific matching value.
         """
-        weights, remaining = self._winnow(header, dict(self._match_selections))
+        weights, remaining = self._find_candidates(header)
 
         sorted_candidates = self._rank_candidates(weights, remaining)
         
@@ -1919,6 +2165,26 @@ Restore original debug behavior:
             yield MatchSelection((match_tuples, selector))
         raise MatchingError("No match found.")
 
+    def _find_candidates(self, header):
+        """Return the (weights, remaining) candidates for `header` using the
+        compiled MatchIndex,  the original _winnow() scan,  or both,  depending
+        on config.MATCH_INDEX_MODE as resolved when `self` was created.   In "parity"
+        mode,  raise MatchIndexParityError if the two approaches rank candidates differently.
+        """
+        mode = self._match_index_mode
+        if mode == "winnow":
+            return self._winnow(header, dict(self._match_selections))
+        weights, remaining = self._match_index.winnow(header)
+        if mode == "parity":
+            old_weights, old_remaining = self._winnow(header, dict(self._match_selections))
+            indexed = self._rank_candidates(weights, remaining)
+            winnowed = self._rank_candidates(old_weights, old_remaining)
+            if indexed != winnowed:
+                raise MatchIndexParityError(
+                    "Match index for", repr(self), "ranked", repr(indexed), 
+                    "but winnowing ranked", repr(winnowed), "for header", repr(header))
+        return weights, remaining
+
     def _winnow(self, header, remaining):
         """Based on the parkey values in `header`, winnow out selections
         from `remaining` which cannot possibly match.  For each surviving
@@ -1964,7 +2230,7 @@ Restore original debug behavior:
         log.verbose("Candidates:\n", log.PP(candidates), verbosity=60)
         return candidates
 
-    @utils.cached
+    @utils.xcached(max_entries=10000)
     def merge_group(self, equivalent_selectors):
         """Merge a group of equal-weighted selectors into a single
         combined selector.  Nominally this merges special case
@@ -2085,6 +2351,13 @@ Earlier than all entries
     Traceback (most recent call last):
     ...
     UseAfterError: No selection with time < '2000-07-02 08:08:59'
+
+Deleting a selection updates the keys searched by later lookups
+
+    >>> u.delete('o9t1553tj_bia.fits')
+    2
+    >>> u.choose({'DATE-OBS': '2005-07-02', 'TIME-OBS': '08:08:59'})
+    'o9f15549j_bia.fits'
     
 UseAfter dates should look like YYYY-MM-DD HH:MM:SS or:    
 
@@ -2163,29 +2436,37 @@ Restore debug configuration.
     """
     error_class = UseAfterError
 
+    def __init__(self, *args, **keys):
+        super(UseAfterSelector, self).__init__(*args, **keys)
+        self._init_search_keys()
+
+    def __setstate__(self, state):
+        """Restore pickled `state`,  recomputing search keys for pickles which predate them."""
+        self.__dict__.update(state)
+        self._init_search_keys()
+
+    def _init_search_keys(self):
+        """Precompute the sorted conditioned keys of self._selections searched by bsearch()."""
+        self._search_keys = [selection.key for selection in self._selections]
+
+    def delete(self, terminal):
+        """Remove all instances of `terminal` from `self`,  updating the search keys."""
+        deleted = super(UseAfterSelector, self).delete(terminal)
+        self._init_search_keys()
+        return deleted
+
     def get_selection(self, date):
         log.verbose("Matching", date, " ", verbosity=60)
-        yield self.bsearch(date, self._selections)
+        yield self.bsearch(date)
     
-    def bsearch(self, date, selections):
-        """Do a binary search over a sorted selections list."""
-        if len(selections) == 0:
+    def bsearch(self, date):
+        """Return the selection with the greatest key <= `date` by bisecting the precomputed search keys."""
+        index = bisect.bisect_right(self._search_keys, date) - 1
+        if index < 0:
             raise self.error_class("No selection <= " + repr(date))
-        elif len(selections) > 1:
-            left = selections[:len(selections)//2]
-            right = selections[len(selections)//2:]
-            compared = right[0].key
-            log.verbose("...against", compared, end="", verbosity=60)
-            if date >= compared:
-                return self.bsearch(date, right)
-            else:
-                return self.bsearch(date, left)
-        else:
-            if date >= selections[0].key:
-                log.verbose("matched", repr(selections[0]), verbosity=60)
-                return selections[0]
-            else:
-                raise self.error_class("No selection <= " + repr(date))
+        selection = self._selections[index]
+        log.verbose("matched", repr(selection), verbosity=60)
+        return selection
             
     def _validate_raw_key(self, key, valid_values_map):
         """Validate a selector date/time field for this UseAfter."""
@@ -2505,18 +2786,71 @@ Effective_wavelength doesn't have to be covered by valid_values_map:
     Traceback (most recent call last):
     ...
     ValidationError: GeometricallyNearest Invalid number for 'effective_wavelength' value='foo'
+
+choose_many() resolves a sequence of values in one vectorized search:
+
+    >>> r.choose_many(['1.0', '3.25', '3.26', 6])
+    ['cref_flatfield_120.fits', 'cref_flatfield_124.fits', 'cref_flatfield_137.fits', 'cref_flatfield_137.fits']
     
     """
+    def __init__(self, *args, **keys):
+        super(GeometricallyNearestSelector, self).__init__(*args, **keys)
+        self._init_search_keys()
+
+    def __setstate__(self, state):
+        """Restore pickled `state`,  recomputing search keys for pickles which predate them."""
+        self.__dict__.update(state)
+        self._init_search_keys()
+
+    def _init_search_keys(self):
+        """Precompute the numerically sorted keys of self._selections searched by _nearest_indices().
+        Keys are float32 and ties go to the first selection as the former per-lookup argmin() did.
+        """
+        import numpy as np
+        nkeys = np.array(self.keys(), dtype='f')
+        order = np.argsort(nkeys, kind="stable")
+        self._search_keys = nkeys[order]
+        self._search_order = order
+        if len(order):    # for equal keys,  the first selection in original order
+            starts = np.flatnonzero(np.concatenate([[True], self._search_keys[1:] != self._search_keys[:-1]]))
+            firsts = np.minimum.reduceat(order, starts)
+            self._search_order = np.repeat(firsts, np.diff(np.append(starts, len(order))))
+
+    def delete(self, terminal):
+        """Remove all instances of `terminal` from `self`,  updating the search keys."""
+        deleted = super(GeometricallyNearestSelector, self).delete(terminal)
+        self._init_search_keys()
+        return deleted
+
     @classmethod
     def condition_key(cls, key):
         return utils.condition_value(key)
     
     def get_selection(self, keyval):
+        yield self._selections[self._nearest_indices([keyval])[0]]
+
+    def _nearest_indices(self, keyvals):
+        """Return the array of indices of self._selections nearest each of numbers `keyvals`."""
         import numpy as np
-        nkeys = np.array(self.keys(), dtype='f')
-        diff = np.abs(nkeys - keyval)
-        index = np.argmin(diff)
-        yield self._selections[index]
+        keys, order = self._search_keys, self._search_order
+        if not len(keys):
+            raise CrdsLookupError("GeometricallyNearest has no selections.")
+        values = np.asarray(keyvals, dtype='f')
+        upper = np.searchsorted(keys, values).clip(0, len(keys) - 1)
+        lower = (upper - 1).clip(0, len(keys) - 1)
+        lower_diff, upper_diff = np.abs(keys[lower] - values), np.abs(keys[upper] - values)
+        use_lower = (lower_diff < upper_diff) | ((lower_diff == upper_diff) & (order[lower] < order[upper]))
+        return np.where(use_lower, order[lower], order[upper])
+
+    def choose_many(self, values, headers=None):
+        """Return [choice, ...] nearest each of `values` using one vectorized search.  Nested
+        selector choices are resolved using the corresponding `headers`.
+        """
+        parname = self._parameters[0]
+        keyvals = [self._validate_number(parname, value) for value in values]
+        headers = [None] * len(keyvals) if headers is None else headers
+        return [self.get_choice(self._selections[index], header)
+                for (index, header) in zip(self._nearest_indices(keyvals), headers)]
     
     def _validate_raw_key(self, key, valid_values_map):
         parname = self._parameters[0]
@@ -2570,7 +2904,59 @@ class BracketSelector(Selector):
 
     >>> r.choose({"effective_wavelength":'6.0'})
     ('cref_flatfield_137.fits', 'cref_flatfield_137.fits')
+
+    choose_many() resolves a sequence of values in one vectorized search:
+
+    >>> r.choose_many(['1.0', '1.25', '1.5', 6])
+    [('cref_flatfield_120.fits', 'cref_flatfield_120.fits'), ('cref_flatfield_120.fits', 'cref_flatfield_124.fits'), ('cref_flatfield_124.fits', 'cref_flatfield_124.fits'), ('cref_flatfield_137.fits', 'cref_flatfield_137.fits')]
     """        
+    def __init__(self, *args, **keys):
+        super(BracketSelector, self).__init__(*args, **keys)
+        self._init_search_keys()
+
+    def __setstate__(self, state):
+        """Restore pickled `state`,  recomputing search keys for pickles which predate them."""
+        self.__dict__.update(state)
+        self._init_search_keys()
+
+    def _init_search_keys(self):
+        """Precompute the sorted keys of self._selections searched by _bracket_indices()."""
+        self._search_keys = [selection.key for selection in self._selections]
+
+    def delete(self, terminal):
+        """Remove all instances of `terminal` from `self`,  updating the search keys."""
+        deleted = super(BracketSelector, self).delete(terminal)
+        self._init_search_keys()
+        return deleted
+
+    def _bracket_indices(self, index, keyval):
+        """Return the (less, greater) selection indices bracketing `keyval` given the
+        bisect_left() `index` of `keyval` in the search keys.
+        """
+        nkeys = len(self._search_keys)
+        if index == nkeys:
+            return nkeys - 1, nkeys - 1
+        elif index == 0 or keyval == self._search_keys[index]:
+            return index, index
+        else:
+            return index - 1, index
+
+    def choose_many(self, values, headers=None):
+        """Return [(less_choice, greater_choice), ...] bracketing each of `values` using one
+        vectorized search.  Nested selector choices are resolved using the corresponding `headers`.
+        """
+        import numpy as np
+        parname = self._parameters[0]
+        keyvals = [self._validate_number(parname, value) for value in values]
+        indices = np.searchsorted(np.array(self._search_keys, dtype=float), keyvals, side="left")
+        headers = [None] * len(keyvals) if headers is None else headers
+        choices = []
+        for index, keyval, header in zip(indices.tolist(), keyvals, headers):
+            less, greater = self._bracket_indices(index, keyval)
+            choices.append(self.get_choice(
+                BracketSelection(self._selections[less], self._selections[greater]), header))
+        return choices
+
     def get_selection(self, keyval):
         """Returns BracketSelection() corresponding to keyval.   This is an atypical
         Selection which is really two selections, right and left.   Consequently,  the
@@ -2583,17 +2969,8 @@ class BracketSelector(Selector):
         of Selection but is rather (less, greater) where `less` and `greater` are normal 
         (key, choice) Selections.
         """
-        index = 0
-        selections = self._selections
-        while index < len(selections) and keyval > selections[index].key:
-            index += 1
-        if index == len(selections):
-            less, greater = selections[index-1], selections[index-1]
-        elif index == 0 or keyval == selections[index].key:
-            less, greater = selections[index], selections[index]
-        else:
-            less, greater = selections[index-1], selections[index]
-        yield BracketSelection(less, greater)   # XXXX non-standard interface
+        less, greater = self._bracket_indices(bisect.bisect_left(self._search_keys, keyval), keyval)
+        yield BracketSelection(self._selections[less], self._selections[greater])   # XXXX non-standard interface
     
     def get_choice(self, bracket_selection, header):
         """Return the paired choices of the BracketSelector based on an atypical
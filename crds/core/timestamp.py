@@ -5,14 +5,29 @@ a date and time in a sortable string representation (isoformat).
 import datetime
 import re
 
-from . import config, exceptions, log
+from . import config, exceptions, log, utils
 
 # =======================================================================
 
 def reformat_date(date, sep=" "):
-    """Reformat datestring `d` in any recognized format in CRDS standard form."""
-    parsed = parse_date(date)
-    return format_date(parsed, sep=sep)
+    """Reformat datestring `d` in any recognized format in CRDS standard form.
+
+    Results for string dates are memoized by _reformat_date_str() since the same few
+    observation dates are reformatted for every lookup.
+
+    >>> reformat_date("2003/12/20 01:28")
+    '2003-12-20 01:28:00'
+    """
+    if isinstance(date, str):
+        return _reformat_date_str(date, sep)
+    return format_date(parse_date(date), sep=sep)
+
+@utils.xcached(max_entries=config.DATE_CACHE_SIZE)
+def _reformat_date_str(date, sep):
+    """Reformat string `date` for reformat_date(),  keeping the CRDS_DATE_CACHE_SIZE most
+    recently used results.
+    """
+    return format_date(parse_date(date), sep=sep)
 
 def format_date(date, sep=" "):
     """Format a datestring `d` in CRDS standard form.
@@ -16,6 +16,9 @@ import datetime
 import ast
 import gc
 import json
+import types
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 # ===================================================================
 
@@ -153,6 +156,10 @@ def cached(func):
     .uncached(*args, **keys)    -- original unwrapped function
     .readonly(*args, **keys)    -- function variant which uses but doesn't update cache
     .cache_key(*args, **keys)   -- returns tuple used to locate a function call result
+    .stats()                    -- returns hit, miss, eviction, and size statistics
+
+    Caches are unbounded unless limited by @xcached(max_entries=, max_bytes=) or
+    CRDS_FUNCTION_CACHE_MAX_ENTRIES and CRDS_FUNCTION_CACHE_LIMITS,  see CachedFunction.
 
     >>> @cached
     ... def sum(x,y):
@@ -227,6 +234,20 @@ class xcached:
     
     >>> sum.readonly(2,2,3)
     6
+
+    max_entries and max_bytes bound the cache,  evicting the least recently used results:
+
+    >>> @xcached(max_entries=2)
+    ... def square(x):
+    ...     return x * x
+
+    >>> [square(x) for x in [1, 2, 1, 3, 1]]
+    [1, 4, 1, 9, 1]
+    >>> square.cache
+    {(3,): 9, (1,): 1}
+    >>> stats = square.stats()
+    >>> stats["hits"], stats["misses"], stats["evictions"], stats["size"]
+    (2, 3, 1, 2)
     """
     def __init__(self, *args, **keys):
         """Stash the decorator parameters"""
@@ -245,18 +266,34 @@ class xcached:
 class CachedFunction:
     """Class to support the @cached function decorator.   Called at runtime
     for typical caching version of function.
+
+    The cache keeps at most `max_entries` results,  or results approximately totalling
+    `max_bytes`,  evicting the least recently used first.   0 or None is unbounded.
+    `max_entries` may also be a config.IntConfigItem,  read on first use and again after
+    clear().   CRDS_FUNCTION_CACHE_LIMITS overrides these per function,  and otherwise
+    CRDS_FUNCTION_CACHE_MAX_ENTRIES applies to caches with no max_entries.
+
+    cache_set is the registry of all cached functions used by clear_function_caches()
+    and get_function_cache_stats().
     """
     
     cache_set = set()
     
-    def __init__(self, func, omit_from_key=None):
+    def __init__(self, func, omit_from_key=None, max_entries=None, max_bytes=None):
         self.cache = dict()
         self.uncached = func
         self.omit_from_key = [] if omit_from_key is None else omit_from_key
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
         self.cache_set.add(self)
         self.__doc__ = self.uncached.__doc__
         self.__module__ = self.uncached.__module__
         self.__name__ = self.uncached.__name__ + " [cached]"
+        self.name = self.uncached.__module__ + "." + self.uncached.__qualname__
+        self._limits = None
+        self._sizes = {}
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
         
     def cache_key(self, *args, **keys):
         """Compute the cache key for the given parameters."""
@@ -269,9 +306,11 @@ class CachedFunction:
         key = self.cache_key(*args, **keys)
         if key in self.cache:
             log.verbose("Cached call", self.uncached.__name__, repr(key), verbosity=80)
+            self.hits += 1
             return key, self.cache[key]
         else:
             log.verbose("Uncached call", self.uncached.__name__, repr(key), verbosity=80)
+            self.misses += 1
             return key, self.uncached(*args, **keys)
 
     def readonly(self, *args, **keys):
@@ -286,24 +325,133 @@ class CachedFunction:
         return func(*args, **keys)
         """
         key, result = self._readonly(*args, **keys)
+        max_entries, max_bytes = self.limits()
+        if not (max_entries or max_bytes):
+            self.cache[key] = result
+            return result
+        if not self.cache and self._sizes:   # cache.clear() called directly
+            self._sizes, self._bytes = {}, 0
+        self.cache.pop(key, None)   # re-insert as most recently used
         self.cache[key] = result
+        if max_bytes and key not in self._sizes:
+            self._sizes[key] = approximate_size(result)
+            self._bytes += self._sizes[key]
+        while len(self.cache) > 1 and ((max_entries and len(self.cache) > max_entries) or
+                                       (max_bytes and self._bytes > max_bytes)):
+            oldest = next(iter(self.cache))
+            self.cache.pop(oldest, None)
+            self._bytes -= self._sizes.pop(oldest, 0)
+            self.evictions += 1
         return result
     
     def __get__(self, obj, objtype):
         '''Support instance methods.'''
         return functools.partial(self.__call__, obj)
 
+    def limits(self):
+        """Return (max_entries, max_bytes) for this cache after applying
+        CRDS_FUNCTION_CACHE_LIMITS and CRDS_FUNCTION_CACHE_MAX_ENTRIES.
+        """
+        if self._limits is None:
+            max_entries = self.max_entries
+            if isinstance(max_entries, config.ConfigItem):
+                max_entries = max_entries.get()
+            max_entries = max_entries or config.FUNCTION_CACHE_MAX_ENTRIES.get()
+            max_bytes = self.max_bytes
+            for name, limit in _function_cache_limits():
+                if name in (self.name, self.uncached.__name__):
+                    if limit.upper().endswith("MB"):
+                        max_bytes = int(float(limit[:-2]) * 2**20)
+                    else:
+                        max_entries = int(limit)
+            self._limits = (max_entries, max_bytes)
+        return self._limits
+
+    def clear(self):
+        """Remove all cached results and reset limits from the environment."""
+        self.cache = dict()
+        self._sizes, self._bytes = {}, 0
+        self._limits = None
+
+    def stats(self):
+        """Return hit, miss, eviction, and size statistics for this cache.   bytes is
+        only tracked for caches with a byte budget.
+        """
+        max_entries, max_bytes = self.limits()
+        return dict(hits=self.hits, misses=self.misses, evictions=self.evictions,
+                    size=len(self.cache), bytes=self._bytes if max_bytes else None,
+                    max_entries=max_entries or None, max_bytes=max_bytes or None)
+
+def _function_cache_limits():
+    """Return [(function name, limit), ...] parsed from CRDS_FUNCTION_CACHE_LIMITS,  e.g.
+    "get_free_header=500,crds.core.rmap._load_mapping=256MB".
+    """
+    limits = []
+    for item in config.FUNCTION_CACHE_LIMITS.get().split(","):
+        if item.strip():
+            name, limit = item.split("=")
+            limits.append((name.strip(), limit.strip()))
+    return limits
+
+def approximate_size(obj):
+    """Return the approximate number of bytes of `obj` and the objects it refers to,
+    counting shared objects once and numpy arrays by their data.
+
+    >>> approximate_size(b"x" * 1000) > 1000
+    True
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, types.ModuleType, types.FunctionType,
+                                                  types.MethodType, types.BuiltinFunctionType)):
+            continue
+        seen.add(id(item))
+        if hasattr(item, "dtype") and hasattr(item, "nbytes"):
+            total += item.nbytes
+            continue
+        total += sys.getsizeof(item, 0)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        if hasattr(item, "__dict__"):
+            stack.append(item.__dict__)
+    return total
+
 def clear_function_caches():
     "Clear all the caches created using @utils.cached or @utils.xcached."""
     for cache_func in CachedFunction.cache_set:
         log.verbose("Clearing cache for", repr(cache_func.uncached), verbosity=80)
-        cache_func.cache = dict()
+        cache_func.clear()
         
 def list_cached_functions():
     """List all the functions supporting caching under @utils.cached or @utils.xcached."""
-    for cache_func in sorted(CachedFunction.cache_set):
+    for cache_func in sorted(CachedFunction.cache_set, key=lambda cache_func: cache_func.name):
         print(repr(cache_func.uncached))
 
+def get_function_cache_stats():
+    """Return { function name : stats() } for every @utils.cached or @utils.xcached function."""
+    return { cache_func.name : cache_func.stats() for cache_func in CachedFunction.cache_set }
+
+def report_function_cache_stats(output=None):
+    """Output the statistics of every cached function which has been called,  busiest first."""
+    output = log.info if output is None else output
+    stats = get_function_cache_stats()
+    names = sorted([name for name in stats if stats[name]["hits"] or stats[name]["misses"]],
+                   key=lambda name: (-(stats[name]["hits"] + stats[name]["misses"]), name))
+    output("{:<60} {:>9} {:>9} {:>9} {:>7} {:>11} {:>7} {:>9}".format(
+        "function", "hits", "misses", "evictions", "size", "bytes", "max", "max_bytes"))
+    for name in names:
+        stat = stats[name]
+        output("{:<60} {:>9} {:>9} {:>9} {:>7} {:>11} {:>7} {:>9}".format(
+            name, stat["hits"], stat["misses"], stat["evictions"], stat["size"],
+            "-" if stat["bytes"] is None else stat["bytes"],
+            stat["max_entries"] or "-", stat["max_bytes"] or "-"))
+
 # ===================================================================
 
 def capture_output(func):
@@ -661,17 +809,54 @@ def copytree(src, dst, symlinks=False, fnc_directory=_no_message,
 def checksum(pathname):
     """Return the CRDS hexdigest for file at `pathname`.   See also
     copy_and_checksum() below which must match sha1sum results.
+
+    Blocks are read into a per-thread buffer which is reused for every file
+    rather than allocating a new bytes object per block.
     """
     xsum = hashlib.sha1()
-    with open(pathname, "rb") as infile:
-        size = 0
-        insize = os.stat(pathname).st_size
-        while size < insize:
-            block = infile.read(config.CRDS_CHECKSUM_BLOCK_SIZE)
-            size += len(block)
-            xsum.update(block)
+    buffer = _checksum_buffer()
+    with open(pathname, "rb", buffering=0) as infile:
+        while True:
+            size = infile.readinto(buffer)
+            if not size:
+                break
+            xsum.update(buffer[:size])
     return xsum.hexdigest()
 
+def _checksum_buffer():
+    """Return this thread's reusable memoryview of CRDS_CHECKSUM_BLOCK_SIZE bytes."""
+    if not hasattr(_CHECKSUM_LOCAL, "buffer"):
+        _CHECKSUM_LOCAL.buffer = memoryview(bytearray(config.CRDS_CHECKSUM_BLOCK_SIZE))
+    return _CHECKSUM_LOCAL.buffer
+
+_CHECKSUM_LOCAL = threading.local()
+
+def checksums(pathnames, workers=None, pool=None):
+    """Return { pathname : hexdigest } for files `pathnames`,  computing up to `workers`
+    checksums concurrently.   `pool` is "threads" or "processes".   Threads usually
+    suffice since hashlib and file reads release the GIL.   `workers` and `pool` default
+    to CRDS_CHECKSUM_WORKERS and CRDS_CHECKSUM_POOL.   Aggregate throughput is logged
+    at verbosity 50.
+    """
+    pathnames = list(pathnames)
+    workers = min(config.CHECKSUM_WORKERS.get() if workers is None else workers, len(pathnames))
+    pool = config.CHECKSUM_POOL.get() if pool is None else pool
+    stats = TimingStats()
+    if workers <= 1:
+        sums = { pathname : checksum(pathname) for pathname in pathnames }
+    else:
+        executor_class = ProcessPoolExecutor if pool == "processes" else ThreadPoolExecutor
+        chunksize = max(1, len(pathnames) // (workers * 4)) if pool == "processes" else 1
+        with executor_class(max_workers=workers) as executor:
+            sums = dict(zip(pathnames, executor.map(checksum, pathnames, chunksize=chunksize)))
+    if pathnames:
+        stats.increment("files", len(pathnames))
+        stats.increment("bytes", sum(os.stat(pathname).st_size for pathname in pathnames))
+        log.verbose("Checksummed", stats.status("files")[0], stats.status("bytes")[0], "at",
+                    stats.status("bytes")[1], "using", max(workers, 1), pool if workers > 1 else "serial",
+                    verbosity=50)
+    return sums
+
 def copy_and_checksum(source, destination):
     """Copy file from `source` path to `destination` path computing
     sha1sum of source during the copy.   This is a *gross* server-side
@@ -693,9 +878,28 @@ def copy_and_checksum(source, destination):
                 xsum.update(block)
     return xsum.hexdigest()
 
+def write_and_checksum(blocks, destination, max_size=None):
+    """Write the byte strings of iterable `blocks` to `destination` path computing
+    sha1sum of the data as it is written.   This is the client-side analog of
+    copy_and_checksum() for downloads,  avoiding reading each file back just to
+    verify it.  If `max_size` is not None,  raise ValueError as soon as more than
+    `max_size` bytes arrive rather than writing the remainder.  See also checksum()
+    which must have matching results.
+    """
+    xsum = hashlib.sha1()
+    with open(destination, "wb+") as destination_file:
+        size = 0
+        for block in blocks:
+            size += len(block)
+            if max_size is not None and size > max_size:
+                raise ValueError("Data for " + repr(destination) + " exceeds expected size " + repr(max_size))
+            destination_file.write(block)
+            xsum.update(block)
+    return xsum.hexdigest()
+
 def str_checksum(data):
     """Return the CRDS hexdigest for small strings.   Likewise,  must
-    match checksum() and copy_and_checksum() above.
+    match checksum(),  copy_and_checksum(),  and write_and_checksum() above.
 
     >>> str_checksum("this is a test.")
     '7728f8eb7bf75ec3cc49364861eec852fc814870'
@@ -0,0 +1,100 @@
+"""This module maintains a persistent ledger of the sha1sums crds.sync has computed for
+files in the CRDS cache so that repeated cache verifications only rehash files which
+have changed.
+
+The ledger is a sqlite3 database in the CRDS cache config area which records for each
+checksummed file:
+
+    files     path, size, mtime_ns, inode, sha1sum
+
+A file whose size,  mtime_ns,  and inode are unchanged since it was recorded is assumed
+to still have the recorded sha1sum.   Files which are new or changed are hashed
+concurrently by utils.checksums() and recorded.   The ledger only caches
+local sha1sums,  comparing them with the CRDS server catalog remains up to the caller.
+
+Setting CRDS_VERIFICATION_LEDGER=0 disables the ledger,  passing reverify=True to
+checksums() ignores it and rehashes everything:
+
+    >> checksums(["/grp/crds/cache/mappings/hst/hst.pmap"], "hst")
+    {'/grp/crds/cache/mappings/hst/hst.pmap': '...'}
+"""
+import os
+import sqlite3
+
+from . import config, log, utils
+
+# ============================================================================
+
+FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, sha1sum TEXT);
+"""
+
+# ============================================================================
+
+def connect(observatory):
+    """Return a sqlite3 connection to the verification ledger for `observatory`,  creating
+    it if needed.   A ledger with an unsupported format version is discarded.
+    """
+    path = config.locate_verification_ledger(observatory)
+    utils.ensure_dir_exists(path)
+    connection = sqlite3.connect(path)
+    version, = connection.execute("PRAGMA user_version").fetchone()
+    if version != FORMAT_VERSION:
+        if version:
+            log.verbose_warning("Rebuilding verification ledger", repr(path), "with unsupported version", version)
+        connection.executescript("DROP TABLE IF EXISTS files;")
+        connection.executescript(_SCHEMA)
+        connection.execute("PRAGMA user_version = {}".format(FORMAT_VERSION))
+        connection.commit()
+    return connection
+
+def _signature(stat):
+    """Return the (size, mtime_ns, inode) of os.stat() result `stat`."""
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+# ============================================================================
+
+def checksums(paths, observatory, reverify=False, known=None):
+    """Return { path : sha1sum } for each of `paths`,  reusing the sha1sums recorded in the
+    ledger for files which are unchanged unless `reverify` is True.
+
+    `known` is an optional { path : sha1sum } of digests already computed,  e.g. while
+    downloading,  which are recorded rather than recomputed.
+    """
+    signatures = { path : _signature(os.stat(path)) for path in paths }
+    fresh = dict(known or {})
+    recorded = {}
+    connection = _open_ledger(observatory)
+    try:
+        if connection is not None and not reverify:
+            for path in paths:
+                row = connection.execute("SELECT size, mtime_ns, inode, sha1sum FROM files WHERE path = ?",
+                                         (path,)).fetchone()
+                if row is not None and tuple(row[:3]) == signatures[path]:
+                    recorded[path] = row[3]
+        unknown = [path for path in paths if path not in fresh and path not in recorded]
+        log.verbose("Verification ledger has sha1sums for", len(recorded), "of", len(paths),
+                    "files,  computing", len(unknown), verbosity=55)
+        fresh.update(utils.checksums(unknown))
+        if connection is not None and not config.get_cache_readonly():
+            connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                                   [(path,) + signatures[path] + (sha1sum,) for (path, sha1sum) in fresh.items()
+                                    if recorded.get(path) != sha1sum])
+            connection.commit()
+    finally:
+        if connection is not None:
+            connection.close()
+    recorded.update(fresh)
+    return recorded
+
+def _open_ledger(observatory):
+    """Return a connection to the ledger for `observatory`,  or None if the ledger is disabled
+    or doesn't exist in a readonly cache.
+    """
+    if not config.VERIFICATION_LEDGER:
+        return None
+    if config.get_cache_readonly() and not os.path.exists(config.locate_verification_ledger(observatory)):
+        return None
+    return connect(observatory)
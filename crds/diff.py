@@ -8,6 +8,7 @@ from collections import defaultdict
 import tempfile
 import json
 import pprint
+import pickle
 import re
 
 # ============================================================================
@@ -19,6 +20,7 @@ from astropy.io.fits import FITSDiff
 import crds
 from crds.core import config, log, pysh, utils, rmap
 from crds.core import cmdline, naming
+from crds.core.heavy_client import cache_atomic_write
 from crds import rowdiff, sync
 
 # ============================================================================
@@ -29,10 +31,12 @@ __all__ = [
     "get_affected",
     "get_added_references",
     "get_deleted_references",
+    "get_diff_cache_stats",
     "diff_action",
     "diff_replace_old_new",
     "mapping_check_diffs",
     "mapping_diffs",
+    "prune_diff_cache",
 ]
 
 # ============================================================================
@@ -50,6 +54,34 @@ def mapping_diffs(old_file, new_file, *args, **keys):
     differ = MappingDifferencer(observatory, old_file, new_file, *args, **keys)
     return differ.mapping_diffs()
 
+def get_diff_cache_stats():
+    """Return { "hits" : int, "disk_hits" : int, "misses" : int } counting mapping_diffs()
+    results reused by a MappingDifferencer,  read from the CRDS_DIFF_CACHE on-disk cache,
+    or computed.
+    """
+    return dict(_DIFF_CACHE_STATS)
+
+_DIFF_CACHE_STATS = dict(hits=0, disk_hits=0, misses=0)
+
+def prune_diff_cache(max_files=None):
+    """Remove the least recently used CRDS_DIFF_CACHE differences until at most `max_files`,
+    by default CRDS_DIFF_CACHE_MAX_FILES,  remain.   prune_diff_cache(0) removes them all.
+    """
+    max_files = config.DIFF_CACHE_MAX_FILES.get() if max_files is None else max_files
+    cache_dir = os.path.dirname(config.locate_diff_cache("key"))
+    if not os.path.isdir(cache_dir):
+        return
+    paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".pkl")]
+    if len(paths) <= max_files:
+        return
+    used = {}
+    for path in paths:
+        with log.verbose_warning_on_exception("Failed checking cached differences", repr(path)):
+            used[path] = os.path.getmtime(path)
+    for path in sorted(used, key=used.get)[:max(len(used) - max_files, 0)]:
+        with log.verbose_warning_on_exception("Failed removing cached differences", repr(path)):
+            os.remove(path)
+
 def get_affected(old_pmap, new_pmap, *args, **keys):
     """Examine the diffs between `old_pmap` and `new_pmap` and return sorted lists of affected instruments and types.
     
@@ -191,6 +223,8 @@ class MappingDifferencer(Differencer):
         assert os.path.splitext(self.old_file)[-1] == os.path.splitext(self.new_file)[-1], \
             "Files " + repr(self.old_file) + " and " + repr(self.new_file) + \
             " are not the same kind of CRDS mapping:  .pmap, .imap, .rmap"
+        self._mapping_diffs = {}   # (include_header_diffs, recurse_added_deleted) : differences
+        self._mappings = None      # (old_map, new_map) once loaded
 
     def difference(self):
         """Print the logical differences between CRDS mappings named `old_file` 
@@ -251,11 +285,65 @@ class MappingDifferencer(Differencer):
         
         IFF recurse_added_deleted,  include difference tuples for all nested adds and deletes whenever a higher level
         mapping is added or deleted.   Else, only include the higher level mapping,  not contained files.
-        
+
+        The differences are computed once per differencer,  and with CRDS_DIFF_CACHE once per pair
+        of mapping hierarchies,  and reused by get_affected(),  header_modified(),  etc.
+        """
+        options = (self.include_header_diffs, self.recurse_added_deleted)
+        if options in self._mapping_diffs:
+            _DIFF_CACHE_STATS["hits"] += 1
+        else:
+            self._mapping_diffs[options] = self._cached_mapping_diffs()
+        return list(self._mapping_diffs[options])
+
+    def _cached_mapping_diffs(self):
+        """Return the differences from the CRDS_DIFF_CACHE on-disk cache or _compute_mapping_diffs(),
+        saving computed differences.   Cache-to-cache differences are not cached since they exist
+        to compare files with the same names.
+        """
+        if not config.DIFF_CACHE or self.cache1 or self.cache2:
+            _DIFF_CACHE_STATS["misses"] += 1
+            return self._compute_mapping_diffs()
+        cache_path = config.locate_diff_cache(self._diff_cache_key())
+        if os.path.exists(cache_path):
+            with log.verbose_warning_on_exception("Failed loading cached differences", repr(cache_path)):
+                with open(cache_path, "rb") as pickled:
+                    differences = pickle.load(pickled)
+                if not config.get_cache_readonly():
+                    os.utime(cache_path)   # recently used,  see prune_diff_cache()
+                _DIFF_CACHE_STATS["disk_hits"] += 1
+                log.verbose("Loaded cached differences", repr(cache_path), verbosity=55)
+                return differences
+        _DIFF_CACHE_STATS["misses"] += 1
+        differences = self._compute_mapping_diffs()
+        if not config.get_cache_readonly():
+            cache_atomic_write(cache_path, pickle.dumps(differences), "DIFF CACHE")
+            prune_diff_cache()
+        return differences
+
+    def _diff_cache_key(self):
+        """Return the key of the on-disk cached differences,  the sha1sum of the content hashes and
+        locations of the mappings and the differencing options.   The content hashes cover every
+        nested mapping,  so regenerating a child mapping under the same name changes the key.
         """
-        # At this time,  the fetch_mapping path parameter appears to exist only to thwart CRDS mapping caching.
-        old_map = rmap.fetch_mapping(self.locate_file1(self.old_file), ignore_checksum=True, path=self.mappings_cache1)
-        new_map = rmap.fetch_mapping(self.locate_file2(self.new_file), ignore_checksum=True, path=self.mappings_cache2)
+        old_map, new_map = self._load_mappings()
+        return utils.str_checksum(json.dumps([
+            old_map.content_hash(), new_map.content_hash(),
+            self.locate_file1(self.old_file), self.locate_file2(self.new_file),
+            self.include_header_diffs, self.recurse_added_deleted]))
+
+    def _load_mappings(self):
+        """Return (old_map, new_map),  loading them on first use."""
+        if self._mappings is None:
+            # At this time,  the fetch_mapping path parameter appears to exist only to thwart CRDS mapping caching.
+            old_map = rmap.fetch_mapping(self.locate_file1(self.old_file), ignore_checksum=True, path=self.mappings_cache1)
+            new_map = rmap.fetch_mapping(self.locate_file2(self.new_file), ignore_checksum=True, path=self.mappings_cache2)
+            self._mappings = (old_map, new_map)
+        return self._mappings
+
+    def _compute_mapping_diffs(self):
+        """Load the mappings and return their differences."""
+        old_map, new_map = self._load_mappings()
         differences = old_map.difference(new_map, include_header_diffs=self.include_header_diffs,
                                          recurse_added_deleted=self.recurse_added_deleted)
         return differences
@@ -155,7 +155,14 @@ class FitsFile(AbstractFile):
         """Get the union of keywords from all header extensions of FITS
         file `fname`.  In the case of collisions, keep the first value
         found as extensions are loaded in numerical order.
+
+        Unless checksums are being verified,  CRDS_FITS_FAST_HEADERS first tries
+        scan_fits_header() and only opens the file with astropy if the scan fails.
         """
+        if config.FITS_FAST_HEADERS and not keys.get("checksum", config.FITS_VERIFY_CHECKSUM):
+            union = scan_fits_header(self.filepath, needed_keys)
+            if union is not None:
+                return union
         union = []
         with fits_open(self.filepath, **keys) as hdulist:
             for hdu in hdulist:
@@ -235,6 +242,140 @@ class FitsFile(AbstractFile):
             for hdu in hdus:
                 hdu.verify("warn")
                 
+# ============================================================================
+
+FITS_BLOCK = 2880
+FITS_CARD = 80
+
+# Value field of a FITS card as interpreted by astropy Card.value,  see scan_fits_header().
+_FITS_STRING_RE = re.compile(r"^ *'(?P<strg>(?:[^']|'')*)' *(?:/.*)?$")
+_FITS_LOGICAL_RE = re.compile(r"^ *(?P<bool>[TF]) *(?:/.*)?$")
+_FITS_NUMBER_RE = re.compile(r"^ *(?P<numr>[+-]?(?:\.\d+|\d+(?:\.\d*)?)(?:[DEde][+-]?\d+)?) *(?:/.*)?$")
+_FITS_KEYWORD_RE = re.compile(r"^[A-Z0-9_-]{0,8}$")
+
+class _UnusualFits(Exception):
+    """The file requires astropy to read its header."""
+
+def scan_fits_header(filepath, needed_keys=()):
+    """Return the (keyword, str(value)) union of all HDU headers of FITS file `filepath`,
+    the same as FitsFile.get_raw_header() reads with astropy,  or None if the file has any
+    feature the scanner doesn't handle and astropy must be used instead.
+
+    Only the 2880-byte header blocks are read;  each data unit is skipped using the size
+    defined by BITPIX,  NAXISn,  PCOUNT,  and GCOUNT.   If `needed_keys` are specified only
+    those cards are returned,  and scanning stops as soon as all of them have been found
+    unless one is a key like HISTORY which accumulates across HDUs.
+
+    Fallback cases include compressed or truncated files,  missing END cards,  random
+    groups,  HIERARCH or CONTINUE cards,  and values other than strings,  logicals,  or
+    real numbers for the keywords being returned.
+    """
+    from crds.io.abstract import APPEND_KEYS
+    needed = { str(key).upper() for key in needed_keys }
+    if any(not _FITS_KEYWORD_RE.match(key) or key == "CONTINUE" for key in needed):
+        return None
+    stop_early = bool(needed) and not (needed & set(APPEND_KEYS))
+    union, found = [], set()
+    try:
+        with open(filepath, "rb") as handle:
+            filesize = os.fstat(handle.fileno()).st_size
+            offset = 0
+            while offset < filesize:
+                cards, offset = _scan_hdu_cards(handle, offset, offset == 0)
+                structure = {}
+                for keyword, field in cards:
+                    if keyword in _FITS_STRUCTURE_KEYS:
+                        structure[keyword] = field
+                    if not needed or keyword in needed:
+                        union.append((keyword, _fits_card_value(keyword, field)))
+                        found.add(keyword)
+                if stop_early and found >= needed:
+                    break
+                offset += _fits_data_size(structure)
+                if offset > filesize:
+                    raise _UnusualFits("truncated data unit")
+    except (_UnusualFits, OSError, ValueError, UnicodeDecodeError) as exc:
+        log.verbose("Reading FITS header of", repr(filepath), "with astropy:", str(exc), verbosity=70)
+        return None
+    return union
+
+_FITS_STRUCTURE_KEYS = { "BITPIX", "NAXIS", "PCOUNT", "GCOUNT", "GROUPS" } | \
+    { "NAXIS" + str(i) for i in range(1, 1000) }
+
+def _scan_hdu_cards(handle, offset, primary):
+    """Read the header starting at `offset` of `handle` and return ([(keyword, value_field), ...],
+    data_offset) for its cards,  skipping blank keyword cards as get_raw_header() does.   value_field is the text after "= " or,
+    for COMMENT and HISTORY cards,  after the keyword.
+    """
+    handle.seek(offset)
+    cards = []
+    while True:
+        block = handle.read(FITS_BLOCK)
+        if len(block) != FITS_BLOCK:
+            raise _UnusualFits("missing END card")
+        text = block.decode("ascii")
+        offset += FITS_BLOCK
+        for i in range(0, FITS_BLOCK, FITS_CARD):
+            image = text[i:i+FITS_CARD]
+            if not cards and not image.startswith("SIMPLE  = " if primary else "XTENSION= "):
+                raise _UnusualFits("not a standard FITS HDU")
+            keyword = image[:8].rstrip()
+            if keyword == "END":
+                return cards, offset
+            if keyword in ["COMMENT", "HISTORY"]:
+                cards.append((keyword, image[8:]))
+            elif not keyword:
+                continue
+            elif image[8:10] == "= " and _FITS_KEYWORD_RE.match(keyword) and keyword:
+                cards.append((keyword, image[10:]))
+            else:
+                raise _UnusualFits("nonstandard card " + repr(image))
+
+def _fits_card_value(keyword, field):
+    """Return str(astropy Card.value) for the card with `keyword` and value `field`."""
+    if keyword in ["COMMENT", "HISTORY"]:
+        return field.rstrip()
+    match = _FITS_STRING_RE.match(field)
+    if match:
+        value = match.group("strg").replace("''", "'").rstrip()
+        if value.endswith("&"):
+            raise _UnusualFits("possible CONTINUE string")
+        return value
+    match = _FITS_LOGICAL_RE.match(field)
+    if match:
+        return str(match.group("bool") == "T")
+    match = _FITS_NUMBER_RE.match(field)
+    if match:
+        number = match.group("numr")
+        if any(char in number for char in ".DEde"):
+            return str(float(number.translate(str.maketrans("Dd", "EE"))))
+        return str(int(number))
+    raise _UnusualFits("unsupported value for " + repr(keyword))
+
+def _fits_data_size(structure):
+    """Return the padded size in bytes of the data unit described by header cards `structure`."""
+    def integer(keyword, default=None):
+        field = structure.get(keyword)
+        if field is None:
+            if default is None:
+                raise _UnusualFits("missing " + keyword)
+            return default
+        match = _FITS_NUMBER_RE.match(field)
+        if not match or any(char in match.group("numr") for char in ".DEde"):
+            raise _UnusualFits("non-integer " + keyword)
+        return int(match.group("numr"))
+    groups = _FITS_LOGICAL_RE.match(structure.get("GROUPS", "F"))
+    if not groups or groups.group("bool") == "T":
+        raise _UnusualFits("random groups")
+    naxis = integer("NAXIS")
+    if naxis == 0:
+        return 0
+    elements = 1
+    for i in range(1, naxis + 1):
+        elements *= integer("NAXIS" + str(i))
+    size = abs(integer("BITPIX")) // 8 * integer("GCOUNT", 1) * (integer("PCOUNT", 0) + elements)
+    return (size + FITS_BLOCK - 1) // FITS_BLOCK * FITS_BLOCK
+
 def test():
     from crds.io import fits
     import doctest
@@ -8,7 +8,7 @@ import os.path
 
 from astropy import table
 
-from crds.core import utils, log
+from crds.core import utils, log, config
 from crds import data_file
 
 _HERE = os.path.dirname(__file__) or "."
@@ -25,7 +25,7 @@ def ntables(filename):
     else:
         return 1
 
-@utils.cached
+@utils.xcached(max_entries=100)
 def tables(filename):
     """Return [ SimpleTable(filename, segment), ... ] for each table segment in filename.
     
@@ -51,36 +51,65 @@ def clear_cache():
 
 
 class SimpleTable:
-    """A simple class to encapsulate astropy tables for basic CRDS readonly table row and colname access."""
+    """A simple class to encapsulate astropy tables for basic CRDS readonly table row and colname access.
+
+    Table data is retained column-wise as the arrays astropy produces for each column;  row tuples are
+    only materialized when .rows or .row() is used.   When CRDS_TABLE_MEMMAP is set,  FITS tables are
+    opened memory mapped so that column data is only paged in as it is accessed.
+    """
     def __init__(self, filename, segment=1):
         self.filename = filename
         self.segment = segment
         self.basename = os.path.basename(filename)
+        self._rows = None     # dynamic,  materialized from column arrays on demand
         self._columns = None  # dynamic,  independent of astropy
         if filename.endswith(".fits"):
-            with data_file.fits_open(filename) as hdus:
+            with data_file.fits_open(filename, memmap=bool(config.TABLE_MEMMAP)) as hdus:
                 tab = hdus[segment].data
-                self.colnames = tuple(name.upper() for name in tab.columns.names)
-                self.rows = tuple(tuple(row) for row in tab)   # readonly
+                names = tab.columns.names
+                self.colnames = tuple(name.upper() for name in names)
+                self._arrays = tuple(tab.field(name) for name in names)   # readonly
+                self.nrows = len(tab)
         else:
             tab = table.Table.read(filename)
             self.colnames = tuple(name.upper() for name in tab.columns)
-            self.rows = tuple(tuple(row) for row in tab)   # readonly
+            self._arrays = tuple(tab.columns.values())   # readonly
+            self.nrows = len(tab)
         log.verbose("Creating", repr(self), verbosity=60)
-        
+
+    def column(self, name):
+        """Return the array of values for column `name` (case insensitive) without materializing rows."""
+        return self._arrays[self.colnames.index(name.upper())]
+
+    def row(self, index):
+        """Return the tuple of values for row number `index`."""
+        if self._rows is not None:
+            return self._rows[index]
+        return tuple(array[index] for array in self._arrays)
+
+    @property
+    def rows(self):
+        """Based on the column arrays,  create the tuple of row tuples dynamically.
+
+        Returns ( (value, ...), ... )
+        """
+        if self._rows is None:
+            self._rows = tuple(self.row(i) for i in range(self.nrows))
+        return self._rows
+
     @property
     def columns(self):
-        """Based on the row tuples,  create columns dict dynamically.  This permits closing astropy Table during __init__.
+        """Based on the column arrays,  create columns dict dynamically.  This permits closing astropy Table during __init__.
         
         Retuns { colname : column, ... }
         """
         if self._columns is None:
-            self._columns = dict(list(zip(self.colnames, list(zip(*self.rows)))))
+            self._columns = { name : tuple(array) for (name, array) in zip(self.colnames, self._arrays) }
         return self._columns
         
     def __repr__(self):
         return (self.__class__.__name__ + "(" + repr(self.basename) + ", " + repr(self.segment) + ", colnames=" +
-                repr(self.colnames) + ", nrows=" + str(len(self.rows)) + ")")
+                repr(self.colnames) + ", nrows=" + str(self.nrows) + ")")
     
     
 
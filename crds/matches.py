@@ -14,7 +14,7 @@ from collections import defaultdict
 from pprint import pprint as pp   # doctests
 
 import crds
-from crds.core import log, utils, cmdline, selectors
+from crds.core import log, utils, cmdline, selectors, config, reverse_index
 from crds.client import api
 
 # ===================================================================
@@ -60,6 +60,8 @@ def find_full_match_paths(context, reffile):
        ('CCDCHIP', 'N/A')),
       (('DATE-OBS', '2006-07-04'), ('TIME-OBS', '11:32:35')))]
     """
+    if config.REVERSE_INDEX.get() and reverse_index.usable(config.mapping_to_observatory(context)):
+        return reverse_index.file_matches(context, reffile)
     ctx = crds.get_pickled_mapping(context, cached=True)  # reviewed
     return ctx.file_matches(reffile)
 
@@ -302,8 +304,10 @@ jwst_niriss_throughput_0008.fits :  META.INSTRUMENT.FILTER='F480M'
     def find_match_tuples(self, context, reffile):
         """Return the list of match representations for `reference` in `context`.   
         """
-        ctx = crds.get_cached_mapping(context)
-        matches = ctx.file_matches(reffile)
+        if config.REVERSE_INDEX.get() and reverse_index.usable(config.mapping_to_observatory(context)):
+            matches = reverse_index.file_matches(context, reffile)
+        else:
+            matches = crds.get_cached_mapping(context).file_matches(reffile)
         result = []
         for path in matches:
             prefix = self.format_prefix(path[0])
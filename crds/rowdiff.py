@@ -4,7 +4,10 @@ script. Written to add this functionality to crds.diff.
 """
 import sys
 
+import bisect
 import difflib
+from collections import Counter
+from collections.abc import Sequence
 from itertools import product
 import numpy as np
 
@@ -13,7 +16,7 @@ from astropy.io.fits import TableDataDiff
 from astropy.io.fits.hdu.hdulist import fitsopen
 from astropy.io.fits.hdu.table import _TableLikeHDU
 
-from crds.core  import rmap, cmdline
+from crds.core  import rmap, cmdline, config
 
 #==========================================================================
 # Utilities
@@ -41,6 +44,208 @@ def table_to_string(a_table):
     return result
 
 
+class RowStrings(Sequence):
+    """Sequence of the table_to_string() rows of `a_table`,  converting rows only
+    as they are accessed.
+    """
+    def __init__(self, a_table):
+        self.table = a_table
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return str(list(self.table[index])).strip('[]')
+
+
+def table_to_keys(a_table, b_table):
+    """Return hashable keys for the rows of two tables.   Rows with equal values
+    have equal keys.
+
+    Parameters
+    ----------
+    a_table, b_table : astropy.table.table.Table
+        The tables to convert
+
+    Returns
+    -------
+    result : tuple of two lists
+        The raw bytes of each row when both tables have the same unmasked,
+        non-object dtype,  otherwise the table_to_string() of each row.
+
+    """
+    a_array = a_table.as_array()
+    b_array = b_table.as_array()
+    if a_array.dtype != b_array.dtype or a_array.dtype.hasobject or \
+       isinstance(a_array, np.ma.MaskedArray) or isinstance(b_array, np.ma.MaskedArray):
+        return table_to_string(a_table), table_to_string(b_table)
+    row_dtype = np.dtype((np.void, a_array.dtype.itemsize))
+    return (np.ascontiguousarray(a_array).view(row_dtype).tolist(),
+            np.ascontiguousarray(b_array).view(row_dtype).tolist())
+
+
+def longest_increasing(values):
+    """Return the indices of a longest increasing subsequence of distinct `values`.
+
+    >>> longest_increasing([3, 0, 4, 1, 2, 9, 5])
+    [1, 3, 4, 6]
+    """
+    tails, tail_indices, previous = [], [], [-1] * len(values)
+    for index, value in enumerate(values):
+        position = bisect.bisect_left(tails, value)
+        if position:
+            previous[index] = tail_indices[position - 1]
+        if position == len(tails):
+            tails.append(value)
+            tail_indices.append(index)
+        else:
+            tails[position] = value
+            tail_indices[position] = index
+    result = []
+    index = tail_indices[-1] if tail_indices else -1
+    while index >= 0:
+        result.append(index)
+        index = previous[index]
+    return result[::-1]
+
+
+class HashSequenceMatcher(difflib.SequenceMatcher):
+    """SequenceMatcher work-alike which matches rows by patience diff rather than
+    difflib's search for longest matching blocks,  which is roughly quadratic and
+    stalls on tables of hundreds of thousands of rows.
+
+    After trimming the common prefix and suffix,  the elements which occur exactly
+    once in both `a` and `b` are hash joined,  and the longest run of those pairs in
+    increasing order in both sequences become anchors.   The gaps between anchors
+    are matched the same way,  and gaps with no unique elements are matched by
+    difflib.SequenceMatcher.   Elements must be hashable.
+
+    >>> sm = HashSequenceMatcher(["a", "b", "c", "d", "e"], ["a", "c", "x", "d", "e", "f"])
+    >>> sm.get_matching_blocks()
+    [Match(a=0, b=0, size=1), Match(a=2, b=1, size=1), Match(a=3, b=3, size=2), Match(a=5, b=6, size=0)]
+    >>> sm.get_opcodes()
+    [('equal', 0, 1, 0, 1), ('delete', 1, 2, 1, 1), ('equal', 2, 3, 1, 2), ('insert', 3, 3, 2, 3), ('equal', 3, 5, 3, 5), ('insert', 5, 5, 5, 6)]
+
+    Duplicated elements are matched where they are unique within a gap:
+
+    >>> HashSequenceMatcher([1, 2, 1, 3], [2, 1, 4]).get_opcodes()
+    [('delete', 0, 1, 0, 0), ('equal', 1, 3, 0, 2), ('replace', 3, 4, 2, 3)]
+    """
+
+    def __init__(self, a=(), b=()):
+        super(HashSequenceMatcher, self).__init__(None, a, b, autojunk=False)
+
+    def set_seq1(self, a):
+        self.a = a
+        self.matching_blocks = self.opcodes = None
+
+    def set_seq2(self, b):
+        self.b = b
+        self.matching_blocks = self.opcodes = None
+        self.fullbcount = None
+
+    def get_matching_blocks(self):
+        """Return a list of difflib Match(a, b, size) triples describing matching
+        subsequences,  ending with the dummy Match(len(a), len(b), 0).
+        """
+        if self.matching_blocks is not None:
+            return self.matching_blocks
+        a, b = self.a, self.b
+        matches = []
+        regions = [(0, len(a), 0, len(b))]
+        while regions:
+            a_low, a_high, b_low, b_high = regions.pop()
+            size = 0
+            while a_low + size < a_high and b_low + size < b_high and a[a_low + size] == b[b_low + size]:
+                size += 1
+            if size:
+                matches.append((a_low, b_low, size))
+                a_low, b_low = a_low + size, b_low + size
+            size = 0
+            while a_high - size > a_low and b_high - size > b_low and a[a_high - size - 1] == b[b_high - size - 1]:
+                size += 1
+            if size:
+                a_high, b_high = a_high - size, b_high - size
+                matches.append((a_high, b_high, size))
+            if a_low == a_high or b_low == b_high:
+                continue
+            anchors = self._unique_anchors(a, b, a_low, a_high, b_low, b_high)
+            if anchors:
+                for i, j in anchors:
+                    regions.append((a_low, i, b_low, j))
+                    matches.append((i, j, 1))
+                    a_low, b_low = i + 1, j + 1
+                regions.append((a_low, a_high, b_low, b_high))
+            else:
+                gap = difflib.SequenceMatcher(None, a[a_low:a_high], b[b_low:b_high], autojunk=False)
+                matches.extend((a_low + i, b_low + j, size) for (i, j, size) in gap.get_matching_blocks() if size)
+        blocks = []
+        for i, j, size in sorted(matches):
+            if blocks and blocks[-1][0] + blocks[-1][2] == i and blocks[-1][1] + blocks[-1][2] == j:
+                blocks[-1][2] += size
+            else:
+                blocks.append([i, j, size])
+        blocks.append([len(a), len(b), 0])
+        self.matching_blocks = [difflib.Match(*block) for block in blocks]
+        return self.matching_blocks
+
+    @staticmethod
+    def _unique_anchors(a, b, a_low, a_high, b_low, b_high):
+        """Return the (i, j) pairs of the longest increasing run of elements
+        occurring once in both a[a_low:a_high] and b[b_low:b_high].
+        """
+        a_counts, b_positions = Counter(a[a_low:a_high]), {}
+        for j in range(b_low, b_high):
+            b_positions[b[j]] = -1 if b[j] in b_positions else j
+        a_matches, b_matches = [], []
+        for i in range(a_low, a_high):
+            j = b_positions.get(a[i], -1)
+            if j >= 0 and a_counts[a[i]] == 1:
+                a_matches.append(i)
+                b_matches.append(j)
+        return [(a_matches[k], b_matches[k]) for k in longest_increasing(b_matches)]
+
+
+def unified_diff(matcher, a_lines, b_lines, fromfile, tofile, n=3):
+    """Return the lines of difflib.unified_diff() for the opcodes of `matcher`
+    rather than those of a new difflib.SequenceMatcher.   Only the changed lines
+    and their `n` lines of context are accessed.
+    """
+    started = False
+    for group in matcher.get_grouped_opcodes(n):
+        if not started:
+            started = True
+            yield '--- {}\n'.format(fromfile)
+            yield '+++ {}\n'.format(tofile)
+        first, last = group[0], group[-1]
+        yield '@@ -{} +{} @@\n'.format(_format_range_unified(first[1], last[2]),
+                                       _format_range_unified(first[3], last[4]))
+        for tag, a_start, a_end, b_start, b_end in group:
+            if tag == 'equal':
+                for line in a_lines[a_start:a_end]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a_lines[a_start:a_end]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b_lines[b_start:b_end]:
+                    yield '+' + line
+
+
+def _format_range_unified(start, stop):
+    """Convert a range to the "ed" format used by unified diffs."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return '{}'.format(beginning)
+    if not length:
+        beginning -= 1
+    return '{},{}'.format(beginning, length)
+
+
 def list_intersection(a_list, b_list, transform=lambda element : element):
     """Return a list of the intersection of two lists.
 
@@ -302,6 +507,12 @@ class RowDiff:
     mode_fields: sequence
         List of fields that define modes to compare
 
+    engine: string
+        'hash' to match rows and modes with HashSequenceMatcher,  'difflib' to use
+        difflib.SequenceMatcher,  'auto' to use difflib unless a sequence has more
+        than CRDS_ROWDIFF_HASH_ROWS elements.   Defaults to CRDS_ROWDIFF_ENGINE.
+        The engines can pair duplicated rows or modes differently.
+
 
     Returns
     -------
@@ -333,13 +544,16 @@ class RowDiff:
                  b_fits,
                  fields=[],
                  ignore_fields=[],
-                 mode_fields=[]):
+                 mode_fields=[],
+                 engine=None):
 
         self.a_hdulist = a_fits
         self.b_hdulist = b_fits
         self.fields = [field.lower() for field in fields]
         self.ignore_fields = [field.lower() for field in ignore_fields]
         self.mode_fields = mode_fields
+        self.engine = config.ROWDIFF_ENGINE.get() if engine is None else engine
+        self.hash_rows = config.ROWDIFF_HASH_ROWS.get()
         self.summary_only = False
         self.consistent = False
 
@@ -379,6 +593,18 @@ class RowDiff:
                                        self.diff(self.a_hdulist[hdu_index].data, 
                                                  self.b_hdulist[hdu_index].data)))
 
+    def use_hash(self, *lengths):
+        """Return True IFF sequences of `lengths` should be matched by HashSequenceMatcher."""
+        if self.engine == "auto":
+            return max(lengths) > self.hash_rows
+        return self.engine == "hash"
+
+    def matcher(self, a_seq, b_seq):
+        """Return a SequenceMatcher comparing `a_seq` to `b_seq` for the selected engine."""
+        if self.use_hash(len(a_seq), len(b_seq)):
+            return HashSequenceMatcher(a_seq, b_seq)
+        return difflib.SequenceMatcher(None, a_seq, b_seq)
+
     def modediff(self, a_fitstable, b_fitstable):
         """Produce diff-like output for table contents comparison
 
@@ -501,20 +727,19 @@ class RowDiff:
         modes_string = table_to_string(vc_table)
 
         # Diff between the all modes and first table.
-        sm = difflib.SequenceMatcher()
-        sm.set_seqs(modes_string, a_string)
+        sm = self.matcher(modes_string, a_string)
         result_modes_vs_a = (vc_table,
                              a_table_modes,
                              sm.get_opcodes())
 
         # Diff between all modes and the second table.
-        sm.set_seqs(modes_string, b_string)
+        sm = self.matcher(modes_string, b_string)
         result_modes_vs_b = (vc_table,
                              b_table_modes,
                              sm.get_opcodes())
 
         # Diff between the two tables.
-        sm.set_seqs(a_string, b_string)
+        sm = self.matcher(a_string, b_string)
         result_a_vs_b = (a_table_modes,
                          b_table_modes,
                          sm.get_opcodes())
@@ -542,20 +767,14 @@ class RowDiff:
                 a_table_common_fields = a_table[fields_all]
                 b_table_common_fields = b_table[fields_all]
 
-                # Create the tables that will be built into.
-                dtypes = []
-                for index in range(len(a_table_common_fields.dtype)):
-                    dtypes.append(a_table_common_fields.dtype[index])
-                a_table_values = Table(names=a_table_common_fields.colnames,
-                                       dtype=dtypes)
-                b_table_values = Table(names=a_table_common_fields.colnames,
-                                       dtype=dtypes)
-
-                for block in matching_blocks:
-                    (a_row, b_row, n_rows) = block
-                    for row in range(n_rows):
-                        a_table_values.add_row(a_table_common_fields[a_row + row])
-                        b_table_values.add_row(b_table_common_fields[b_row + row])
+                # Select the rows of the matching blocks at once rather than
+                # adding them one by one,  which is quadratic.
+                a_rows = np.concatenate([np.arange(a_row, a_row + n_rows, dtype=int)
+                                         for (a_row, b_row, n_rows) in matching_blocks])
+                b_rows = np.concatenate([np.arange(b_row, b_row + n_rows, dtype=int)
+                                         for (a_row, b_row, n_rows) in matching_blocks])
+                a_table_values = a_table_common_fields[a_rows]
+                b_table_values = b_table_common_fields[b_rows]
 
                 # If values for the modes were defined, then select
                 # only those rows.
@@ -577,8 +796,7 @@ class RowDiff:
 
                 # Find the differences. First use SequenceMatcher to get a
                 # very concise list of changes.
-                sm = difflib.SequenceMatcher()
-                sm.set_seqs(a_string, b_string)
+                sm = self.matcher(a_string, b_string)
                 common_mode_diffs = (a_table_values,
                                      b_table_values,
                                      sm.get_opcodes())
@@ -646,6 +864,9 @@ class RowDiff:
         a_table = a_table[fields_common]
         b_table = b_table[fields_common]
 
+        if self.use_hash(len(a_table), len(b_table)):
+            return self.hash_rowdiff(a_table, b_table)
+
         # We will be using string-based difflib for further
         # operations, so convert the tables to strings.
         a_string = table_to_string(a_table)
@@ -667,6 +888,20 @@ class RowDiff:
         # Return the opcodes
         return result
 
+    def hash_rowdiff(self, a_table, b_table):
+        """rowdiff() tables `a_table` and `b_table` by joining their hashed rows
+        with HashSequenceMatcher,  converting only the rows in the unified diff
+        to strings.
+        """
+        a_keys, b_keys = table_to_keys(a_table, b_table)
+        sm = HashSequenceMatcher(a_keys, b_keys)
+        result = None
+        if sm.ratio() < 0.99:
+            result = (sm.get_opcodes(),
+                      unified_diff(sm, RowStrings(a_table), RowStrings(b_table),
+                                   "Table A", "Table B"))
+        return result
+
     def __str__(self):
         """Provide readable output
 
@@ -751,8 +986,8 @@ class RowDiff:
 
                             if not self.summary_only:
                                 result_temp += '\n    Row difference, unified diff format:\n'
-                                for unified_diff_row in unified_diff:
-                                    result_temp += '        %s\n' % unified_diff_row
+                                result_temp += ''.join('        %s\n' % unified_diff_row
+                                                       for unified_diff_row in unified_diff)
                                 
                 if result_temp:
                     result += result_temp
@@ -911,6 +1146,9 @@ class RowDiffScript(cmdline.Script):
         self.add_argument("--mode-fields",
                           help="List of fields to do a mode compare",
                           type=str)
+        self.add_argument("--engine", choices=["auto", "hash", "difflib"], default=None,
+                          help="Match rows by hash join,  with difflib,  or by hash join only for tables "
+                          "longer than CRDS_ROWDIFF_HASH_ROWS.  Defaults to CRDS_ROWDIFF_ENGINE")
 
     locate_file = cmdline.Script.locate_file_outside_cache
 
@@ -936,7 +1174,8 @@ class RowDiffScript(cmdline.Script):
         print(RowDiff(tableA_path, tableB_path,
                       fields=fields,
                       ignore_fields=ignore_fields,
-                      mode_fields=mode_fields))
+                      mode_fields=mode_fields,
+                      engine=self.args.engine))
 
 if __name__ == "__main__":
     sys.exit(RowDiffScript()())
@@ -32,7 +32,8 @@ import glob
 # ============================================================================
 
 import crds
-from crds.core import log, config, utils, rmap, heavy_client, cmdline, crds_cache_locking
+from crds.core import log, config, utils, rmap, heavy_client, cmdline, crds_cache_locking, reverse_index
+from crds.core import verification_ledger
 from crds import data_file
 from crds.core.log import srepr
 from crds.client import api
@@ -177,6 +178,12 @@ class SyncScript(cmdline.ContextsScript):
        
         For smaller caches *--check-sha1sum* is likekly to be less of a performance/runtime issue and should be used
         to detect files which have changed in contents but not in length,  particularly CRDS mapping files.
+        Files downloaded earlier in the same run were already checksummed as they were written and are
+        not read back to recompute their sha1sums.  Other files are hashed in parallel and their sha1sums
+        are recorded in a verification ledger in the CRDS config area;  subsequent runs only rehash files
+        whose size,  modification time,  or inode have changed.  Use *--reverify-all* to rehash everything:
+
+           % crds sync --contexts hst_0001.pmap --check-sha1sum --reverify-all
      
     * Removing blacklisted or rejected files
     
@@ -232,6 +239,8 @@ class SyncScript(cmdline.ContextsScript):
                           help='Check cached files against the CRDS database and report anomalies.')
         self.add_argument('-s', '--check-sha1sum', action='store_true', dest='check_sha1sum',
                           help='For --check-files,  also verify file sha1sums.')
+        self.add_argument('--reverify-all', action='store_true', dest='reverify_all',
+                          help='For --check-files,  recompute all sha1sums ignoring the verification ledger.')
         self.add_argument('-r', '--repair-files', action='store_true', dest='repair_files',
                           help='Repair or re-download files noted as bad by --check-files')
         self.add_argument('--purge-rejected', action='store_true', dest='purge_rejected',
@@ -298,6 +307,11 @@ class SyncScript(cmdline.ContextsScript):
         if self.args.save_pickles:
             self.pickle_contexts(self.contexts)
 
+        # index the mappings now in the cache for crds.uses and crds.matches
+        if config.REVERSE_INDEX.get() and not config.get_cache_readonly():
+            with log.error_on_exception("Failed updating reverse index"):
+                reverse_index.update_index(self.observatory)
+
         # update CRDS cache config area,  including stored version of operational context.
         # implement pipeline support functions of context update verify and echo
         # If explicit files were specified,  do not update cache config.
@@ -566,6 +580,7 @@ class SyncScript(cmdline.ContextsScript):
         except Exception as exc:
             log.error("Failed getting file info.  CACHE VERIFICATION FAILED.  Exception: ", repr(str(exc)))
             return
+        sha1sums = self.local_sha1sums(files, infos)
         bytes_so_far = 0
         total_bytes = api.get_total_bytes(infos)
         for nth_file, file in enumerate(files):
@@ -573,11 +588,29 @@ class SyncScript(cmdline.ContextsScript):
             if infos[bfile] == "NOT FOUND":
                 log.error("CRDS has no record of file", repr(bfile))
             else:
-                self.verify_file(file, infos[bfile], bytes_so_far, total_bytes, nth_file, len(files))
+                self.verify_file(file, infos[bfile], bytes_so_far, total_bytes, nth_file, len(files), sha1sums)
                 bytes_so_far += int(infos[bfile]["size"])
-        
-    def verify_file(self, file, info, bytes_so_far, total_bytes, nth_file, total_files):
-        """Check one `file` against the provided CRDS database `info` dictionary."""
+
+    def local_sha1sums(self, files, infos):
+        """Return { path : sha1sum } for each of `files` verify_file() will checksum,  reusing
+        sha1sums computed during download or recorded in the verification ledger.
+        """
+        paths = []
+        for file in files:
+            base = os.path.basename(file)
+            if infos[base] == "NOT FOUND" or not (self.args.check_sha1sum or config.is_mapping(base)):
+                continue
+            path = rmap.locate_file(file, observatory=self.observatory)
+            if os.path.exists(path) and os.stat(path).st_size == int(infos[base]["size"]):
+                paths.append(path)
+        known = {} if self.args.reverify_all else { path : api.downloaded_sha1sum(path) for path in paths }
+        known = { path : sha1sum for (path, sha1sum) in known.items() if sha1sum is not None }
+        return verification_ledger.checksums(paths, self.observatory, reverify=self.args.reverify_all, known=known)
+
+    def verify_file(self, file, info, bytes_so_far, total_bytes, nth_file, total_files, sha1sums=None):
+        """Check one `file` against the provided CRDS database `info` dictionary.  `sha1sums`
+        is an optional { path : sha1sum } of precomputed local checksums.
+        """
         path = rmap.locate_file(file, observatory=self.observatory)
         base = os.path.basename(file)
         n_bytes = int(info["size"])
@@ -598,8 +631,10 @@ class SyncScript(cmdline.ContextsScript):
             self.error_and_repair(path, "File", repr(base), "length mismatch LOCAL size=" + srepr(size), 
                                   "CRDS size=" + srepr(info["size"]))
         elif self.args.check_sha1sum or config.is_mapping(base):
-            log.verbose("Computing checksum for", repr(base), "of size", repr(size), verbosity=60)
-            sha1sum = utils.checksum(path)
+            sha1sum = (sha1sums or {}).get(path)
+            if sha1sum is None:
+                log.verbose("Computing checksum for", repr(base), "of size", repr(size), verbosity=60)
+                sha1sum = utils.checksum(path)
             if info["sha1sum"] == "none":
                 log.warning("CRDS doesn't know the checksum for", repr(base))
             elif info["sha1sum"] != sha1sum:
@@ -0,0 +1,133 @@
+"""This module defines a local stand-in for the CRDS JSON RPC server so that the client
+proxy can be exercised and benchmarked offline.
+
+LocalJsonRpcServer serves the methods of a { name : callable } dict over HTTP/1.1
+keep-alive connections on 127.0.0.1,  supporting JSON-RPC 1.0 and 2.0 requests,
+JSON-RPC 2.0 batches,  and gzip request and response compression.   To emulate a remote
+server `latency` seconds are added to every HTTP request and `handshake` seconds to every
+new connection,  standing in for TCP and TLS setup.   Servers without batch support are
+emulated by `batches` False,  answering batches with a JSON RPC error,  or an HTTP error
+status such as 404:
+
+    >> with LocalJsonRpcServer({"get_default_context" : lambda observatory: "hst_0001.pmap"}) as server:
+    ...     S = proxy.CheckingProxy(server.url)
+    ...     S.get_default_context("hst")
+    'hst_0001.pmap'
+"""
+import gzip
+import json
+import time
+import socket
+import threading
+import socketserver
+import http.server
+
+# ============================================================================
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """HTTPServer handling each connection in a daemon thread,  http.server.ThreadingHTTPServer
+    for Python < 3.7.
+    """
+    daemon_threads = True
+
+# ============================================================================
+
+class LocalJsonRpcServer:
+    """Threaded JSON RPC server for `methods` on an arbitrary free local port."""
+
+    def __init__(self, methods, latency=0.0, handshake=0.0, batches=True):
+        self.methods = dict(methods)
+        self.latency = latency
+        self.handshake = handshake
+        self.batches = batches
+        self.requests = 0       # HTTP requests handled
+        self.calls = 0          # method calls dispatched
+        self.connections = 0    # TCP connections accepted
+        self._lock = threading.Lock()
+        self._httpd = _ThreadingHTTPServer(("127.0.0.1", 0), _handler_class(self))
+        self._thread = None
+
+    @property
+    def url(self):
+        """The JSON RPC service URL,  as api.URL would be for a real server."""
+        return "http://127.0.0.1:{}/json/".format(self._httpd.server_port)
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def count(self, name, amount=1):
+        """Thread safely add `amount` to counter attribute `name`."""
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def dispatch(self, request):
+        """Return the JSON RPC response dict for request dict `request`."""
+        self.count("calls")
+        response = {"id" : request.get("id"), "jsonrpc" : request.get("jsonrpc", "1.0")}
+        try:
+            params = request.get("params", [])
+            method = self.methods[request["method"]]
+            result = method(**params) if isinstance(params, dict) else method(*params)
+            response.update(result=result, error=None)
+        except Exception as exc:
+            response.update(result=None, error={"name" : exc.__class__.__name__, "message" : str(exc)})
+        return response
+
+def _handler_class(server):
+    """Return a request handler class bound to LocalJsonRpcServer `server`."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # headers and body are separate writes
+            server.count("connections")
+            if server.handshake:
+                time.sleep(server.handshake)
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            server.count("requests")
+            if server.latency:
+                time.sleep(server.latency)
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.headers.get("Content-Encoding", "") == "gzip":
+                body = gzip.decompress(body)
+            request = json.loads(body.decode("utf-8"))
+            if isinstance(request, list) and server.batches not in (True, False):
+                self.send_error(server.batches)
+                return
+            elif isinstance(request, list) and server.batches:
+                reply = [server.dispatch(item) for item in request]
+            elif isinstance(request, list):
+                reply = {"id" : None, "result" : None, "error" : {"name" : "Invalid", "message" : "batch unsupported"}}
+            else:
+                reply = server.dispatch(request)
+            data = json.dumps(reply).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                data = gzip.compress(data)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
@@ -1,9 +1,12 @@
 import os
 import json
 import shutil
+import logging
 
 from crds import bestrefs
-from crds.bestrefs import BestrefsScript
+from crds.bestrefs import BestrefsScript, headers
+from crds.core import log
+from crds.core.exceptions import CrdsError
 from crds.tests import test_config
 
 """
@@ -451,6 +454,43 @@ class TestBestrefs(test_config.CRDSTestCase):
         self.run_script("crds.bestrefs --files @data/bestrefs_file_list  --new-context hst_0315.pmap --stats",
                         expected_errs=0)
         
+    def run_captured(self, cmd):
+        """Run BestrefsScript `cmd` returning its errors,  log messages,  updates,  and dataset count."""
+        records = []
+        with log.capture_records(records):
+            script = BestrefsScript(cmd)
+            errs = script()
+        messages = [record.getMessage() for record in records if record.levelno >= logging.INFO]
+        return errs, messages, script.updates, script.get_stat("datasets")
+
+    def test_bestrefs_jobs(self):
+        cmd = ("crds.bestrefs --files @data/bestrefs_file_list data/j8bt05njq_raw.fits "
+               "--new-context hst_0315.pmap --compare-source-bestrefs --jobs ")
+        serial = self.run_captured(cmd + "1")
+        parallel = self.run_captured(cmd + "2")
+        self.assertEqual(parallel, serial)
+        self.assertEqual(serial[3], 4)
+        
+    def test_bestrefs_instrument_header_segments(self):
+        class FakeServerInfo:
+            max_headers_per_rpc = 3
+        class SegmentHeaders(headers.InstrumentHeaderGenerator):
+            dumped = []
+            def determine_source_ids(self):
+                return ["I%02d:I%02d" % (i, i) for i in range(10)]
+            def dump_segment(self, segment):
+                self.dumped.append(segment)
+                lower = segment * self.segment_size
+                return { source : {"INSTRUME" : "COS", "DATE-OBS" : "2015-01-01", "TIME-OBS" : "00:00:00"}
+                         for source in self.sources[lower:lower + self.segment_size] }
+        generator = SegmentHeaders("hst_0315.pmap", ["cos"], None, False, FakeServerInfo())
+        self.assertEqual(list(generator), generator.sources)
+        self.assertEqual(sorted(generator.dumped), [0, 1, 2, 3])
+        self.assertTrue(len(generator.headers) <= generator.max_segments * generator.segment_size)
+        self.assertEqual(generator.header("I09:I09")["INSTRUME"], "COS")
+        with self.assertRaises(CrdsError):
+            generator.header("BOGUS:BOGUS")
+
     def test_bestrefs_remote(self):
         self.run_script("crds.bestrefs --files @data/bestrefs_file_list  --new-context hst_0315.pmap --remote --stats",
                         expected_errs=0)
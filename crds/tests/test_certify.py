@@ -1912,6 +1912,22 @@ class TestCertify(test_config.CRDSTestCase):
         script = certify.CertifyScript("crds.certify crds://hst_0317.pmap --dont-recurse-mappings")
         errors = script()
         
+    def test_certify_jobs_matches_serial(self):
+        log.set_exception_trap(True)
+        files = " ".join(self.data(name) for name in ["missing_keyword.fits", "s7g1700gl_dead.fits",
+                                                      "truncated.fits", "j8btyyy_raw_bad.fits"])
+        outputs = []
+        for jobs in [1, 2]:
+            records = []
+            with log.capture_records(records):
+                script = certify.CertifyScript(
+                    "crds.certify {} --comparison-context hst.pmap --jobs {}".format(files, jobs))
+                script()
+            outputs.append(([(record.levelname, record.getMessage()) for record in records],
+                            script.ue_mixin.tracked_errors))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertTrue(outputs[0][1] > 0)
+
     def test_certify_kernel_unity_validator_good(self):
         header = {'SCI_ARRAY': utils.Struct({'COLUMN_NAMES': None,
                                 'DATA': np.array([[ 0.        ,  0.0276    ,  0.        ],
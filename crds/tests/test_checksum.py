@@ -215,6 +215,20 @@ def dt_checksum_script_unsupported_text():
     >>> test_config.cleanup(old_state)
     """
 
+def dt_checksum_batch():
+    """
+    >>> old_state = test_config.setup()
+    >>> files = ["data/hst.pmap", "data/s7g1700gl_dead.fits", "data/opaque_fts.tmp"]
+    >>> serial = { name : utils.checksum(name) for name in files }
+    >>> utils.checksums(files, workers=3, pool="threads") == serial
+    True
+    >>> utils.checksums(files, workers=2, pool="processes") == serial
+    True
+    >>> utils.checksums([], workers=4)
+    {}
+    >>> test_config.cleanup(old_state)
+    """
+
 def test():
     """Run module tests,  for now just doctests only.
     
@@ -2,7 +2,7 @@ import sys
 import os
 import doctest
 
-from crds.core import log, cmdline, utils
+from crds.core import log, cmdline, utils, config, timestamp
 from crds.core.cmdline import Script, ContextsScript, UniqueErrorsMixin
 from crds import tests
 from crds.tests import test_config
@@ -305,6 +305,52 @@ class TestCmdline(test_config.CRDSTestCase):
         s = Script("cmdline.Script --ignore-cache")
         s.dump_mappings(["hst_acs.imap"])
 
+    def test_cache_stats(self):
+        self.run_script("crds.list --status --cache-stats", expected_errs=None)
+
+    def test_function_cache_limits(self):
+        @utils.xcached(max_bytes=10000)
+        def blob(x):
+            return b"x" * 4000
+        @utils.cached
+        def double(x):
+            return 2 * x
+        old = config.FUNCTION_CACHE_LIMITS.set("double=3")
+        try:
+            utils.clear_function_caches()
+            for x in range(5):
+                blob(x)
+                double(x)
+            self.assertEqual(list(blob.cache), [(3,), (4,)])
+            self.assertEqual(list(double.cache), [(2,), (3,), (4,)])
+            stats = utils.get_function_cache_stats()[double.name]
+            self.assertEqual((stats["misses"], stats["evictions"], stats["size"], stats["max_entries"]), (5, 2, 3, 3))
+            self.assertTrue(8000 < blob.stats()["bytes"] <= 10000)
+            lines = []
+            utils.report_function_cache_stats(lines.append)
+            self.assertTrue(any(line.startswith(double.name) for line in lines))
+        finally:
+            config.FUNCTION_CACHE_LIMITS.set(old)
+            utils.clear_function_caches()
+            utils.CachedFunction.cache_set -= {blob, double}
+
+    def test_date_cache(self):
+        old = config.DATE_CACHE_SIZE.set(2)
+        try:
+            utils.clear_function_caches()
+            dates = ["2003/12/20 01:28", "2004/01/01 00:00", "2003/12/20 01:28", "2005/05/05 05:05"]
+            self.assertEqual([timestamp.reformat_date(date) for date in dates],
+                             ["2003-12-20 01:28:00", "2004-01-01 00:00:00", "2003-12-20 01:28:00", "2005-05-05 05:05:00"])
+            self.assertEqual(list(timestamp._reformat_date_str.cache),
+                             [("2003/12/20 01:28", " "), ("2005/05/05 05:05", " ")])
+            stats = utils.get_function_cache_stats()[timestamp._reformat_date_str.name]
+            self.assertEqual((stats["size"], stats["max_entries"]), (2, 2))
+            utils.clear_function_caches()
+            self.assertEqual(len(timestamp._reformat_date_str.cache), 0)
+        finally:
+            config.DATE_CACHE_SIZE.set(old)
+            utils.clear_function_caches()
+
 class TestContextsScript(test_config.CRDSTestCase):    
     script_class = ContextsScript
     # server_url = "https://hst-crds-dev.stsci.edu"
@@ -610,6 +610,66 @@ def dt_diff_recurse_added_deleted_na():
     >>> test_config.cleanup(old_state)
     """
 
+def dt_diff_mapping_diffs_cached():
+    """
+    MappingDifferencer computes its differences once and reuses them.   With CRDS_DIFF_CACHE
+    the differences are also saved on disk and reused by later differencers:
+
+    >>> old_state = test_config.setup(cache=test_config.TEST_TEMP_DIR)
+    >>> from crds import diff
+    >>> from crds.core import config
+    >>> stats = diff.get_diff_cache_stats()
+    >>> differ = diff.MappingDifferencer("hst", "data/hst_0001.pmap", "data/hst_0002.pmap")
+    >>> differ.get_affected(), differ.header_modified(), differ.files_deleted()
+    ({'acs': ['biasfile']}, False, True)
+    >>> after = diff.get_diff_cache_stats()
+    >>> after["misses"] - stats["misses"], after["hits"] - stats["hits"]
+    (1, 2)
+
+    >>> old_cache = config.DIFF_CACHE.set(True)
+    >>> differences = diff.mapping_diffs("data/hst_0001.pmap", "data/hst_0002.pmap", observatory="hst")
+    >>> diff.mapping_diffs("data/hst_0001.pmap", "data/hst_0002.pmap", observatory="hst") == differences
+    True
+    >>> diff.get_diff_cache_stats()["disk_hits"] - stats["disk_hits"]
+    1
+    >>> diff.get_affected("data/hst_0001.pmap", "data/hst_0002.pmap", observatory="hst")
+    {'acs': ['biasfile']}
+    >>> diff.get_diff_cache_stats()["disk_hits"] - stats["disk_hits"]
+    2
+
+    Saved differences are keyed by the contents of the whole mapping hierarchies,  so a nested
+    mapping regenerated under the same name is not matched to stale differences:
+
+    >>> from crds.core import rmap
+    >>> differ = diff.MappingDifferencer("hst", "data/hst_0001.pmap", "data/hst_0002.pmap")
+    >>> key = differ._diff_cache_key()
+    >>> regenerated = diff.MappingDifferencer("hst", "data/hst_0001.pmap", "data/hst_0002.pmap")
+    >>> regenerated._mappings = (rmap.load_mapping("data/hst_0001.pmap"), rmap.load_mapping("data/hst_0002.pmap"))
+    >>> regenerated._diff_cache_key() == key
+    True
+    >>> regenerated._mappings[1].get_imap("acs").get_rmap("biasfile").header["sha1sum"] = "regenerated"
+    >>> regenerated._diff_cache_key() == key
+    False
+
+    At most CRDS_DIFF_CACHE_MAX_FILES differences are kept,  dropping the least recently used:
+
+    >>> import glob, os
+    >>> cache_dir = os.path.dirname(config.locate_diff_cache(key))
+    >>> old_max = config.DIFF_CACHE_MAX_FILES.set(1)
+    >>> _ = diff.mapping_diffs("data/hst_0001.pmap", "data/hst_0002.pmap", observatory="hst", include_header_diffs=False)
+    >>> [os.path.basename(path) for path in glob.glob(os.path.join(cache_dir, "*.pkl"))] == [
+    ...     os.path.basename(config.locate_diff_cache(diff.MappingDifferencer(
+    ...         "hst", "data/hst_0001.pmap", "data/hst_0002.pmap", include_header_diffs=False)._diff_cache_key()))]
+    True
+    >>> diff.prune_diff_cache(0)
+    >>> glob.glob(os.path.join(cache_dir, "*.pkl"))
+    []
+
+    >>> _ = config.DIFF_CACHE_MAX_FILES.set(old_max)
+    >>> _ = config.DIFF_CACHE.set(old_cache)
+    >>> test_config.cleanup(old_state)
+    """
+
 def main():
     """Run module tests,  for now just doctests only.
     
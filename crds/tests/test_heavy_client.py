@@ -214,6 +214,56 @@ def dt_pickled_mappings(mapping):
     >>> test_config.cleanup(old_state)
     """
     
+def dt_context_cache():
+    """
+    >>> old_state = test_config.setup()
+    >>> os.environ["CRDS_MAPPATH_SINGLE"] = test_config.TEST_DATA
+    >>> os.environ["CRDS_PICKLE_FORMAT"] = "compact"
+
+    >>> heavy_client.locate_pickled_mapping("hst_0001.pmap")   # doctest: +ELLIPSIS
+    '.../pickles/hst/hst_0001.pmap.ctx'
+
+    >>> loaded = heavy_client.get_pickled_mapping.uncached("hst_0001.pmap", use_pickles=True, save_pickles=True)  # doctest: +ELLIPSIS
+    CRDS - INFO -  Saved pickled context '.../pickles/hst/hst_0001.pmap.ctx'
+
+    >>> cached = heavy_client.load_pickled_mapping("hst_0001.pmap")
+    CRDS - INFO -  Loaded context cache 'hst_0001.pmap'
+
+    >>> header = { "INSTRUME" : "ACS", "DETECTOR" : "HRC", "CCDAMP" : "A", "CCDGAIN" : "1.0", "BIASCORR" : "PERFORM",
+    ...            "DATE-OBS" : "2003-01-01", "TIME-OBS" : "00:00:00" }
+    >>> include = ["biasfile", "darkfile"]
+    >>> cached.get_best_references(header, include) == loaded.get_best_references(header, include)
+    True
+
+    Only the records for the selected instrument are loaded:
+
+    >>> sorted(cached.selections._contents)
+    ['acs']
+
+    Context caches written by a different Python are stale since marshaled code is not portable:
+
+    >>> from crds.core import context_cache
+    >>> magic, context_cache.PYTHON_MAGIC = context_cache.PYTHON_MAGIC, "00000000"
+    >>> context_cache.clear_open_caches()
+    >>> context_cache.load(heavy_client.locate_pickled_mapping("hst_0001.pmap"), "hst_0001.pmap")  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    crds.core.context_cache.ContextCacheError: Context cache '.../pickles/hst/hst_0001.pmap.ctx' is stale,  written by a different Python version.
+    >>> context_cache.PYTHON_MAGIC = magic
+
+    Nested mappings which can no longer be loaded from the cache are loaded from their mapping files:
+
+    >>> heavy_client.remove_pickled_mapping("hst_0001.pmap")  # doctest: +ELLIPSIS
+    CRDS - INFO -  Removed pickle for context '.../pickles/hst/hst_0001.pmap.ctx'
+    >>> context_cache.clear_open_caches()
+    >>> cached.get_imap("cos")
+    InstrumentContext('hst_cos.imap')
+    >>> cached.get_best_references(header, include) == loaded.get_best_references(header, include)
+    True
+
+    >>> test_config.cleanup(old_state)
+    """
+
 def dt_check_parameters():
     """
     >>> old_state = test_config.setup(url="https://jwst-crds-serverless.stsci.edu", observatory="jwst")
@@ -252,6 +302,31 @@ def dt_get_context_parkeys():
     >>> test_config.cleanup(old_state)
     """
 
+def dt_get_best_references_batch():
+    """
+    >>> old_state = test_config.setup()
+    >>> os.environ["CRDS_MAPPATH_SINGLE"] = test_config.TEST_DATA
+
+    >>> headers = {
+    ...     "INSTRUME" : ["ACS", "ACS", "ACS"],
+    ...     "DETECTOR" : ["HRC", "HRC", "WFC"],
+    ...     "CCDAMP" : ["A", "A", "B"],
+    ...     "CCDGAIN" : [1.0, "1.0", 2.0],
+    ...     "DATE-OBS" : ["2003-01-01", "2003-01-01", "2010-05-05"],
+    ...     "TIME-OBS" : ["00:00:00", "00:00:00", "00:00:00"],
+    ... }
+    >>> batch = heavy_client.get_best_references_batch("hst_0001.pmap", headers, reftypes=["biasfile", "darkfile"])
+    >>> sorted(batch)
+    ['biasfile', 'darkfile']
+
+    >>> for i in range(3):
+    ...     header = { key : values[i] for (key, values) in headers.items() }
+    ...     single = heavy_client.hv_best_references("hst_0001.pmap", header, include=["biasfile", "darkfile"])
+    ...     assert single == { reftype : batch[reftype][i] for reftype in batch }, (i, single)
+
+    >>> test_config.cleanup(old_state)
+    """
+
 # ==================================================================================
 
 # class TestHeavyClient(test_config.CRDSTestCase):
@@ -9,8 +9,8 @@ from nose.tools import assert_raises, assert_true
 # ==================================================================================
 
 from crds import data_file
-from crds.core import utils, log, exceptions
-from crds.io import factory, tables
+from crds.core import utils, log, exceptions, config
+from crds.io import factory, tables, fits
 
 from crds.tests import test_config
 
@@ -124,6 +124,15 @@ def dt_fits_table():
     
     >>> tab.columns['DETCHIP'][:1]
     (1,)
+
+    >>> tab.nrows
+    694
+    
+    >>> int(tab.column('detchip')[0]), len(tab.column('DETCHIP'))
+    (1, 694)
+    
+    >>> tab.row(1) == tab.rows[1]
+    True
     >>> test_config.cleanup(old_state)
     """
 
@@ -412,6 +421,30 @@ def dt_get_array_properties_extension_number3():
     >>> test_config.cleanup(old_state)
     """
 
+def dt_scan_fits_header():
+    """
+    >>> old_state = test_config.setup()
+    >>> def astropy_header(filepath, needed_keys=()):
+    ...     old = config.FITS_FAST_HEADERS.set(False)
+    ...     try:
+    ...         return fits.FitsFile(filepath).get_raw_header(needed_keys, checksum=False)
+    ...     finally:
+    ...         config.FITS_FAST_HEADERS.set(old)
+    >>> for name in ["data/j8bt06o6q_raw.fits", "data/hst_acs_biasfile_0001.fits", "data/cos_N8XTZCAWQ.fits", "data/niriss_ref_photom.fits"]:
+    ...     assert fits.scan_fits_header(name) == astropy_header(name), name
+
+    >>> fits.scan_fits_header("data/j8bt06o6q_raw.fits", ["instrume", "detector", "ccdamp"])
+    [('INSTRUME', 'ACS'), ('DETECTOR', 'HRC'), ('CCDAMP', 'C')]
+
+    >>> fits.scan_fits_header("data/truncated.fits") is None
+    True
+    >>> fits.scan_fits_header("data/j8btyyy_raw_bad.fits") is None
+    True
+    >>> data_file.get_header("data/j8btyyy_raw_bad.fits", ("GRATING14",))["GRATING14"]
+    'SHORT'
+    >>> test_config.cleanup(old_state)
+    """
+
 # ==================================================================================
 
 def main():
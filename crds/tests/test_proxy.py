@@ -0,0 +1,172 @@
+"""This module tests the crds.client.proxy JSON RPC transport and crds.client.rpc_cache
+against a local stand-in server.
+"""
+import os
+import time
+import unittest
+import multiprocessing
+import urllib.error
+
+from crds.core import config, exceptions
+from crds.client import proxy, rpc_cache, connections
+from crds.tests import test_config
+from crds.tests.jsonrpc_server import LocalJsonRpcServer
+
+# ==================================================================================
+
+METHODS = {
+    "get_default_context" : lambda observatory: observatory + "_0001.pmap",
+    "get_dataset_ids" : lambda context, instrument, since: [instrument.upper() + "_{}".format(i) for i in range(3)],
+    "get_mapping_names" : lambda context: [context, context.replace(".pmap", "_acs.imap")],
+    "fail" : lambda: 1/0,
+    }
+
+class TestProxy(test_config.CRDSTestCase):
+
+    def test_proxy_reuses_connection(self):
+        with LocalJsonRpcServer(METHODS) as server:
+            S = proxy.CheckingProxy(server.url)
+            for _i in range(5):
+                self.assertEqual(S.get_default_context("hst"), "hst_0001.pmap")
+            self.assertEqual(server.requests, 5)
+            self.assertEqual(server.connections, 1)
+
+    def test_proxy_forked_connection(self):
+        with LocalJsonRpcServer(METHODS) as server:
+            S = proxy.CheckingProxy(server.url)
+            self.assertEqual(S.get_default_context("hst"), "hst_0001.pmap")
+            child = multiprocessing.get_context("fork").Process(target=S.get_default_context, args=("jwst",))
+            child.start()
+            child.join()
+            self.assertEqual(child.exitcode, 0)
+            self.assertEqual(S.get_default_context("hst"), "hst_0001.pmap")
+            self.assertEqual(server.requests, 3)
+            self.assertEqual(server.connections, 2)
+
+    def test_proxy_service_error(self):
+        with LocalJsonRpcServer(METHODS) as server:
+            S = proxy.CheckingProxy(server.url)
+            with self.assertRaisesRegex(exceptions.ServiceError, "division by zero"):
+                S.fail()
+
+    def test_proxy_batch(self):
+        with LocalJsonRpcServer(METHODS) as server:
+            S = proxy.CheckingProxy(server.url)
+            results = S._batch([("get_dataset_ids", ("hst.pmap", "acs", None)),
+                                ("get_dataset_ids", ("hst.pmap", "cos", None)),
+                                ("get_default_context", ("jwst",))])
+            self.assertEqual(results, [["ACS_0", "ACS_1", "ACS_2"], ["COS_0", "COS_1", "COS_2"], "jwst_0001.pmap"])
+            self.assertEqual(server.requests, 1)
+            with self.assertRaisesRegex(exceptions.ServiceError, "division by zero"):
+                S._batch([("get_default_context", ("hst",)), ("fail", ())])
+
+    def test_proxy_batch_unsupported(self):
+        with LocalJsonRpcServer(METHODS, batches=False) as server:
+            S = proxy.CheckingProxy(server.url)
+            results = S._batch([("get_default_context", ("hst",)), ("get_default_context", ("jwst",))])
+            self.assertEqual(results, ["hst_0001.pmap", "jwst_0001.pmap"])
+            self.assertEqual(server.requests, 3)
+
+    def test_pool_http_error(self):
+        with LocalJsonRpcServer(METHODS, batches=404) as server:
+            pool = connections.ConnectionPool()
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                pool.urlopen(server.url, b"[]", {"Content-Type" : "application/json"})
+            self.assertEqual(context.exception.code, 404)
+            self.assertEqual(server.requests, 1)
+
+    def test_proxy_batch_http_error(self):
+        for status in [404, 500]:
+            with LocalJsonRpcServer(METHODS, batches=status) as server:
+                S = proxy.CheckingProxy(server.url)
+                calls = [("get_default_context", ("hst",)), ("get_default_context", ("jwst",))]
+                self.assertEqual(S._batch(calls), ["hst_0001.pmap", "jwst_0001.pmap"])
+                self.assertEqual(server.requests, 3)    # the failed batch is not re-sent
+                self.assertEqual(S._batch(calls), ["hst_0001.pmap", "jwst_0001.pmap"])
+                self.assertEqual(server.requests, 5)    # no second batch attempt
+
+    def test_proxy_gzip(self):
+        old = config.RPC_GZIP.set(True)
+        try:
+            with LocalJsonRpcServer(METHODS) as server:
+                S = proxy.CheckingProxy(server.url)
+                self.assertEqual(S.get_dataset_ids("hst.pmap", "acs", None), ["ACS_0", "ACS_1", "ACS_2"])
+        finally:
+            config.RPC_GZIP.set(old)
+
+    def test_proxy_retry_backoff(self):
+        old_delay = config.CLIENT_RETRY_DELAY_SECONDS.set(10)
+        old_max = config.CLIENT_RETRY_MAX_DELAY_SECONDS.set(60)
+        try:
+            for retry, (low, high) in enumerate([(5, 10), (10, 20), (20, 40), (30, 60), (30, 60)]):
+                self.assertTrue(low <= proxy.retry_delay_seconds(retry) <= high)
+            config.CLIENT_RETRY_BACKOFF.set(False)
+            self.assertEqual(proxy.retry_delay_seconds(3), 10)
+        finally:
+            config.CLIENT_RETRY_BACKOFF.set(True)
+            config.CLIENT_RETRY_DELAY_SECONDS.set(old_delay)
+            config.CLIENT_RETRY_MAX_DELAY_SECONDS.set(old_max)
+
+class TestRpcCache(test_config.CRDSTestCase):
+
+    def setUp(self):
+        super(TestRpcCache, self).setUp()
+        os.environ["CRDS_PATH"] = self.temp_dir
+        self.old_cache = config.RPC_CACHE.set(True)
+
+    def tearDown(self):
+        config.RPC_CACHE.set(self.old_cache)
+        super(TestRpcCache, self).tearDown()
+
+    def call(self, server, method, params, ttl):
+        S = proxy.CheckingProxy(server.url)
+        return rpc_cache.call(server.url, getattr(S, method), method, params, ttl)
+
+    def test_rpc_cache_immutable(self):
+        with LocalJsonRpcServer(METHODS) as server:
+            for _i in range(3):
+                self.assertEqual(self.call(server, "get_mapping_names", ("hst_0001.pmap",), None),
+                                 ["hst_0001.pmap", "hst_0001_acs.imap"])
+            self.assertEqual(server.calls, 1)
+            self.call(server, "get_mapping_names", ("hst_0002.pmap",), None)
+            self.assertEqual(server.calls, 2)
+
+    def test_rpc_cache_ttl(self):
+        with LocalJsonRpcServer(METHODS) as server:
+            self.call(server, "get_dataset_ids", ("hst.pmap", "acs", None), 0.2)
+            self.call(server, "get_dataset_ids", ("hst.pmap", "acs", None), 0.2)
+            self.assertEqual(server.calls, 1)
+            time.sleep(0.3)
+            self.call(server, "get_dataset_ids", ("hst.pmap", "acs", None), 0.2)
+            self.assertEqual(server.calls, 2)
+            self.call(server, "get_dataset_ids", ("hst.pmap", "acs", None), 0)
+            self.call(server, "get_dataset_ids", ("hst.pmap", "acs", None), 0)
+            self.assertEqual(server.calls, 4)
+
+    def test_rpc_cache_eviction(self):
+        old_max = config.RPC_CACHE_MAX_MB.set(0)
+        try:
+            with LocalJsonRpcServer(METHODS) as server:
+                self.call(server, "get_mapping_names", ("hst_0001.pmap",), None)
+                self.call(server, "get_mapping_names", ("hst_0001.pmap",), None)
+                self.assertEqual(server.calls, 2)
+        finally:
+            config.RPC_CACHE_MAX_MB.set(old_max)
+
+    def test_rpc_cache_disabled(self):
+        config.RPC_CACHE.set(False)
+        with LocalJsonRpcServer(METHODS) as server:
+            self.call(server, "get_mapping_names", ("hst_0001.pmap",), None)
+            self.call(server, "get_mapping_names", ("hst_0001.pmap",), None)
+            self.assertEqual(server.calls, 2)
+
+# ==================================================================================
+
+def tst():
+    """Run module tests."""
+    suite = unittest.TestSuite([unittest.TestLoader().loadTestsFromTestCase(TestProxy),
+                                unittest.TestLoader().loadTestsFromTestCase(TestRpcCache)])
+    unittest.TextTestRunner().run(suite)
+
+if __name__ == "__main__":
+    print(tst())
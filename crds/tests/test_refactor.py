@@ -43,6 +43,27 @@ def dt_refactor_add_files():
     
     """
 
+def dt_refactor2_insert_references_per_reference():
+    """
+    Each reference is logged and its failures augmented as it is inserted,  so insertion
+    stops at the first bad reference:
+
+    >>> log.set_test_mode()
+    >>> from crds.refactoring import refactor2
+
+    >>> try:
+    ...     refactor2.rmap_insert_references("data/hst_cos_deadtab.rmap", "./hst_cos_deadtab_insert.rmap",
+    ...         ["data/s7g1700hl_dead.fits", "data/missing_dead.fits", "data/s7g1700gl_dead.fits"])
+    ... except FileNotFoundError as exc:
+    ...     print(exc)
+    CRDS - INFO -  Inserting 's7g1700hl_dead.fits' into 'hst_cos_deadtab.rmap'
+    CRDS - INFO -  Inserting 'missing_dead.fits' into 'hst_cos_deadtab.rmap'
+    In reference 'missing_dead.fits' : [Errno 2] No such file or directory: 'data/missing_dead.fits'
+
+    >>> os.path.exists("./hst_cos_deadtab_insert.rmap")
+    False
+    """
+
 def dt_refactor_delete_files():
     """ 
     >>> log.set_test_mode()
@@ -6,7 +6,8 @@ import json
 from pprint import pprint as pp
 import pickle
 
-from crds import rmap, log, config, tests
+from crds import rmap, log, config, utils, tests
+from crds.core import context_manifest
 from crds.client import api
 from crds.exceptions import *
 from crds.tests import test_config
@@ -731,6 +732,105 @@ selector = Match({
 
     maxDiff = None
     
+    def test_rmap_lookup_cache(self):
+        r = rmap.get_cached_mapping("data/hst_acs_biasfile.rmap")
+        headers = []
+        for detector, ccdamp in [("HRC", "A"), ("HRC", "C"), ("WFC", "ABCD")]:
+            headers.append({
+                "DETECTOR" : detector, "CCDAMP" : ccdamp, "CCDGAIN" : "2.0", "APERTURE" : "*",
+                "NUMCOLS" : "1062", "NUMROWS" : "1044", "LTV1" : "19.0", "LTV2" : "0.0",
+                "BIASCORR" : "PERFORM", "XCORNER" : "0.0", "YCORNER" : "0.0", "CCDCHIP" : "1.0",
+                "DATE-OBS" : "2005-07-18", "TIME-OBS" : "18:09:15",
+                })
+        config.LOOKUP_CACHE_SIZE.set(0)
+        r.clear_lookup_cache()
+        expected = [r.get_best_ref(header) for header in headers]
+        self.assertEqual(r.get_lookup_cache_stats()["size"], 0)
+        config.LOOKUP_CACHE_SIZE.set(2)
+        r.clear_lookup_cache()
+        stats = r.get_lookup_cache_stats()
+        self.assertEqual([r.get_best_ref(header) for header in headers], expected)
+        self.assertEqual(r.get_best_ref(dict(headers[2], CCDGAIN="2")), expected[2])
+        after = r.get_lookup_cache_stats()
+        self.assertEqual(after["misses"] - stats["misses"], 3)
+        self.assertEqual(after["hits"] - stats["hits"], 1)
+        self.assertEqual(after["size"], 2)
+        self.assertEqual(r.get_best_ref(headers[0]), expected[0])   # evicted
+        self.assertEqual(r.get_lookup_cache_stats()["misses"] - stats["misses"], 4)
+        new = r.delete(r.reference_names()[0])
+        self.assertEqual(new.get_lookup_cache_stats()["size"], 0)
+        bogus = dict(headers[0], DETECTOR="BOGUS")
+        old_trap = log.set_exception_trap(True)
+        try:
+            self.assertTrue(r.get_best_ref(bogus).startswith("NOT FOUND"))
+            size = r.get_lookup_cache_stats()["size"]
+            log.set_exception_trap(False)
+            with self.assertRaises(ValidationError):   # failures are not cached with the trap state
+                r.get_best_ref(bogus)
+        finally:
+            log.set_exception_trap(old_trap)
+        self.assertEqual(size, 2)
+        config.LOOKUP_CACHE_SIZE.reset()
+        r.clear_lookup_cache()
+
+    def test_rmap_demand_load_manifest(self):
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        os.environ["CRDS_PICKLEPATH"] = self.temp_dir
+        header = {
+            "INSTRUME" : "ACS", "DETECTOR" : "HRC", "CCDAMP" : "A", "CCDGAIN" : "1.0",
+            "BIASCORR" : "PERFORM", "DATE-OBS" : "2003-01-01", "TIME-OBS" : "00:00:00",
+            }
+        p = rmap.load_mapping("hst_0001.pmap")
+        expected_header = p.minimize_header(header)
+        expected_parkeys = p.get_required_parkeys()
+        expected_imap_parkeys = p.get_imap("acs").get_required_parkeys()
+        context_manifest.save_manifest(p)
+        config.DEMAND_LOAD.set(True)
+        utils.clear_function_caches()
+        p = rmap.load_mapping("hst_0001.pmap")
+        self.assertEqual(p.minimize_header(header), expected_header)
+        self.assertEqual(p.get_required_parkeys(), expected_parkeys)
+        imap = p.get_imap("acs")
+        self.assertEqual(len(imap.selections._contents), 0)
+        p.get_best_references(header, include=["biasfile"])
+        self.assertEqual(list(imap.selections._contents), ["biasfile"])
+        utils.clear_function_caches()   # e.g. certify memory_cleanup()
+        self.assertEqual(imap.get_required_parkeys(), expected_imap_parkeys)
+        self.assertEqual(p.minimize_header(header), expected_header)
+        self.assertEqual(list(imap.selections._contents), ["biasfile"])
+
+    def test_rmap_insert_many(self):
+        r = rmap.get_cached_mapping("data/hst_acs_biasfile.rmap")
+        items = [
+            ({"DETECTOR" : "HRC", "CCDAMP" : "A", "CCDGAIN" : "1.0", "APERTURE" : "*", "NUMCOLS" : "1062.0",
+              "NUMROWS" : "1044.0", "LTV1" : "19.0", "LTV2" : "0.0", "XCORNER" : "N/A", "YCORNER" : "N/A",
+              "CCDCHIP" : "N/A", "BIASCORR" : "PERFORM", "DATE-OBS" : date, "TIME-OBS" : "00:00:00"},
+             "new_{}_bia.fits".format(i))
+            for (i, date) in enumerate(["2010-01-01", "1990-01-01", "2010-01-01", "2020-05-05"])]
+        sequential = r
+        for header, value in items:
+            sequential = sequential.insert(header, value)
+        bulk = r.insert_many(items)
+        self.assertEqual(bulk.format(), sequential.format())
+        self.assertNotIn("new_0_bia.fits", bulk.reference_names())
+        self.assertEqual(bulk.get_best_ref(dict(items[0][0], **{"DATE-OBS" : "2012-01-01"})), "new_2_bia.fits")
+        self.assertEqual(r.format(), rmap.get_cached_mapping("data/hst_acs_biasfile.rmap").format())
+
+    def test_rmap_difference_content_hashes(self):
+        os.environ["CRDS_MAPPATH_SINGLE"] = self.data_dir
+        config.DIFF_CONTENT_HASHES.set(False)
+        expected = rmap.load_mapping("hst_0001.pmap").difference(rmap.load_mapping("hst_0002.pmap"))
+        config.DIFF_CONTENT_HASHES.set(True)
+        p, q = rmap.load_mapping("hst_0001.pmap"), rmap.load_mapping("hst_0002.pmap")
+        self.assertEqual(p.difference(q), expected)
+        self.assertEqual(sorted(p.selections._contents), ["acs"])   # unchanged imaps never loaded
+        r = rmap.load_mapping("data/hst_acs_biasfile.rmap")
+        s = rmap.load_mapping("data/hst_acs_biasfile.rmap")
+        self.assertEqual(r.content_hash(), s.content_hash())
+        self.assertEqual(r.selector.content_hash(), s.selector.content_hash())
+        s.selector.delete_match_param("APERTURE")
+        self.assertNotEqual(r.selector.content_hash(), s.selector.content_hash())
+
     def test_rmap_todict(self):
         r = rmap.get_cached_mapping("data/hst_cos_bpixtab_0252.rmap")
         self.assertEqual(r.todict(), {'text_descr': 'Data Quality (Bad Pixel) Initialization Table', 'selections': [('FUV', '1996-10-01 00:00:00', 's7g1700dl_bpix.fits'), ('FUV', '2009-05-11 00:00:00', 'z1r1943fl_bpix.fits'), ('NUV', '1996-10-01 00:00:00', 's7g1700pl_bpix.fits'), ('NUV', '2009-05-11 00:00:00', 'uas19356l_bpix.fits')], 'header': {'sha1sum': 'd2024dade52a406af70fcdf27a81088004d67cae', 'reffile_switch': 'none', 'filekind': 'bpixtab', 'instrument': 'cos', 'derived_from': 'hst_cos_bpixtab_0251.rmap', 'reffile_format': 'table', 'observatory': 'hst', 'parkey': (('DETECTOR',), ('DATE-OBS', 'TIME-OBS')), 'reffile_required': 'none', 'rmap_relevance': 'always', 'mapping': 'reference', 'name': 'hst_cos_bpixtab_0252.rmap'}, 'parameters': ('DETECTOR', 'USEAFTER', 'REFERENCE')})
@@ -759,6 +859,41 @@ selector = Match({
                 "TIME-OBS" : "00:34:32",
                 }) is None
 
+    def test_rmap_match_index_parity(self):
+        # the mode is resolved as each selector is created so load a fresh rmap per mode
+        config.MATCH_INDEX_MODE.set("winnow")
+        winnow = rmap.load_mapping("data/hst_acs_biasfile.rmap")
+        config.MATCH_INDEX_MODE.set("parity")
+        parity = rmap.load_mapping("data/hst_acs_biasfile.rmap")
+        config.MATCH_INDEX_MODE.reset()
+        self.assertEqual(winnow.selector._match_index_mode, "winnow")
+        self.assertEqual(parity.selector._match_index_mode, "parity")
+        for values in [("HRC", "A", "1.0", "*", "1062", "1044", "19.0", "20.0"),
+                       ("HRC", "C", "2.0", "HRC-FIX", "1062", "1044", "19.0", "0.0"),
+                       ("HRC", "*", "4.0", "*", "N/A", "N/A", "N/A", "N/A"),
+                       ("WFC", "ABCD", "2.0", "WFC1", "4144", "2068", "24.0", "0.0")]:
+            header = dict(zip(("DETECTOR", "CCDAMP", "CCDGAIN", "APERTURE", 
+                               "NUMCOLS", "NUMROWS", "LTV1", "LTV2"), values))
+            header.update({
+                "BIASCORR" : "PERFORM",
+                "XCORNER" : "0.0",
+                "YCORNER" : "0.0",
+                "CCDCHIP" : "1.0",
+                "DATE-OBS" : "2005-07-18",
+                "TIME-OBS" : "18:09:15",
+                })
+            expected = winnow.get_best_ref(header)
+            self.assertFalse(expected.startswith("NOT FOUND"), expected)
+            self.assertEqual(parity.get_best_ref(header), expected)
+        # a disagreeing index is never reported as an ordinary lookup failure
+        parity.selector._match_index.winnow = lambda header: ({}, {})
+        parity.clear_lookup_cache()
+        old_trap = log.set_exception_trap(True)
+        try:
+            self.assertRaises(MatchIndexParityError, parity.get_best_ref, header)
+        finally:
+            log.set_exception_trap(old_trap)
+
     def test_rmap_todict(self):
         p = rmap.get_cached_mapping("hst.pmap")
         p.todict()
@@ -304,6 +304,53 @@ Mode test: duplicate modes
         no      yes        -1 -2689.26...   ogeed
     <BLANKLINE>
 
+The hash join and difflib engines report the same row and mode differences:
+
+    >>> from crds.rowdiff import RowDiff
+    >>> for args, keys in [(("data/test-source.fits", "data/test-change-row1-valueLeft.fits"), {}),
+    ...                    (("data/test-source.fits", "data/test-single-modes.fits"), {}),
+    ...                    (("data/test-single-modes.fits", "data/test-source.fits"), {}),
+    ...                    (("data/test-source.fits", "data/test-alternate-modes.fits"), {"mode_fields" : ["modeup", "modedown"]})]:
+    ...     print(str(RowDiff(*args, engine="hash", **keys)) == str(RowDiff(*args, engine="difflib", **keys)))
+    True
+    True
+    True
+    True
+
+but where modes repeat the engines can pair them differently,  so the default "auto"
+engine only uses the hash join for tables longer than CRDS_ROWDIFF_HASH_ROWS:
+
+    >>> from crds.core import config
+    >>> args, keys = ("data/test-source.fits", "data/test-alternate-modes.fits"), {"mode_fields" : ["modeup"]}
+    >>> str(RowDiff(*args, engine="hash", **keys)) == str(RowDiff(*args, engine="difflib", **keys))
+    False
+    >>> str(RowDiff(*args, **keys)) == str(RowDiff(*args, engine="difflib", **keys))
+    True
+    >>> _old = config.ROWDIFF_HASH_ROWS.set(5)
+    >>> str(RowDiff(*args, **keys)) == str(RowDiff(*args, engine="hash", **keys))
+    True
+    >>> config.ROWDIFF_HASH_ROWS.reset()
+
+including for tables with duplicate rows:
+
+    >>> import numpy as np
+    >>> from astropy.io import fits
+    >>> def hdulist(values):
+    ...     return fits.HDUList([fits.PrimaryHDU(), fits.BinTableHDU(np.array(values, dtype=[("value", "i4")]))])
+    >>> for a_values, b_values in [([(1,), (2,), (1,), (3,)], [(2,), (1,), (4,)]),
+    ...                            ([(5,), (1,), (1,), (6,), (1,)], [(1,), (1,), (7,), (1,)])]:
+    ...     print(str(RowDiff(hdulist(a_values), hdulist(b_values), engine="hash")) ==
+    ...           str(RowDiff(hdulist(a_values), hdulist(b_values), engine="difflib")))
+    True
+    True
+    >>> for args in [("data/test-source.fits", "data/test-duplicate-mode.fits"),
+    ...              ("data/test-duplicate-mode.fits", "data/test-source.fits"),
+    ...              ("data/test-alternate-modes.fits", "data/test-duplicate-mode.fits")]:
+    ...     print(str(RowDiff(*args, engine="hash")) == str(RowDiff(*args, engine="difflib")))
+    True
+    True
+    True
+
 CLEANUP
 
     >>> test_config.cleanup(old_state)
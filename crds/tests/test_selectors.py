@@ -0,0 +1,152 @@
+"""This module contains unit tests which check the precomputed searches of the
+GeometricallyNearest and Bracket selectors against the per-lookup argmin() and
+linear scan they replaced.
+"""
+import random
+import unittest
+
+import numpy as np
+
+from crds.core import selectors
+from crds.tests import test_config
+
+# ==================================================================================
+
+def argmin_nearest(selector, keyval):
+    """Return the selection of GeometricallyNearest `selector` nearest `keyval` as formerly
+    computed on every lookup.
+    """
+    nkeys = np.array(selector.keys(), dtype='f')
+    return selector._selections[np.argmin(np.abs(nkeys - keyval))]
+
+def scan_bracket(selector, keyval):
+    """Return the (less, greater) selections of Bracket `selector` around `keyval` as formerly
+    computed by a linear scan.
+    """
+    index = 0
+    selections = selector._selections
+    while index < len(selections) and keyval > selections[index].key:
+        index += 1
+    if index == len(selections):
+        return selections[index-1], selections[index-1]
+    elif index == 0 or keyval == selections[index].key:
+        return selections[index], selections[index]
+    else:
+        return selections[index-1], selections[index]
+
+# ==================================================================================
+
+class TestSelectors(test_config.CRDSTestCase):
+
+    def setUp(self, *args, **keys):
+        super(TestSelectors, self).setUp(*args, **keys)
+        self.rng = random.Random(19)
+
+    def random_selections(self, count):
+        """Return { key : choice } with keys on a coarse grid so that nearest values tie,  numbers
+        with more digits than others so string and numerical orders differ,  and a few choices
+        shared by several keys for delete().
+        """
+        choices = ["ref_{}.fits".format(i) for i in range(count // 3 + 2)]
+        grid = [x / 2.0 for x in range(-10, 50)]
+        return { key : self.rng.choice(choices) for key in self.rng.sample(grid, count) }
+
+    def probe_values(self, keys):
+        """Return values at,  between,  and beyond both ends of numerical `keys`."""
+        keys = sorted(keys)
+        values = list(keys)
+        values += [(lo + hi) / 2.0 for (lo, hi) in zip(keys[:-1], keys[1:])]
+        values += [keys[0] - 1, keys[-1] + 1, -1.0e6, 1.0e6]
+        values += [self.rng.uniform(keys[0] - 2, keys[-1] + 2) for _i in range(10)]
+        return values
+
+    def assert_nearest_agrees(self, selector, values):
+        expected = [argmin_nearest(selector, value).choice for value in values]
+        self.assertEqual([selector.choose({"wavelength" : str(value)}) for value in values], expected)
+        self.assertEqual(selector.choose_many(values), expected)
+
+    def assert_bracket_agrees(self, selector, values):
+        expected = [tuple(selection.choice for selection in scan_bracket(selector, value)) for value in values]
+        self.assertEqual([selector.choose({"wavelength" : str(value)}) for value in values], expected)
+        self.assertEqual(selector.choose_many(values), expected)
+
+    def test_nearest_matches_argmin(self):
+        for _i in range(150):
+            selections = self.random_selections(self.rng.randint(1, 25))
+            selector = selectors.GeometricallyNearestSelector(("wavelength",), selections)
+            self.assert_nearest_agrees(selector, self.probe_values(selections))
+
+    def test_nearest_ties_go_to_first_selection(self):
+        # keys sort as strings,  so '10.0' precedes '8.0' and wins the tie at 9.0
+        selector = selectors.GeometricallyNearestSelector(("wavelength",), {
+            8 : "ref_8.fits",
+            10 : "ref_10.fits",
+            1 : "ref_1.fits",
+            3 : "ref_3.fits",
+        })
+        self.assertEqual(selector.choose({"wavelength" : "9.0"}), "ref_10.fits")
+        self.assertEqual(selector.choose({"wavelength" : "2.0"}), "ref_1.fits")
+        self.assert_nearest_agrees(selector, [2.0, 9.0, 5.5, 0.0, 11.0])
+
+    def test_nearest_duplicate_keys(self):
+        # distinct as rmap keys but identical as float32 search keys
+        selector = selectors.GeometricallyNearestSelector(("wavelength",), {
+            "1.2" : "ref_a.fits",
+            "1.20000001" : "ref_b.fits",
+            "1.2000000001" : "ref_c.fits",
+            "0.5" : "ref_d.fits",
+            "3.0" : "ref_e.fits",
+        })
+        self.assertEqual(selector.choose({"wavelength" : "1.2"}), "ref_a.fits")
+        self.assert_nearest_agrees(selector, [1.2, 1.19, 1.21, 0.85, 2.1, -5.0, 5.0])
+
+    def test_nearest_after_delete(self):
+        for _i in range(50):
+            selections = self.random_selections(self.rng.randint(4, 25))
+            selector = selectors.GeometricallyNearestSelector(("wavelength",), selections)
+            remaining = sorted(set(selections.values()) - {selector._selections[0].choice})
+            if not remaining:
+                continue
+            deleted = self.rng.choice(remaining)
+            self.assertTrue(selector.delete(deleted) > 0)
+            self.assertNotIn(deleted, selector.choices())
+            self.assert_nearest_agrees(selector, self.probe_values(selections))
+
+    def test_bracket_matches_scan(self):
+        for _i in range(150):
+            selections = self.random_selections(self.rng.randint(1, 25))
+            selector = selectors.BracketSelector(("wavelength",), selections)
+            self.assert_bracket_agrees(selector, self.probe_values(selections))
+
+    def test_bracket_near_duplicate_keys(self):
+        selector = selectors.BracketSelector(("wavelength",), {
+            1.2 : "ref_a.fits",
+            1.2000000001 : "ref_b.fits",
+            5 : "ref_c.fits",
+        })
+        self.assertEqual(selector.choose({"wavelength" : "1.2"}), ("ref_a.fits", "ref_a.fits"))
+        self.assertEqual(selector.choose({"wavelength" : "1.20000000005"}), ("ref_a.fits", "ref_b.fits"))
+        self.assert_bracket_agrees(selector, [1.2, 1.2000000001, 1.20000000005, 0.0, 3.0, 5.0, 6.0])
+
+    def test_bracket_after_delete(self):
+        for _i in range(50):
+            selections = self.random_selections(self.rng.randint(4, 25))
+            selector = selectors.BracketSelector(("wavelength",), selections)
+            remaining = sorted(set(selections.values()) - {selector._selections[0].choice})
+            if not remaining:
+                continue
+            deleted = self.rng.choice(remaining)
+            self.assertTrue(selector.delete(deleted) > 0)
+            self.assertNotIn(deleted, selector.choices())
+            self.assert_bracket_agrees(selector, self.probe_values(selections))
+
+# ==================================================================================
+
+
+def tst():
+    """Run module tests."""
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestSelectors)
+    unittest.TextTestRunner().run(suite)
+
+if __name__ == "__main__":
+    print(tst())
@@ -4,7 +4,8 @@ a CRDS cache of rules and references.
 import os
 
 import crds
-from crds.core import config, rmap
+from crds.core import config, rmap, utils, verification_ledger
+from crds.client import api
 from crds.sync import SyncScript
 from crds.tests import test_config
 
@@ -33,6 +34,39 @@ class TestSync(test_config.CRDSTestCase):
         self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --repair-files")
         self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --repair-files --check-sha1sum")
 
+    def test_sync_concurrent_downloads(self):
+        config.DOWNLOAD_THREADS.set(4)
+        try:
+            self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references")
+        finally:
+            config.DOWNLOAD_THREADS.set(1)
+        for name in crds.get_cached_mapping("hst_cos_deadtab.rmap").reference_names():
+            self.assert_crds_exists(name)
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum")
+
+    def test_sync_download_digests(self):
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references")
+        for name in crds.get_cached_mapping("hst_cos_deadtab.rmap").reference_names():
+            path = config.locate_file(name, "hst")
+            self.assertEqual(api.downloaded_sha1sum(path), utils.checksum(path))
+            with open(path, "a") as handle:
+                handle.write("foo")
+            self.assertEqual(api.downloaded_sha1sum(path), None)
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum", 2)
+
+    def test_sync_verification_ledger(self):
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum")
+        ledger = verification_ledger.connect("hst")
+        recorded = dict(ledger.execute("SELECT path, sha1sum FROM files"))
+        ledger.close()
+        for name in crds.get_cached_mapping("hst_cos_deadtab.rmap").reference_names():
+            path = config.locate_file(name, "hst")
+            self.assertEqual(recorded[path], utils.checksum(path))
+            with open(path, "r+b") as handle:   # same length,  different contents
+                handle.write(b"X")
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum", 2)
+        self.run_script("crds.sync --contexts hst_cos_deadtab.rmap --fetch-references --check-files --check-sha1sum --reverify-all", 2)
+
     def test_sync_explicit_files(self):
         self.assert_crds_not_exists("hst_cos_deadtab.rmap")
         self.run_script("crds.sync --files hst_cos_deadtab.rmap --check-files --repair-files --check-sha1sum")
@@ -1,9 +1,11 @@
 """This tests, through the use of bestrefs, the functioning of table effects."""
 import doctest
+import itertools
 
 from crds import tests
 from crds.tests import test_config
-from crds.bestrefs import BestrefsScript
+from crds.bestrefs import BestrefsScript, table_effects
+from crds.io import tables
 
 def dt_table_effects_default_always_reprocess():
     """
@@ -96,6 +98,74 @@ def dt_table_effects_reprocess_no():
     >>> test_config.cleanup(old_state)
     """
 
+class DeepLook_TestModes(table_effects.DeepLook):
+    """Rule over the test-*-modes.fits tables treating MODEDOWN='maybe' rows as wildcards."""
+    def __init__(self):
+        super(DeepLook_TestModes, self).__init__()
+
+        self.mode_fields = {
+            'modeup': self.cmp_equal_parameters,
+            'modedown': (table_effects.cmp_equal, ['maybe']),
+        }
+
+def mode_select_verdict(rule_class, old_reference, new_reference, mode):
+    """Return (is_different, message) as computed before ModeIndex,  scanning every row
+    of both references with mode_select().
+    """
+    rule = rule_class()
+    data_old = tables.tables(old_reference)[0]
+    data_new = tables.tables(new_reference)[0]
+    if sorted(data_old.colnames) != sorted(data_new.colnames):
+        return True, 'Columns are different between references.'
+    constraints = { field : (value,) + rule.mode_fields[field] for field, value in mode }
+    mode_rows_old = sorted(repr(row) for row in table_effects.mode_select(data_old, constraints))
+    mode_rows_new = sorted(repr(row) for row in table_effects.mode_select(data_new, constraints))
+    if not table_effects.mode_equality(mode_rows_old, mode_rows_new):
+        return True, 'Selection rules have executed and the selected rows are different.'
+    else:
+        return False, 'Selection rules have executed and the selected rows are the same.'
+
+def dt_table_effects_mode_verdicts():
+    """
+    Test: ModeIndex based mode_verdict() agrees with scanning rows using mode_select()
+    for every mode drawn from either table,  unknown values,  and metavalue tuples.
+
+    >>> old_state = test_config.setup(cache=None)
+
+    >>> def compare(rule_class, old_reference, new_reference, values):
+    ...     fields = sorted(rule_class().mode_fields)
+    ...     verdicts, mismatches = set(), []
+    ...     for combo in itertools.product(values, repeat=len(fields)):
+    ...         mode = tuple(zip(fields, combo))
+    ...         for old, new in [(old_reference, new_reference), (new_reference, old_reference), (old_reference, old_reference)]:
+    ...             expected = mode_select_verdict(rule_class, "data/" + old, "data/" + new, mode)
+    ...             got = table_effects.mode_verdict(rule_class, "data/" + old, "data/" + new, mode)
+    ...             verdicts.add(got[0])
+    ...             if got != expected:
+    ...                 mismatches.append((old, new, mode, got, expected))
+    ...     return sorted(verdicts), mismatches
+
+    >>> compare(table_effects.DeepLook_COSOpt_elem, "x2i1559gl_wcp.fits", "xaf1429el_wcp.fits",
+    ...         ["G185M", "G225M", "G285M", "G230L", "G999M", ("G185M", "G230L")])
+    ([False, True], [])
+
+    >>> compare(table_effects.DeepLook_COSSegment, "s7g1700gl_dead.fits", "s7g1700gl_dead_dup1.fits",
+    ...         ["FUVA", "FUVB", "NUV", ("FUVA", "FUVB")])
+    ([False], [])
+
+    >>> modes = ["yes", "no", "maybe", "never", ("yes", "no")]
+    >>> compare(DeepLook_TestModes, "test-duplicate-mode.fits", "test-alternate-modes.fits", modes)
+    ([False, True], [])
+    >>> compare(DeepLook_TestModes, "test-single-modes.fits", "test-change-row1-valueLeft.fits", modes)
+    ([False, True], [])
+
+    >>> table_effects.mode_verdict(table_effects.DeepLook_COSOpt_elem,
+    ...     "data/x2i1559gl_wcp.fits", "data/s7g1700gl_dead.fits", (("opt_elem", "G185M"),))
+    (True, 'Columns are different between references.')
+
+    >>> test_config.cleanup(old_state)
+    """
+
 def main():
     """Run module tests,  for now just doctests only."""
     from crds.tests import test_table_effects, tstmod
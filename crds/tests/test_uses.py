@@ -4,9 +4,10 @@ module that identifies mappings that reference a file.
 XXX IMPORTANT:  crds.uses tests are extremely time consuming, DISABLED
 """
 import os, os.path
+import shutil
 from pprint import pprint as pp
 
-from crds.core import log, config
+from crds.core import log, config, rmap, reverse_index
 from crds import uses
 from crds import tests
 from crds.tests import test_config
@@ -90,6 +91,49 @@ class TestUses(test_config.CRDSTestCase):
             r.get_imap("foo")
     '''
 
+    def test_uses_reverse_index(self):
+        mappath = self.temp("mappings")
+        os.makedirs(mappath)
+        for name in ["hst_cos_deadtab.rmap", "hst_cos_bpixtab.rmap", "hst_cos_flatfile.rmap"]:
+            shutil.copy(self.data(name), mappath)
+        os.environ["CRDS_MAPPATH_SINGLE"] = mappath
+        os.environ["CRDS_CFGPATH_SINGLE"] = self.temp("config")
+        self.assertEqual(reverse_index.update_index("hst"), 3)
+        shutil.copy(self.data("hst_cos.imap"), mappath)
+        self.assertEqual(reverse_index.update_index("hst"), 1)
+        self.assertEqual(reverse_index.update_index("hst"), 0)
+        config.REVERSE_INDEX.set(True)
+        try:
+            self.assertEqual(uses.uses(["s7g1700gl_dead.fits"], "hst"), ["hst_cos.imap", "hst_cos_deadtab.rmap"])
+            self.assertEqual(uses.uses(["hst_cos_flatfile.rmap"], "hst"), ["hst_cos.imap"])
+            self.assertEqual(uses.uses(["hst_cos.imap", "foo.fits"], "hst"), [])
+        finally:
+            config.REVERSE_INDEX.set(False)
+        self.assertEqual(reverse_index.file_matches("hst_cos.imap", "s7g1700gl_dead.fits"),
+                         rmap.fetch_mapping(self.data("hst_cos_deadtab.rmap")).file_matches("s7g1700gl_dead.fits"))
+
+    def test_uses_reverse_index_readonly(self):
+        mappath = self.temp("mappings")
+        os.makedirs(mappath)
+        for name in ["hst_cos_deadtab.rmap", "hst_cos_bpixtab.rmap", "hst_cos_flatfile.rmap"]:
+            shutil.copy(self.data(name), mappath)
+        os.environ["CRDS_MAPPATH_SINGLE"] = mappath
+        os.environ["CRDS_CFGPATH_SINGLE"] = self.temp("config")
+        config.REVERSE_INDEX.set(True)
+        config.set_cache_readonly(True)
+        try:
+            self.assertFalse(reverse_index.usable("hst"))
+            self.assertEqual(uses.uses(["s7g1700gl_dead.fits"], "hst"), ["hst_cos_deadtab.rmap"])
+            self.assertFalse(os.path.exists(config.locate_reverse_index("hst")))
+            config.set_cache_readonly(False)
+            reverse_index.update_index("hst")
+            config.set_cache_readonly(True)
+            self.assertTrue(reverse_index.usable("hst"))
+            self.assertEqual(uses.uses(["s7g1700gl_dead.fits"], "hst"), ["hst_cos_deadtab.rmap"])
+        finally:
+            config.set_cache_readonly(False)
+            config.REVERSE_INDEX.set(False)
+
 # ==================================================================================
 
 
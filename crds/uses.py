@@ -18,7 +18,7 @@ reference or mapping file.
 import sys
 import os.path
 
-from crds.core import config, cmdline, utils, log, rmap
+from crds.core import config, cmdline, utils, log, rmap, reverse_index
 
 @utils.cached
 def load_all_mappings(observatory, pattern="*map"):
@@ -89,6 +89,10 @@ def _findall_mappings_using_rmap(rmap, observatory="hst"):
 
 def uses(files, observatory="hst"):
     """Return the list of mappings which use any of `files`."""
+    if config.REVERSE_INDEX.get() and reverse_index.usable(observatory):
+        for file_ in files:
+            config.check_filename(file_)
+        return reverse_index.uses(files, observatory)
     mappings = []
     for file_ in files:
         if file_.endswith(".rmap"):